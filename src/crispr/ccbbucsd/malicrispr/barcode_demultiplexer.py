@@ -0,0 +1,107 @@
+"""This module assigns read pairs from multiplexed fastqs to samples by their barcodes."""
+
+# standard libraries
+import itertools
+
+# project-specific libraries
+from ccbbucsd.malicrispr.grna_mismatch_index import GrnaMismatchIndex
+
+__author__ = "Amanda Birmingham"
+__maintainer__ = "Amanda Birmingham"
+__email__ = "abirmingham@ucsd.edu"
+__status__ = "development"
+
+BARCODE_FROM_HEADER = "header"
+BARCODE_FROM_FW_PREFIX = "fw_prefix"
+
+_MAX_CACHED_BARCODES = 100000
+
+
+class BarcodeDemultiplexer:
+    """Assigns read pairs to samples by their barcodes, allowing up to a set number of mismatches.
+
+    Barcodes are taken either from the index sequence at the end of the forward read's header line (e.g., the ATCACG
+    in "@D00611:278:HK55CBCXX:1:1101:1138:2170 1:N:0:ATCACG", or ATCACG+GTTACA for dual indices) or from the first
+    bases of the forward read itself, in which case they are removed from the read before it is matched to gRNAs.
+    All barcodes must be the same length, and no two may be so similar that a read could be within the allowed
+    number of mismatches of both.
+    """
+
+    def __init__(self, sample_names_and_barcodes, num_allowed_mismatches=1, barcode_source=BARCODE_FROM_HEADER):
+        if barcode_source not in [BARCODE_FROM_HEADER, BARCODE_FROM_FW_PREFIX]:
+            raise ValueError("Unrecognized barcode source '{0}'".format(barcode_source))
+        self._sample_names = [x[0] for x in sample_names_and_barcodes]
+        barcodes = [x[1].upper() for x in sample_names_and_barcodes]
+        self._check_samples(self._sample_names, barcodes, num_allowed_mismatches)
+
+        self._barcode_source = barcode_source
+        self._barcode_len = len(barcodes[0])
+        self._num_allowed_mismatches = num_allowed_mismatches
+        self._barcode_index = GrnaMismatchIndex(barcodes, self._barcode_len, num_allowed_mismatches)
+        self._sample_ids_by_barcode = {}  # most reads carry one of a few barcodes, so remember their assignments
+
+    @staticmethod
+    def _check_samples(sample_names, barcodes, num_allowed_mismatches):
+        if len(barcodes) == 0:
+            raise ValueError("At least one sample barcode must be given")
+        if len(set(sample_names)) != len(sample_names):
+            raise ValueError("Sample names must be unique")
+        if len(set(len(x) for x in barcodes)) != 1:
+            raise ValueError("All sample barcodes must be the same length")
+
+        for (name_1, barcode_1), (name_2, barcode_2) in itertools.combinations(zip(sample_names, barcodes), 2):
+            distance = sum(1 for x, y in zip(barcode_1, barcode_2) if x != y)
+            if distance <= 2 * num_allowed_mismatches:
+                raise ValueError("Barcodes for samples '{0}' and '{1}' differ at only {2} positions, so can't be told "
+                                 "apart with {3} mismatches allowed".format(name_1, name_2, distance,
+                                                                            num_allowed_mismatches))
+
+    @property
+    def sample_names(self):
+        return self._sample_names
+
+    def get_sample_id(self, barcode):
+        """Return the index (into sample_names) of the sample with the input barcode, or None if there isn't one."""
+        result = self._sample_ids_by_barcode.get(barcode, -1)
+        if result == -1:
+            result = None
+            if len(barcode) == self._barcode_len:
+                result, _ = self._barcode_index.find_best_match(barcode.upper(), self._num_allowed_mismatches)
+            if len(self._sample_ids_by_barcode) >= _MAX_CACHED_BARCODES:
+                self._sample_ids_by_barcode = {}
+            self._sample_ids_by_barcode[barcode] = result
+        return result
+
+    def group_pairs_by_sample(self, fw_records, rv_records):
+        """Split a batch of record pairs by sample.
+
+        Returns a dictionary of (forward sequences, reverse sequences) list pairs keyed by sample id, holding the
+        upper-cased sequences to be matched to gRNAs, and the number of pairs that couldn't be assigned to a sample.
+        """
+        result = {}
+        num_undetermined = 0
+        for fw_record, rv_record in zip(fw_records, rv_records):
+            fw_seq = fw_record.sequence
+            if self._barcode_source == BARCODE_FROM_HEADER:
+                sample_id = self.get_sample_id(_get_header_barcode(fw_record.name))
+            else:
+                sample_id = self.get_sample_id(fw_seq[:self._barcode_len])
+                fw_seq = fw_seq[self._barcode_len:]
+
+            if sample_id is None:
+                num_undetermined += 1
+            else:
+                sample_seqs = result.get(sample_id)
+                if sample_seqs is None:
+                    sample_seqs = result[sample_id] = ([], [])
+                sample_seqs[0].append(fw_seq.upper())
+                sample_seqs[1].append(rv_record.sequence.upper())
+        return result, num_undetermined
+
+
+def _get_header_barcode(name_line):
+    # the index sequence follows the last colon of the comment after the read name; reads without one get ""
+    name_pieces = name_line.split(None, 1)
+    if len(name_pieces) < 2:
+        return ""
+    return name_pieces[1].rstrip().rsplit(":", 1)[-1]
@@ -0,0 +1,177 @@
+"""This module compiles a construct library into on-disk arrays that worker processes can memory-map and share."""
+
+# standard libraries
+import hashlib
+import os
+import shutil
+import tempfile
+
+# third-party libraries
+import numpy
+
+# ccbb libraries
+from ccbbucsd.utilities.files_and_paths import get_file_hash, get_file_name_pieces
+
+# project-specific libraries
+from ccbbucsd.malicrispr.construct_file_extracter import extract_construct_and_grna_info, trim_grnas
+from ccbbucsd.malicrispr.construct_index import ConstructIndex
+from ccbbucsd.malicrispr.grna_batch_matching import encode_seqs
+from ccbbucsd.malicrispr.grna_mismatch_index import GrnaMismatchIndex
+from ccbbucsd.malicrispr.grna_position_matcher import GrnaPositionMatcher
+
+__author__ = "Amanda Birmingham"
+__maintainer__ = "Amanda Birmingham"
+__email__ = "abirmingham@ucsd.edu"
+__status__ = "development"
+
+_FORMAT_VERSION = 2  # change whenever the stored arrays change, so that stale compiled libraries aren't reused
+_COMPILED_DIR_INFIX = "_compiled_"
+_ARRAY_NAMES = ["grna_names", "grna_seqs", "encoded_grnas", "construct_names", "pair_keys", "pair_construct_ids"]
+_SEED_ARRAY_NAMES = ["exact_seqs", "exact_ids", "segment_seqs", "segment_ids"]
+
+# libraries and matchers already loaded by this process, so repeated tasks on the same worker don't reload them
+_libraries_by_dir = {}
+_grna_matchers_by_key = {}
+
+
+def get_compiled_library_dir(cache_dir, constructs_fp, col_indices, trim_len):
+    """Return the directory in which the compiled form of the input library, with the input settings, is stored."""
+    key_pieces = [str(_FORMAT_VERSION), get_file_hash(constructs_fp), ",".join([str(x) for x in col_indices]),
+                  str(trim_len)]
+    key = hashlib.sha256("|".join(key_pieces).encode("utf-8")).hexdigest()
+    _, constructs_base, _ = get_file_name_pieces(constructs_fp)
+    return os.path.join(cache_dir, "{0}{1}{2}".format(constructs_base, _COMPILED_DIR_INFIX, key[:16]))
+
+
+def get_compiled_library_name(library_dir):
+    """Return the name of the constructs file (without extension) from which the library in library_dir was compiled."""
+    return os.path.basename(os.path.normpath(library_dir)).rsplit(_COMPILED_DIR_INFIX, 1)[0]
+
+
+def compile_library(cache_dir, constructs_fp, col_indices, trim_len):
+    """Compile the library to cache_dir unless an up-to-date compiled copy is already there; return its directory."""
+    library_dir = get_compiled_library_dir(cache_dir, constructs_fp, col_indices, trim_len)
+    if os.path.isdir(library_dir):
+        return library_dir
+
+    construct_names, grna_name_seq_pairs = extract_construct_and_grna_info(constructs_fp, col_indices)
+    trimmed_grna_name_seq_pairs = trim_grnas(grna_name_seq_pairs, trim_len)
+    grna_names = [x[0] for x in trimmed_grna_name_seq_pairs]
+    grna_seqs = [x[1] for x in trimmed_grna_name_seq_pairs]
+    construct_index = ConstructIndex(grna_names, construct_names)
+    encoded_grnas, _ = encode_seqs(grna_seqs, trim_len)
+    arrays_by_name = {"grna_names": numpy.array(grna_names, dtype=str),
+                      "grna_seqs": numpy.array(grna_seqs, dtype=str),
+                      "encoded_grnas": encoded_grnas,
+                      "construct_names": numpy.array(construct_index.construct_names, dtype=str),
+                      "pair_keys": construct_index.pair_keys,
+                      "pair_construct_ids": construct_index.pair_construct_ids}
+
+    # write to a temporary directory and then rename it, so no process ever sees a partly-written library
+    os.makedirs(cache_dir, exist_ok=True)
+    temp_dir = tempfile.mkdtemp(dir=cache_dir)
+    for curr_name in _ARRAY_NAMES:
+        numpy.save(os.path.join(temp_dir, curr_name + ".npy"), arrays_by_name[curr_name])
+    try:
+        os.rename(temp_dir, library_dir)
+    except OSError:
+        shutil.rmtree(temp_dir)  # another process compiled the same library first
+        if not os.path.isdir(library_dir):
+            raise
+    return library_dir
+
+
+def load_compiled_library(library_dir):
+    """Return the CompiledLibrary in library_dir, loading it only once per process."""
+    result = _libraries_by_dir.get(library_dir)
+    if result is None:
+        result = CompiledLibrary(library_dir)
+        _libraries_by_dir[library_dir] = result
+    return result
+
+
+def get_compiled_grna_matcher(library_dir, num_allowed_fw_mismatches, num_allowed_rv_mismatches):
+    """Return a GrnaPositionMatcher for the compiled library, building it only once per process."""
+    key = (library_dir, num_allowed_fw_mismatches, num_allowed_rv_mismatches)
+    result = _grna_matchers_by_key.get(key)
+    if result is None:
+        result = load_compiled_library(library_dir).make_grna_matcher(num_allowed_fw_mismatches,
+                                                                      num_allowed_rv_mismatches)
+        _grna_matchers_by_key[key] = result
+    return result
+
+
+class CompiledLibrary:
+    """Read-only, memory-mapped view of a library written by compile_library.
+
+    The arrays are mapped rather than read into memory, so every process using the same compiled library shares a
+    single copy of them through the operating system's page cache.  That includes the construct names and pair-key
+    table used by construct_index and the gRNA mismatch index's seed arrays used by make_grna_matcher, which are
+    looked up with numpy.searchsorted; only the gRNA names and sequences are copied into each process's own memory.
+    """
+
+    def __init__(self, library_dir):
+        self._library_dir = library_dir
+        self._arrays_by_name = {x: numpy.load(os.path.join(library_dir, x + ".npy"), mmap_mode='r')
+                                for x in _ARRAY_NAMES}
+        self._construct_index = None
+        self._seed_arrays_by_num_mismatches = {}
+
+    @property
+    def library_dir(self):
+        return self._library_dir
+
+    @property
+    def grna_names_and_seqs(self):
+        return list(zip(self._arrays_by_name["grna_names"].tolist(), self._arrays_by_name["grna_seqs"].tolist()))
+
+    @property
+    def construct_names(self):
+        return self._arrays_by_name["construct_names"].tolist()
+
+    @property
+    def construct_index(self):
+        if self._construct_index is None:
+            self._construct_index = ConstructIndex(self._arrays_by_name["grna_names"].tolist(),
+                                                   self._arrays_by_name["construct_names"],
+                                                   self._arrays_by_name["pair_keys"],
+                                                   self._arrays_by_name["pair_construct_ids"])
+        return self._construct_index
+
+    def get_seed_arrays(self, max_allowed_mismatches):
+        """Return the memory-mapped GrnaMismatchIndex seed arrays for the maximum number of mismatches.
+
+        They depend on the number of mismatches, so they are written into the library directory by the first process
+        that needs them and only mapped by every later one.
+        """
+        result = self._seed_arrays_by_num_mismatches.get(max_allowed_mismatches)
+        if result is None:
+            seed_fps = {x: os.path.join(self._library_dir, "seed_{0}mm_{1}.npy".format(max_allowed_mismatches, x))
+                        for x in _SEED_ARRAY_NAMES}
+            if not all(os.path.isfile(x) for x in seed_fps.values()):
+                seed_arrays = GrnaMismatchIndex.build_seed_arrays(self._arrays_by_name["grna_seqs"].tolist(),
+                                                                  self._arrays_by_name["encoded_grnas"].shape[1],
+                                                                  max_allowed_mismatches)
+                for curr_name, curr_fp in seed_fps.items():
+                    _save_array_atomically(curr_fp, seed_arrays[curr_name])
+            result = {x: numpy.load(y, mmap_mode='r') for x, y in seed_fps.items()}
+            self._seed_arrays_by_num_mismatches[max_allowed_mismatches] = result
+        return result
+
+    def make_grna_matcher(self, num_allowed_fw_mismatches, num_allowed_rv_mismatches, cache_size=0):
+        encoded_grnas = self._arrays_by_name["encoded_grnas"]
+        grna_names_and_seqs = self.grna_names_and_seqs
+        max_allowed_mismatches = max(num_allowed_fw_mismatches, num_allowed_rv_mismatches)
+        grna_index = GrnaMismatchIndex([x[1] for x in grna_names_and_seqs], encoded_grnas.shape[1],
+                                       max_allowed_mismatches, self.get_seed_arrays(max_allowed_mismatches))
+        return GrnaPositionMatcher(grna_names_and_seqs, encoded_grnas.shape[1], num_allowed_fw_mismatches,
+                                   num_allowed_rv_mismatches, cache_size=cache_size, encoded_grnas=encoded_grnas,
+                                   grna_index=grna_index)
+
+
+def _save_array_atomically(output_fp, array):
+    # write to a temporary file and then rename it, so no process ever maps a partly-written array
+    temp_handle, temp_fp = tempfile.mkstemp(dir=os.path.dirname(output_fp))
+    with os.fdopen(temp_handle, 'wb') as file_handle:
+        numpy.save(file_handle, array)
+    os.replace(temp_fp, output_fp)
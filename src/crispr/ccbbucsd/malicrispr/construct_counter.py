@@ -1,21 +1,42 @@
 """This module counts almost-perfect matches of small sequences within forward and reverse fastq sequence pairs."""
 
 # standard libraries
-import csv
 import datetime
 import logging
 
+# third-party libraries
+import numpy
+
 # ccbb libraries
-from ccbbucsd.utilities.basic_fastq import FastqHandler, paired_fastq_generator
+from ccbbucsd.utilities.basic_fastq import get_paired_chunk_byte_ranges, make_fastq_handler, \
+    paired_fastq_batch_generator, paired_fastq_generator
+from ccbbucsd.utilities.bio_seq_utilities import pair_hiseq_read_files
+from ccbbucsd.utilities.compressed_input import is_gzipped
+from ccbbucsd.utilities.fastq_sampling import get_sample_estimates
+from ccbbucsd.utilities.files_and_paths import build_multipart_fp
+from ccbbucsd.utilities.worker_telemetry import record_counts, record_progress
 
 # project-specific libraries
-from ccbbucsd.malicrispr.construct_file_extracter import get_construct_separator
+from ccbbucsd.malicrispr.compiled_library import get_compiled_grna_matcher, get_compiled_library_name, \
+    load_compiled_library
+from ccbbucsd.malicrispr.construct_index import NO_CONSTRUCT, ConstructIndex
+from ccbbucsd.malicrispr.count_checkpoint import get_checkpoint_fp, read_checkpoint, remove_checkpoint, \
+    write_checkpoint
+from ccbbucsd.malicrispr.count_filterer import filtered_pair_generator, summarize_filter_counts
+from ccbbucsd.malicrispr.count_store import write_counts
+from ccbbucsd.malicrispr.grna_batch_matching import NO_MATCH
+from ccbbucsd.malicrispr.read_match_cache import ReadMatchCache
+from ccbbucsd.malicrispr.unrecognized_tracker import UnrecognizedTracker, get_unrecognized_fp
 
 __author__ = "Amanda Birmingham"
 __maintainer__ = "Amanda Birmingham"
 __email__ = "abirmingham@ucsd.edu"
 __status__ = "development"
 
+_FILTERED_BATCH_SIZE = 65536
+_DEFAULT_NUM_PAIRS_PER_CHECKPOINT = 10000000
+_SAMPLE_ESTIMATE_KEYS = ["num_constructs_recognized", "num_constructs_found", "num_pairs_unrecognized"]
+
 
 def get_counts_file_suffix():
     return "counts.txt"
@@ -25,71 +46,469 @@ def get_counter_from_names(names_to_count):
     return {x: 0 for x in names_to_count}
 
 
-def generate_construct_counts(grna_matcher, construct_names, output_fp, fw_fastq_fp, rv_fastq_fp):
-    counts_info_tuple = _match_and_count_constructs_from_files(grna_matcher, construct_names, fw_fastq_fp, rv_fastq_fp)
-    counts_by_construct = counts_info_tuple[0]
+def generate_construct_counts(grna_matcher, construct_names, output_fp, fw_fastq_fp, rv_fastq_fp,
+                              use_block_reader=False, use_batch_matching=False,
+                              num_unrecognized_to_keep=0, sampling=None,
+                              num_pairs_per_checkpoint=None, resume=False):
+    """Count the constructs in a fastq pair and write them to output_fp.
+
+    If a fastq_sampling.PairSampling is given, only its sample of the pairs is counted; the counts file's summary
+    line then also holds the match rates (with 95% confidence intervals) and the counts extrapolated to the whole
+    input, and that summary is returned as a string.
+
+    If num_pairs_per_checkpoint is given, or resume is True, the partial counts are saved to a checkpoint file next
+    to output_fp every num_pairs_per_checkpoint pairs (by default, _DEFAULT_NUM_PAIRS_PER_CHECKPOINT); if resume is
+    True, counting continues from any checkpoint left by an earlier, interrupted run on the same inputs.  The
+    checkpoint is removed once the counts file is written.  Checkpoints record byte offsets, so they are only made
+    for uncompressed input.
+
+    If num_unrecognized_to_keep is greater than 0, up to that many of the most common unrecognized read pairs and
+    constructs are also written to a side file next to output_fp (see unrecognized_tracker.get_unrecognized_fp).
+    """
+    construct_index = ConstructIndex(grna_matcher.grna_names, construct_names)
+    return _generate_indexed_construct_counts(grna_matcher, construct_index, output_fp, fw_fastq_fp, rv_fastq_fp,
+                                              use_block_reader, use_batch_matching, num_unrecognized_to_keep,
+                                              sampling, num_pairs_per_checkpoint, resume)
+
+
+def generate_compiled_library_construct_counts(compiled_library_dir, num_allowed_mismatches, output_fp, fw_fastq_fp,
+                                               rv_fastq_fp, use_block_reader=False, use_batch_matching=False,
+                                               num_unrecognized_to_keep=0,
+                                               sampling=None, num_pairs_per_checkpoint=None, resume=False):
+    # only the library directory path is passed to (and pickled for) each parallel task; the library itself is
+    # memory-mapped from disk and loaded at most once per worker process
+    grna_matcher = get_compiled_grna_matcher(compiled_library_dir, num_allowed_mismatches, num_allowed_mismatches)
+    construct_index = load_compiled_library(compiled_library_dir).construct_index
+    return _generate_indexed_construct_counts(grna_matcher, construct_index, output_fp, fw_fastq_fp, rv_fastq_fp,
+                                              use_block_reader, use_batch_matching, num_unrecognized_to_keep,
+                                              sampling, num_pairs_per_checkpoint, resume)
+
+
+def _generate_indexed_construct_counts(grna_matcher, construct_index, output_fp, fw_fastq_fp, rv_fastq_fp,
+                                       use_block_reader, use_batch_matching, num_unrecognized_to_keep, sampling=None,
+                                       num_pairs_per_checkpoint=None, resume=False):
+    unrecognized_tracker = _make_unrecognized_tracker(num_unrecognized_to_keep)
+    if sampling is not None:  # NB: sampled counts are never checkpointed, so no checkpoint can hold them
+        return _generate_sampled_construct_counts(grna_matcher, construct_index, output_fp, fw_fastq_fp, rv_fastq_fp,
+                                                  use_batch_matching, unrecognized_tracker, sampling)
+
+    if num_pairs_per_checkpoint is not None or resume:
+        if not is_gzipped(fw_fastq_fp) and not is_gzipped(rv_fastq_fp):
+            num_pairs_per_checkpoint = _DEFAULT_NUM_PAIRS_PER_CHECKPOINT if num_pairs_per_checkpoint is None \
+                else num_pairs_per_checkpoint
+            _generate_checkpointed_construct_counts(grna_matcher, construct_index, output_fp, fw_fastq_fp,
+                                                    rv_fastq_fp, use_batch_matching, unrecognized_tracker,
+                                                    num_pairs_per_checkpoint, resume)
+            return
+        logging.warning("Can't checkpoint compressed input {0}; counting without checkpoints".format(fw_fastq_fp))
+
+    counts_info_tuple = _match_and_count_constructs_from_files(grna_matcher, construct_index, fw_fastq_fp, rv_fastq_fp,
+                                                               use_block_reader, use_batch_matching,
+                                                               unrecognized_tracker=unrecognized_tracker)
+    construct_counts = counts_info_tuple[0]
     counts_by_type = counts_info_tuple[1]
-    _write_counts(counts_by_construct, counts_by_type, output_fp)
+    _write_counts_and_unrecognized(construct_index, construct_counts, counts_by_type, unrecognized_tracker, output_fp)
+
+
+def _generate_checkpointed_construct_counts(grna_matcher, construct_index, output_fp, fw_fastq_fp, rv_fastq_fp,
+                                            use_batch_matching, unrecognized_tracker, num_pairs_per_checkpoint,
+                                            resume):
+    checkpoint_fp = get_checkpoint_fp(output_fp)
+    construct_counts = construct_index.make_counts_array()
+    counts_by_type = _make_summary_counts()
+    byte_offsets = (0, 0)
+    checkpoint = read_checkpoint(checkpoint_fp, fw_fastq_fp, rv_fastq_fp, construct_index.construct_names,
+                                 grna_matcher.match_settings) if resume else None
+    if checkpoint is not None:
+        logging.info("Resuming {0} from checkpoint at pair number {1}".format(
+            output_fp, checkpoint["counts_by_type"]["num_pairs"]))
+        construct_counts = checkpoint["construct_counts"]
+        counts_by_type = checkpoint["counts_by_type"]
+        byte_offsets = checkpoint["byte_offsets"]
+        unrecognized_tracker = checkpoint["unrecognized_tracker"]
+
+    chunk_byte_ranges = get_paired_chunk_byte_ranges(fw_fastq_fp, rv_fastq_fp, num_pairs_per_checkpoint,
+                                                     byte_offsets)
+    for fw_byte_range, rv_byte_range in chunk_byte_ranges:
+        chunk_construct_counts, chunk_counts_by_type = _match_and_count_constructs_from_files(
+            grna_matcher, construct_index, fw_fastq_fp, rv_fastq_fp, True, use_batch_matching, fw_byte_range,
+            rv_byte_range, unrecognized_tracker)
+        construct_counts += chunk_construct_counts
+        counts_by_type = merge_summary_counts([counts_by_type, chunk_counts_by_type])
+        write_checkpoint(checkpoint_fp, fw_fastq_fp, rv_fastq_fp, construct_index.construct_names,
+                         grna_matcher.match_settings, (fw_byte_range[1], rv_byte_range[1]), construct_counts,
+                         counts_by_type, unrecognized_tracker)
+
+    _write_counts_and_unrecognized(construct_index, construct_counts, counts_by_type, unrecognized_tracker, output_fp)
+    remove_checkpoint(checkpoint_fp)
+
+
+def _generate_sampled_construct_counts(grna_matcher, construct_index, output_fp, fw_fastq_fp, rv_fastq_fp,
+                                       use_batch_matching, unrecognized_tracker, sampling):
+    sample_info = {}
+    sampled_pair_seqs = sampling.generate_pairs(fw_fastq_fp, rv_fastq_fp, False, sample_info)
+    if use_batch_matching:
+        counts_info_tuple = _match_and_count_construct_batches(grna_matcher, construct_index,
+                                                               _batch_pairs(sampled_pair_seqs), unrecognized_tracker)
+    else:
+        counts_info_tuple = _match_and_count_construct_pairs(grna_matcher, construct_index, sampled_pair_seqs,
+                                                             unrecognized_tracker)
+
+    construct_counts, counts_by_type = counts_info_tuple
+    counts_by_type.update(get_sample_estimates(counts_by_type, _SAMPLE_ESTIMATE_KEYS, sample_info))
+    _write_counts_and_unrecognized(construct_index, construct_counts, counts_by_type, unrecognized_tracker, output_fp)
+    return ",".join(["{0}:{1}".format(x, counts_by_type[x]) for x in sorted(counts_by_type)])
+
+
+def generate_filtered_construct_counts(grna_matcher, construct_names, output_fp, fw_fastq_fp, rv_fastq_fp, min_len,
+                                       max_len, retain_len, filtered_fastqs_dir=None, use_block_reader=False,
+                                       use_batch_matching=False,
+                                       num_unrecognized_to_keep=0):
+    """Length-filter and trim unfiltered (scaffold-trimmed) fastq pairs and count constructs in them in a single pass.
+
+    Writes the same counts file that generate_construct_counts would write for the filtered fastqs, and returns the
+    same filter summary string that count_filterer.filter_pair_by_len would.  The filtered fastqs themselves are only
+    written (to filtered_fastqs_dir) if it is given.
+    """
+    filter_counters = {}
+    filtered_pairs = filtered_pair_generator(min_len, max_len, retain_len, fw_fastq_fp, rv_fastq_fp, filter_counters,
+                                             filtered_fastqs_dir, use_block_reader)
+    construct_index = ConstructIndex(grna_matcher.grna_names, construct_names)
+    unrecognized_tracker = _make_unrecognized_tracker(num_unrecognized_to_keep)
+    if use_batch_matching:
+        counts_info_tuple = _match_and_count_construct_batches(grna_matcher, construct_index,
+                                                               _batch_filtered_pairs(filtered_pairs),
+                                                               unrecognized_tracker)
+    else:
+        paired_fastq_seqs = ((fw_record.sequence, rv_record.sequence) for fw_record, rv_record in filtered_pairs)
+        counts_info_tuple = _match_and_count_construct_pairs(grna_matcher, construct_index, paired_fastq_seqs,
+                                                             unrecognized_tracker)
+
+    _write_counts_and_unrecognized(construct_index, counts_info_tuple[0], counts_info_tuple[1], unrecognized_tracker,
+                                   output_fp)
+    return summarize_filter_counts(filter_counters)
+
+
+def get_pair_counts_fp(output_dir, run_prefix, fw_fastq_fp, rv_fastq_fp):
+    """Return the counts file path for a fastq pair, named as the counting notebook names it.
+
+    That is, <pair base>_<run_prefix>_counts.txt, where the pair base is the forward fastq's name without its read
+    designator, as parallel_process_fastqs groups pairs by.
+    """
+    paired_fastqs_by_base, _ = pair_hiseq_read_files([fw_fastq_fp, rv_fastq_fp])
+    pair_base = list(paired_fastqs_by_base.keys())[0]
+    return build_multipart_fp(output_dir, [pair_base, run_prefix, get_counts_file_suffix()])
+
+
+def generate_shard_construct_counts(grna_matcher, construct_names, run_prefix, output_dir, fw_fastq_fp, rv_fastq_fp,
+                                    fw_byte_range, rv_byte_range, use_batch_matching=False,
+                                    num_unrecognized_to_keep=0):
+    # for use with parallel_process_paired_read_shards; run_prefix and output_dir are unused here but name the pair's
+    # counts file in write_merged_shard_construct_counts, which receives the same fixed inputs.  Returns construct
+    # counts as an array indexed by construct id, so shards' counts can simply be summed, plus the summary counts
+    # (which are also recorded as the shard worker's telemetry counts) and the unrecognized tracker (or None).
+    construct_index = ConstructIndex(grna_matcher.grna_names, construct_names)
+    unrecognized_tracker = _make_unrecognized_tracker(num_unrecognized_to_keep)
+    construct_counts, counts_by_type = _match_and_count_constructs_from_files(
+        grna_matcher, construct_index, fw_fastq_fp, rv_fastq_fp, True, use_batch_matching, fw_byte_range,
+        rv_byte_range, unrecognized_tracker)
+    record_counts(counts_by_type)
+    return construct_counts, counts_by_type, unrecognized_tracker
+
+
+def write_merged_shard_construct_counts(grna_matcher, construct_names, run_prefix, output_dir, fw_fastq_fp,
+                                        rv_fastq_fp, shard_counts_info_tuples):
+    """Sum a fastq pair's shard counts and write them to the pair's own counts file (see get_pair_counts_fp)."""
+    construct_index = ConstructIndex(grna_matcher.grna_names, construct_names)
+    construct_counts = construct_index.make_counts_array()
+    unrecognized_tracker = None
+    for curr_construct_counts, _, curr_unrecognized_tracker in shard_counts_info_tuples:
+        construct_counts += curr_construct_counts
+        if unrecognized_tracker is None:
+            unrecognized_tracker = curr_unrecognized_tracker
+        elif curr_unrecognized_tracker is not None:
+            unrecognized_tracker.merge(curr_unrecognized_tracker)
+    counts_by_type = merge_summary_counts([x[1] for x in shard_counts_info_tuples])
+    _write_counts_and_unrecognized(construct_index, construct_counts, counts_by_type, unrecognized_tracker,
+                                   get_pair_counts_fp(output_dir, run_prefix, fw_fastq_fp, rv_fastq_fp))
+
+
+def generate_multi_library_construct_counts(compiled_library_dirs, num_allowed_mismatches, output_fps, fw_fastq_fp,
+                                            rv_fastq_fp, use_batch_matching=False,
+                                            num_unrecognized_to_keep=0):
+    """Count the constructs of each of several compiled libraries during a single read of a fastq pair.
+
+    Each batch of read pairs is matched against every library before the next batch is read, so the fastqs are read
+    only once however many libraries are checked.  Each library's counts (and unrecognized side file) are written to
+    the output_fps entry at the same position as its directory.  Returns one line per library giving its recognized
+    construct rate, so that the library or libraries actually present in the run stand out.
+    """
+    if len(output_fps) != len(compiled_library_dirs):
+        raise ValueError("{0} output file paths were given for {1} libraries".format(len(output_fps),
+                                                                                    len(compiled_library_dirs)))
+
+    grna_matchers = [get_compiled_grna_matcher(x, num_allowed_mismatches, num_allowed_mismatches)
+                     for x in compiled_library_dirs]
+    construct_indices = [load_compiled_library(x).construct_index for x in compiled_library_dirs]
+    # per-pair counting increments lists, as _match_and_count_construct_pairs does; batch counting adds arrays
+    constructs_counts = [x.make_counts_array() if use_batch_matching else [0] * x.num_constructs
+                         for x in construct_indices]
+    summaries_counts = [_make_summary_counts() for _ in compiled_library_dirs]
+    unrecognized_trackers = [_make_unrecognized_tracker(num_unrecognized_to_keep) for _ in compiled_library_dirs]
+
+    paired_fastq_batches = paired_fastq_batch_generator(make_fastq_handler(fw_fastq_fp, True),
+                                                        make_fastq_handler(rv_fastq_fp, True))
+    for fw_seqs, rv_seqs in paired_fastq_batches:
+        prev_num_pairs = summaries_counts[0]["num_pairs"]
+        for library_index, curr_grna_matcher in enumerate(grna_matchers):
+            count_args = [curr_grna_matcher, construct_indices[library_index]]
+            library_state = [constructs_counts[library_index], summaries_counts[library_index],
+                             unrecognized_trackers[library_index]]
+            if use_batch_matching:
+                _count_construct_batch(*count_args, fw_seqs, rv_seqs, *library_state)
+            else:
+                _count_construct_pairs(*count_args, zip(fw_seqs, rv_seqs), *library_state, report_progress=False)
+        _report_batch_progress(prev_num_pairs, summaries_counts[0]["num_pairs"])
 
+    summary_lines = []
+    for library_index, curr_library_dir in enumerate(compiled_library_dirs):
+        curr_summary_counts = summaries_counts[library_index]
+        _write_counts_and_unrecognized(construct_indices[library_index],
+                                       numpy.asarray(constructs_counts[library_index], dtype=numpy.int64),
+                                       curr_summary_counts, unrecognized_trackers[library_index],
+                                       output_fps[library_index])
+        num_pairs = curr_summary_counts["num_pairs"]
+        recognized_rate = curr_summary_counts["num_constructs_recognized"] / num_pairs if num_pairs > 0 else 0
+        summary_lines.append("{0}: num_pairs:{1},num_constructs_recognized:{2},recognized_rate:{3:.4f}".format(
+            get_compiled_library_name(curr_library_dir), num_pairs, curr_summary_counts["num_constructs_recognized"],
+            recognized_rate))
+    return "\n".join(summary_lines)
 
-def _match_and_count_constructs_from_files(grna_matcher, construct_names, fw_fastq_fp, rv_fastq_fp):
-    construct_counts = get_counter_from_names(construct_names)
-    fw_fastq_handler = FastqHandler(fw_fastq_fp)
-    rv_fastq_handler = FastqHandler(rv_fastq_fp)
-    return _match_and_count_constructs(grna_matcher, construct_counts, fw_fastq_handler, rv_fastq_handler)
 
+def generate_demultiplexed_construct_counts(grna_matcher, construct_names, demultiplexer, output_dir, run_prefix,
+                                            fw_fastq_fp, rv_fastq_fp, use_batch_matching=False,
+                                            num_unrecognized_to_keep=0):
+    """Demultiplex a multiplexed (or undetermined) fastq pair and count each sample's constructs in the same pass.
 
-def _match_and_count_constructs(grna_matcher, construct_counts, fw_fastq_handler, rv_fastq_handler):
-    summary_counts = {"num_pairs": 0, "num_pairs_unrecognized": 0, "num_constructs_found": 0,
-                      "num_constructs_unrecognized": 0, "num_constructs_recognized": 0}
+    Each batch of read pairs is split by sample with the barcode_demultiplexer.BarcodeDemultiplexer, and each
+    sample's share is counted straight away, so no per-sample fastqs are written.  Each sample's counts are written
+    to output_dir as <sample name>_<run_prefix>_counts.txt.  Returns one line per sample giving its numbers of pairs
+    and recognized constructs, plus the number of pairs that couldn't be assigned to any sample.
+    """
+    construct_index = ConstructIndex(grna_matcher.grna_names, construct_names)
+    sample_names = demultiplexer.sample_names
+    # per-pair counting increments lists, as _match_and_count_construct_pairs does; batch counting adds arrays
+    constructs_counts = [construct_index.make_counts_array() if use_batch_matching
+                         else [0] * construct_index.num_constructs for _ in sample_names]
+    summaries_counts = [_make_summary_counts() for _ in sample_names]
+    unrecognized_trackers = [_make_unrecognized_tracker(num_unrecognized_to_keep) for _ in sample_names]
+    num_pairs = num_undetermined = 0
 
+    paired_fastq_batches = paired_fastq_batch_generator(make_fastq_handler(fw_fastq_fp, True),
+                                                        make_fastq_handler(rv_fastq_fp, True), True)
+    for fw_records, rv_records in paired_fastq_batches:
+        seqs_by_sample_id, num_batch_undetermined = demultiplexer.group_pairs_by_sample(fw_records, rv_records)
+        num_undetermined += num_batch_undetermined
+        for sample_id, (fw_seqs, rv_seqs) in seqs_by_sample_id.items():
+            sample_state = [constructs_counts[sample_id], summaries_counts[sample_id],
+                             unrecognized_trackers[sample_id]]
+            if use_batch_matching:
+                _count_construct_batch(grna_matcher, construct_index, fw_seqs, rv_seqs, *sample_state)
+            else:
+                _count_construct_pairs(grna_matcher, construct_index, zip(fw_seqs, rv_seqs), *sample_state,
+                                       report_progress=False)
+        _report_batch_progress(num_pairs, num_pairs + len(fw_records))
+        num_pairs += len(fw_records)
+
+    summary_lines = []
+    for sample_id, curr_sample_name in enumerate(sample_names):
+        curr_summary_counts = summaries_counts[sample_id]
+        output_fp = build_multipart_fp(output_dir, [curr_sample_name, run_prefix, get_counts_file_suffix()])
+        _write_counts_and_unrecognized(construct_index, numpy.asarray(constructs_counts[sample_id], dtype=numpy.int64),
+                                       curr_summary_counts, unrecognized_trackers[sample_id], output_fp)
+        summary_lines.append("{0}: num_pairs:{1},num_constructs_recognized:{2}".format(
+            curr_sample_name, curr_summary_counts["num_pairs"], curr_summary_counts["num_constructs_recognized"]))
+    summary_lines.append("undetermined: num_pairs:{0}".format(num_undetermined))
+    # replaces the last sample's counts, recorded as it was written, with those of all the pairs
+    record_counts(dict(merge_summary_counts(summaries_counts), num_pairs=num_pairs,
+                       num_pairs_undetermined=num_undetermined))
+    return "\n".join(summary_lines)
+
+
+def merge_summary_counts(summary_counts_list):
+    result = {}
+    for curr_summary_counts in summary_counts_list:
+        for curr_key, curr_value in curr_summary_counts.items():
+            result[curr_key] = result.get(curr_key, 0) + curr_value
+
+    # rates can't be summed, so recalculate them from the merged counts
+    if "match_cache_hit_rate" in result:
+        result.update(ReadMatchCache.summarize_counts(result["num_match_cache_hits"],
+                                                      result["num_match_cache_misses"]))
+    return result
+
+
+def _make_unrecognized_tracker(num_unrecognized_to_keep):
+    return UnrecognizedTracker(num_unrecognized_to_keep) if num_unrecognized_to_keep > 0 else None
+
+
+def _match_and_count_constructs_from_files(grna_matcher, construct_index, fw_fastq_fp, rv_fastq_fp,
+                                           use_block_reader=False, use_batch_matching=False, fw_byte_range=None,
+                                           rv_byte_range=None, unrecognized_tracker=None):
+    # batch matching needs batches of reads, which only the block reader provides
+    use_block_reader = use_block_reader or use_batch_matching
+    fw_fastq_handler = make_fastq_handler(fw_fastq_fp, use_block_reader, fw_byte_range)
+    rv_fastq_handler = make_fastq_handler(rv_fastq_fp, use_block_reader, rv_byte_range)
+    if use_batch_matching:
+        return _match_and_count_constructs_in_batches(grna_matcher, construct_index, fw_fastq_handler,
+                                                      rv_fastq_handler, unrecognized_tracker)
+    return _match_and_count_constructs(grna_matcher, construct_index, fw_fastq_handler, rv_fastq_handler,
+                                       unrecognized_tracker)
+
+
+def _make_summary_counts():
+    return {"num_pairs": 0, "num_pairs_unrecognized": 0, "num_constructs_found": 0,
+            "num_constructs_unrecognized": 0, "num_constructs_recognized": 0}
+
+
+def _match_and_count_constructs(grna_matcher, construct_index, fw_fastq_handler, rv_fastq_handler,
+                                unrecognized_tracker=None):
     paired_fastq_seqs = paired_fastq_generator(fw_fastq_handler, rv_fastq_handler)
+    return _match_and_count_construct_pairs(grna_matcher, construct_index, paired_fastq_seqs, unrecognized_tracker)
+
+
+def _match_and_count_construct_pairs(grna_matcher, construct_index, paired_fastq_seqs, unrecognized_tracker=None):
+    summary_counts = _make_summary_counts()
+    # incrementing a list element one pair at a time is cheaper than doing so with a numpy array element
+    construct_counts = [0] * construct_index.num_constructs
+    match_cache = grna_matcher.match_cache
+    if match_cache is not None:
+        match_cache.reset_stats()  # keep cached matches from any previous file but report hit rate for this one
+
+    _count_construct_pairs(grna_matcher, construct_index, paired_fastq_seqs, construct_counts, summary_counts,
+                           unrecognized_tracker)
+
+    if match_cache is not None:
+        summary_counts.update(match_cache.summarize())
+    return numpy.array(construct_counts, dtype=numpy.int64), summary_counts
+
+
+def _count_construct_pairs(grna_matcher, construct_index, paired_fastq_seqs, construct_counts, summary_counts,
+                           unrecognized_tracker, report_progress=True):
     for curr_pair_seqs in paired_fastq_seqs:
         summary_counts["num_pairs"] += 1
-        _report_progress(summary_counts["num_pairs"])
+        if report_progress:
+            _report_progress(summary_counts["num_pairs"])
 
-        grna_name_A, grna_name_B = grna_matcher.find_fw_and_rv_read_matches(*curr_pair_seqs)
-        if grna_name_A is not None and grna_name_B is not None:
-            construct_name = _generate_construct_name(grna_name_A, grna_name_B)
+        grna_id_A, grna_id_B = grna_matcher.find_fw_and_rv_read_match_ids(*curr_pair_seqs)
+        if grna_id_A is not None and grna_id_B is not None:
+            construct_id = construct_index.get_construct_id(grna_id_A, grna_id_B)
             summary_counts["num_constructs_found"] += 1
 
-            if construct_name in construct_counts:
+            if construct_id != NO_CONSTRUCT:
                 summary_counts["num_constructs_recognized"] += 1
-                construct_counts[construct_name] += 1
+                construct_counts[construct_id] += 1
             else:
                 summary_counts["num_constructs_unrecognized"] += 1
-                logging.debug("Unrecognized construct name: {0}".format(construct_name))
+                if unrecognized_tracker is not None:
+                    unrecognized_tracker.add_construct(grna_id_A, grna_id_B)
         else:
             summary_counts["num_pairs_unrecognized"] += 1
-            logging.debug("Unrecognized sequence: {0},{1}".format(*curr_pair_seqs))
+            if unrecognized_tracker is not None:
+                unrecognized_tracker.add_sequence_pair(*curr_pair_seqs)
+
+
+def _match_and_count_constructs_in_batches(grna_matcher, construct_index, fw_fastq_handler, rv_fastq_handler,
+                                           unrecognized_tracker=None):
+    paired_fastq_batches = paired_fastq_batch_generator(fw_fastq_handler, rv_fastq_handler)
+    return _match_and_count_construct_batches(grna_matcher, construct_index, paired_fastq_batches,
+                                              unrecognized_tracker)
+
+
+def _match_and_count_construct_batches(grna_matcher, construct_index, paired_fastq_batches,
+                                       unrecognized_tracker=None):
+    summary_counts = _make_summary_counts()
+    construct_counts = construct_index.make_counts_array()
+
+    for fw_seqs, rv_seqs in paired_fastq_batches:
+        prev_num_pairs = summary_counts["num_pairs"]
+        _count_construct_batch(grna_matcher, construct_index, fw_seqs, rv_seqs, construct_counts, summary_counts,
+                               unrecognized_tracker)
+        _report_batch_progress(prev_num_pairs, summary_counts["num_pairs"])
 
     return construct_counts, summary_counts
 
 
+def _count_construct_batch(grna_matcher, construct_index, fw_seqs, rv_seqs, construct_counts, summary_counts,
+                           unrecognized_tracker):
+    summary_counts["num_pairs"] += len(fw_seqs)
+    fw_indices, _, rv_indices, _ = grna_matcher.find_fw_and_rv_read_matches_batch(fw_seqs, rv_seqs)
+    is_found = rv_indices != NO_MATCH  # rv read is only matched if fw read was
+    found_rows = numpy.flatnonzero(is_found)
+    summary_counts["num_pairs_unrecognized"] += len(fw_seqs) - len(found_rows)
+    summary_counts["num_constructs_found"] += len(found_rows)
+
+    construct_ids = construct_index.get_construct_ids(fw_indices[found_rows], rv_indices[found_rows])
+    is_recognized = construct_ids != NO_CONSTRUCT
+    num_recognized = int(is_recognized.sum())
+    summary_counts["num_constructs_recognized"] += num_recognized
+    summary_counts["num_constructs_unrecognized"] += len(found_rows) - num_recognized
+    construct_counts += numpy.bincount(construct_ids[is_recognized], minlength=construct_index.num_constructs)
+
+    if unrecognized_tracker is not None:
+        unrecognized_rows = found_rows[~is_recognized]
+        unrecognized_tracker.add_constructs(fw_indices[unrecognized_rows].tolist(),
+                                            rv_indices[unrecognized_rows].tolist())
+        unfound_rows = numpy.flatnonzero(~is_found).tolist()
+        unrecognized_tracker.add_sequence_pairs([fw_seqs[x] for x in unfound_rows],
+                                                [rv_seqs[x] for x in unfound_rows])
+
+
+def _batch_filtered_pairs(filtered_pairs, batch_size=_FILTERED_BATCH_SIZE):
+    paired_seqs = ((fw_record.sequence, rv_record.sequence) for fw_record, rv_record in filtered_pairs)
+    return _batch_pairs(paired_seqs, batch_size)
+
+
+def _batch_pairs(paired_seqs, batch_size=_FILTERED_BATCH_SIZE):
+    fw_seqs = []
+    rv_seqs = []
+    for fw_seq, rv_seq in paired_seqs:
+        fw_seqs.append(fw_seq)
+        rv_seqs.append(rv_seq)
+        if len(fw_seqs) == batch_size:
+            yield fw_seqs, rv_seqs
+            fw_seqs = []
+            rv_seqs = []
+
+    if len(fw_seqs) > 0:
+        yield fw_seqs, rv_seqs
+
+
 def _report_progress(num_fastq_pairs):
     if num_fastq_pairs % 100000 == 0:
         logging.info("On fastq pair number {0} at {1}".format(num_fastq_pairs, datetime.datetime.now()))
+        record_progress(num_fastq_pairs)
 
 
-def _generate_construct_name(grna_name_A, grna_name_B):
-    return "{0}{1}{2}".format(grna_name_A, get_construct_separator(), grna_name_B)
+def _report_batch_progress(prev_num_fastq_pairs, num_fastq_pairs):
+    # report whenever a batch carries the count past a multiple of 100000, as _report_progress does for single pairs
+    if num_fastq_pairs // 100000 > prev_num_fastq_pairs // 100000:
+        logging.info("On fastq pair number {0} at {1}".format(num_fastq_pairs, datetime.datetime.now()))
+        record_progress(num_fastq_pairs)
 
 
-def _write_counts(counts_by_construct, counts_by_type, output_fp):
-    construct_names = list(counts_by_construct.keys())
-    construct_names.sort()
+def _write_counts_and_unrecognized(construct_index, construct_counts, counts_by_type, unrecognized_tracker,
+                                   output_fp):
+    _write_counts(construct_index.construct_names, construct_counts, counts_by_type, output_fp)
+    record_counts(counts_by_type)
+    if unrecognized_tracker is not None:
+        unrecognized_tracker.write(get_unrecognized_fp(output_fp), construct_index)
 
-    with open(output_fp, 'w') as file_handle:
-        summary_pieces = []
-        for curr_key, curr_value in counts_by_type.items():
-            summary_pieces.append("{0}:{1}".format(curr_key, curr_value))
-        summary_comment = ",".join(summary_pieces)
-        summary_comment = "# " + summary_comment
-        header = ["construct_id", "counts"]
-        writer = csv.writer(file_handle, delimiter="\t")
 
-        writer.writerow([summary_comment])
-        writer.writerow(header)
-        for curr_name in construct_names:
-            row = [curr_name, counts_by_construct[curr_name]]
-            writer.writerow(row)
\ No newline at end of file
+def _write_counts(construct_names, construct_counts, counts_by_type, output_fp):
+    # construct_counts is indexed by construct id, i.e. by position in construct_names; an output_fp ending in .npz
+    # gets the compact binary store rather than text
+    sorted_construct_ids = sorted(range(0, len(construct_names)), key=lambda x: construct_names[x])
+    sorted_counts = numpy.asarray(construct_counts)[sorted_construct_ids].reshape(-1, 1)
+    write_counts(output_fp, [construct_names[x] for x in sorted_construct_ids], ["counts"], sorted_counts,
+                 counts_by_type)
@@ -0,0 +1,114 @@
+"""This module maps pairs of gRNA integer ids to the integer ids of the constructs they make up."""
+
+# third-party libraries
+import numpy
+
+# project-specific libraries
+from ccbbucsd.malicrispr.construct_file_extracter import get_construct_separator
+
+__author__ = "Amanda Birmingham"
+__maintainer__ = "Amanda Birmingham"
+__email__ = "abirmingham@ucsd.edu"
+__status__ = "development"
+
+NO_CONSTRUCT = -1
+
+
+class ConstructIndex:
+    """Integer-id view of a construct library, so that constructs can be counted in a numpy array.
+
+    gRNA ids are positions in grna_names (the same order used by GrnaPositionMatcher) and construct ids are positions
+    in construct_names.  The (gRNA A id, gRNA B id) -> construct id table is stored sparsely, as a sorted array of
+    pair keys (A id * number of gRNAs + B id) alongside the construct id for each key.  Constructs whose name does not
+    split into two known gRNA names keep their id (so they are still reported, with a zero count) but no pair maps to
+    them.
+    """
+
+    def __init__(self, grna_names, construct_names, pair_keys=None, pair_construct_ids=None):
+        """Build the index from gRNA and construct names, or, if pair_keys and pair_construct_ids are given (e.g., from
+        a compiled library), from those previously built arrays and the already de-duplicated construct names.
+
+        Given arrays (and construct names) are used as they are, so memory-mapped ones stay shared: single pairs are
+        then looked up in pair_keys with numpy.searchsorted rather than in a dictionary built by this process.
+        """
+        self._grna_names = list(grna_names)
+        self._construct_ids_by_pair_key = None
+        if pair_keys is None:
+            self._construct_names = list(dict.fromkeys(construct_names))  # drop repeats but keep the input order
+            pair_keys, pair_construct_ids = self._build_pair_arrays(self._grna_names, self._construct_names)
+            self._construct_ids_by_pair_key = dict(zip(pair_keys.tolist(), pair_construct_ids.tolist()))
+        else:
+            self._construct_names = construct_names
+
+        self._pair_keys = pair_keys
+        self._pair_construct_ids = pair_construct_ids
+
+    @staticmethod
+    def _build_pair_arrays(grna_names, construct_names):
+        grna_ids_by_name = {x: i for i, x in enumerate(grna_names)}
+        construct_ids_by_pair_key = {}
+        for curr_construct_id, curr_construct_name in enumerate(construct_names):
+            name_pieces = curr_construct_name.split(get_construct_separator())
+            if len(name_pieces) == 2 and name_pieces[0] in grna_ids_by_name and name_pieces[1] in grna_ids_by_name:
+                pair_key = grna_ids_by_name[name_pieces[0]] * len(grna_names) + grna_ids_by_name[name_pieces[1]]
+                construct_ids_by_pair_key[pair_key] = curr_construct_id
+
+        sorted_pair_keys = sorted(construct_ids_by_pair_key)
+        pair_keys = numpy.array(sorted_pair_keys, dtype=numpy.int64)
+        pair_construct_ids = numpy.array([construct_ids_by_pair_key[x] for x in sorted_pair_keys], dtype=numpy.int64)
+        return pair_keys, pair_construct_ids
+
+    @property
+    def grna_names(self):
+        return self._grna_names
+
+    @property
+    def construct_names(self):
+        return self._construct_names
+
+    @property
+    def pair_keys(self):
+        return self._pair_keys
+
+    @property
+    def pair_construct_ids(self):
+        return self._pair_construct_ids
+
+    @property
+    def num_constructs(self):
+        return len(self._construct_names)
+
+    def make_counts_array(self):
+        return numpy.zeros(self.num_constructs, dtype=numpy.int64)
+
+    def get_construct_id(self, grna_id_A, grna_id_B):
+        """Return the id of the construct made of the two gRNAs, or NO_CONSTRUCT if it is not in the library."""
+        pair_key = self._make_pair_key(grna_id_A, grna_id_B)
+        if self._construct_ids_by_pair_key is not None:
+            return self._construct_ids_by_pair_key.get(pair_key, NO_CONSTRUCT)
+
+        position = numpy.searchsorted(self._pair_keys, pair_key)
+        if position < len(self._pair_keys) and self._pair_keys[position] == pair_key:
+            return int(self._pair_construct_ids[position])
+        return NO_CONSTRUCT
+
+    def get_construct_ids(self, grna_ids_A, grna_ids_B):
+        """Vectorized get_construct_id over two equal-length numpy arrays of gRNA ids."""
+        result = numpy.full(len(grna_ids_A), NO_CONSTRUCT, dtype=numpy.int64)
+        if len(self._pair_keys) == 0:
+            return result
+
+        pair_keys = self._make_pair_key(numpy.asarray(grna_ids_A, dtype=numpy.int64),
+                                        numpy.asarray(grna_ids_B, dtype=numpy.int64))
+        positions = numpy.minimum(numpy.searchsorted(self._pair_keys, pair_keys), len(self._pair_keys) - 1)
+        is_found = self._pair_keys[positions] == pair_keys
+        result[is_found] = self._pair_construct_ids[positions[is_found]]
+        return result
+
+    def get_construct_name(self, grna_id_A, grna_id_B):
+        # builds a name even for constructs that aren't in the library, e.g. for logging unrecognized constructs
+        return "{0}{1}{2}".format(self._grna_names[grna_id_A], get_construct_separator(),
+                                  self._grna_names[grna_id_B])
+
+    def _make_pair_key(self, grna_id_A, grna_id_B):
+        return grna_id_A * len(self._grna_names) + grna_id_B
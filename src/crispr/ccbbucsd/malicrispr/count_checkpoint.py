@@ -0,0 +1,73 @@
+"""This module saves and restores the partial state of a construct counting run so it can be resumed."""
+
+# standard libraries
+import logging
+import os
+import pickle
+import tempfile
+
+# ccbb libraries
+from ccbbucsd.utilities.files_and_paths import get_file_name_pieces, make_file_path
+
+__author__ = "Amanda Birmingham"
+__maintainer__ = "Amanda Birmingham"
+__email__ = "abirmingham@ucsd.edu"
+__status__ = "development"
+
+_FORMAT_VERSION = 2  # change whenever the stored state changes, so that stale checkpoints aren't resumed from
+
+
+def get_checkpoint_file_suffix():
+    return "_checkpoint.pkl"
+
+
+def get_checkpoint_fp(counts_fp):
+    counts_dir, counts_base, _ = get_file_name_pieces(counts_fp)
+    return make_file_path(counts_dir, counts_base, get_checkpoint_file_suffix())
+
+
+def write_checkpoint(checkpoint_fp, fw_fastq_fp, rv_fastq_fp, construct_names, match_settings, byte_offsets,
+                     construct_counts, counts_by_type, unrecognized_tracker):
+    """Save the state of a counting run that has processed every pair before the (fw, rv) byte_offsets.
+
+    match_settings (e.g., GrnaPositionMatcher.match_settings) are saved with the inputs, so that a run with different
+    gRNAs, mismatch counts or search windows doesn't resume from counts it wouldn't have made.
+    """
+    checkpoint = {"format_version": _FORMAT_VERSION,
+                  "input_key": _get_input_key(fw_fastq_fp, rv_fastq_fp, construct_names, match_settings),
+                  "byte_offsets": tuple(byte_offsets),
+                  "construct_counts": construct_counts,
+                  "counts_by_type": counts_by_type,
+                  "unrecognized_tracker": unrecognized_tracker}
+
+    # write to a temporary file and then rename it, so a run killed mid-write leaves the previous checkpoint intact
+    checkpoint_dir = os.path.dirname(os.path.abspath(checkpoint_fp))
+    temp_handle, temp_fp = tempfile.mkstemp(dir=checkpoint_dir)
+    with os.fdopen(temp_handle, 'wb') as file_handle:
+        pickle.dump(checkpoint, file_handle, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_fp, checkpoint_fp)
+
+
+def read_checkpoint(checkpoint_fp, fw_fastq_fp, rv_fastq_fp, construct_names, match_settings):
+    """Return the saved checkpoint dictionary for these inputs, or None if there isn't a usable one."""
+    if not os.path.isfile(checkpoint_fp):
+        return None
+
+    with open(checkpoint_fp, 'rb') as file_handle:
+        checkpoint = pickle.load(file_handle)
+    if checkpoint.get("format_version") != _FORMAT_VERSION or \
+            checkpoint.get("input_key") != _get_input_key(fw_fastq_fp, rv_fastq_fp, construct_names, match_settings):
+        logging.warning("Ignoring checkpoint {0}, which was made for different inputs".format(checkpoint_fp))
+        return None
+    return checkpoint
+
+
+def remove_checkpoint(checkpoint_fp):
+    if os.path.isfile(checkpoint_fp):
+        os.remove(checkpoint_fp)
+
+
+def _get_input_key(fw_fastq_fp, rv_fastq_fp, construct_names, match_settings):
+    # byte offsets are only meaningful in exactly the same files, and counts only for the same library and matching
+    file_stats = [(os.path.abspath(x), os.path.getsize(x), os.path.getmtime(x)) for x in [fw_fastq_fp, rv_fastq_fp]]
+    return file_stats, [str(x) for x in construct_names], match_settings
@@ -1,9 +1,18 @@
+# standard libraries
+import os
+
+# third-party libraries
+import numpy
+import pandas
+
 # ccbb libraries
 from ccbbucsd.utilities.analysis_run_prefixes import strip_run_prefix
-from ccbbucsd.utilities.files_and_paths import build_multipart_fp, group_files, get_filepaths_by_prefix_and_suffix
+from ccbbucsd.utilities.files_and_paths import build_multipart_fp, group_files, get_file_hash, \
+    get_filepaths_by_prefix_and_suffix
 
 # project-specific libraries
-from ccbbucsd.malicrispr.count_files_and_dataframes import get_counts_df
+from ccbbucsd.malicrispr.count_store import get_counts_store_suffix, read_counts, read_counts_store, \
+    read_counts_store_sources, write_counts, write_counts_store
 
 __author__ = "Amanda Birmingham"
 __maintainer__ = "Amanda Birmingham"
@@ -26,42 +35,185 @@ def group_lane_and_set_files(filepaths):
 
 
 def combine_count_files(counts_fp_for_dataset, run_prefix):
-    combined_df = None
-    
-    for curr_counts_fp in counts_fp_for_dataset:
-        count_header, curr_counts_df = get_counts_df(curr_counts_fp, run_prefix)
-        
-        if combined_df is None:
-            combined_df = curr_counts_df
-        else:
-            combined_df[count_header] = curr_counts_df[count_header]
-    
-    return combined_df
+    construct_names, count_headers, counts_matrix = _combine_counts_by_header(counts_fp_for_dataset, run_prefix)
+    return _make_counts_df(construct_names, count_headers, counts_matrix)
+
+
+def combine_counts(counts_fps, column_names):
+    """Combine count files (text or .npz stores) into a single constructs x columns count matrix in one pass.
 
+    column_names holds the name of the column each file's counts go into; the counts of files given the same name
+    (e.g., the lanes of one sample) are summed.  Rows are joined on construct id, so files needn't list the same
+    constructs or list them in the same order; a construct missing from a file has no counts from it.
 
-def write_collapsed_count_files(input_dir, output_dir, curr_run_prefix, counts_run_prefix, counts_suffix, counts_collapsed_file_suffix):
+    Returns the sorted construct ids, the distinct column names in the order first given, and the count matrix.
+    """
+    return _combine_counts_info([read_counts(x) for x in counts_fps], column_names)
+
+
+def write_collapsed_count_files(input_dir, output_dir, curr_run_prefix, counts_run_prefix, counts_suffix,
+                                counts_collapsed_file_suffix):
     counts_fps_for_dataset = get_filepaths_by_prefix_and_suffix(input_dir, counts_run_prefix, counts_suffix)
     fps_by_sample = group_lane_and_set_files(counts_fps_for_dataset)
-    
+
+    counts_fps = []
+    sample_names = []
     for curr_sample, curr_fps in fps_by_sample.items():
         stripped_sample = strip_run_prefix(curr_sample, counts_run_prefix)
-        output_fp = build_multipart_fp(output_dir, [curr_run_prefix, stripped_sample, counts_collapsed_file_suffix]) 
-        combined_df = None        
-        
-        for curr_fp in curr_fps:
-            count_header, curr_counts_df = get_counts_df(curr_fp, counts_run_prefix)
-        
-            if combined_df is None:
-                combined_df = curr_counts_df
-                combined_df.rename(columns = {count_header:stripped_sample}, inplace = True) 
-            else:
-                combined_df[stripped_sample] = combined_df[stripped_sample] + curr_counts_df[count_header]
-    
-        combined_df.to_csv(output_fp, sep="\t", index=False)    
+        counts_fps.extend(curr_fps)
+        sample_names.extend([stripped_sample] * len(curr_fps))
+    construct_names, sample_names, counts_matrix = combine_counts(counts_fps, sample_names)
+
+    # an output suffix ending in .npz gets compact binary stores rather than text files
+    for sample_index, curr_sample in enumerate(sample_names):
+        output_fp = build_multipart_fp(output_dir, [curr_run_prefix, curr_sample, counts_collapsed_file_suffix])
+        write_counts(output_fp, construct_names, [curr_sample], counts_matrix[:, [sample_index]])
 
 
 def write_combined_count_file(input_dir, output_dir, curr_run_prefix, counts_run_prefix, counts_suffix, combined_suffix):
     output_fp = build_multipart_fp(output_dir, [curr_run_prefix, combined_suffix])
+    counts_fps_for_run = sorted(get_filepaths_by_prefix_and_suffix(input_dir, counts_run_prefix, counts_suffix))
+    write_counts(output_fp, *_combine_counts_by_header(counts_fps_for_run, curr_run_prefix))
+
+
+def update_combined_counts_store(store_fp, counts_fps, column_names, replaced_column_names=None):
+    """Fold count files into a combined .npz count store, reading only those it doesn't already hold.
+
+    As for combine_counts, column_names holds the name of the column each file's counts go into.  The store records
+    the path and content hash of every file folded into it, so a file already folded in is skipped, while a new
+    file (e.g., a new lane or a new sample) is added to its column.  A column named in replaced_column_names, or one
+    that an already-folded file has since changed in, is rebuilt from just the files now given for it, which is how
+    a resequenced sample's data is replaced; a replaced column with no files given is removed.  Other columns with no
+    files given are left as they are.
+
+    Returns the paths of the files folded in.
+    """
+    replaced_column_names = set() if replaced_column_names is None else set(replaced_column_names)
+    construct_names, stored_column_names, counts_matrix, source_records = _read_combined_counts_store(store_fp)
+    records_by_path = {x[0]: x for x in source_records}
+
+    new_records_by_path = {}
+    for curr_fp, curr_column_name in zip(counts_fps, column_names):
+        curr_path = os.path.abspath(curr_fp)
+        curr_stat = os.stat(curr_path)
+        prev_record = records_by_path.get(curr_path)
+        if prev_record is not None and prev_record[1:3] == (curr_stat.st_size, curr_stat.st_mtime) and \
+                prev_record[4] == curr_column_name:
+            continue  # unchanged since it was folded in, so no need to hash it again
+        new_record = (curr_path, curr_stat.st_size, curr_stat.st_mtime, get_file_hash(curr_path), curr_column_name)
+        if prev_record is not None and prev_record[3:] == new_record[3:]:
+            records_by_path[curr_path] = new_record  # touched but not changed
+        else:
+            new_records_by_path[curr_path] = new_record
+            if prev_record is not None:
+                replaced_column_names.update([prev_record[4], curr_column_name])
+
+    # clear the rebuilt columns' old counts and sources (keeping the columns in place, unless no files are now given
+    # for them), then fold in all their files along with any new ones
+    kept_column_names = set(column_names)
+    kept_column_indices = [i for i, x in enumerate(stored_column_names) if x not in replaced_column_names or
+                           x in kept_column_names]
+    stored_column_names = [stored_column_names[i] for i in kept_column_indices]
+    counts_matrix = counts_matrix[:, kept_column_indices]
+    counts_matrix[:, [i for i, x in enumerate(stored_column_names) if x in replaced_column_names]] = 0
+    prev_records_by_path = records_by_path
+    records_by_path = {x: y for x, y in records_by_path.items() if y[4] not in replaced_column_names}
+    folded_fps = []
+    folded_column_names = []
+    for curr_fp, curr_column_name in zip(counts_fps, column_names):
+        curr_path = os.path.abspath(curr_fp)
+        if curr_path in new_records_by_path or curr_column_name in replaced_column_names:
+            folded_fps.append(curr_fp)
+            folded_column_names.append(curr_column_name)
+            records_by_path[curr_path] = new_records_by_path.get(curr_path, prev_records_by_path.get(curr_path))
+
+    if len(folded_fps) > 0 or len(replaced_column_names) > 0:
+        new_construct_names, new_column_names, new_counts_matrix = combine_counts(folded_fps, folded_column_names)
+        construct_names, stored_column_names, counts_matrix = _add_count_matrices(
+            (construct_names, stored_column_names, counts_matrix),
+            (new_construct_names, new_column_names, new_counts_matrix))
+        write_counts_store(store_fp, construct_names, stored_column_names, counts_matrix,
+                           source_records=sorted(records_by_path.values()))
+    return folded_fps
+
+
+def write_incremental_combined_count_file(input_dir, output_dir, curr_run_prefix, counts_run_prefix, counts_suffix,
+                                          combined_suffix, replaced_samples=None):
+    """Update a run's combined count store with any new or changed per-lane count files and export it as text.
+
+    Unlike write_collapsed_count_files followed by write_combined_count_file, this reads only the count files not
+    already in the store (kept next to the text output, with a .npz extension); the lanes of each sample are summed
+    into one column named for the sample.
+    """
+    output_fp = build_multipart_fp(output_dir, [curr_run_prefix, combined_suffix])
+    store_fp = build_multipart_fp(output_dir, [curr_run_prefix, get_counts_store_suffix(combined_suffix)])
     counts_fps_for_run = get_filepaths_by_prefix_and_suffix(input_dir, counts_run_prefix, counts_suffix)
-    combined_df = combine_count_files(counts_fps_for_run, curr_run_prefix)
-    combined_df.to_csv(output_fp, sep="\t", index=False)
\ No newline at end of file
+
+    counts_fps = []
+    sample_names = []
+    for curr_sample, curr_fps in sorted(group_lane_and_set_files(counts_fps_for_run).items()):
+        counts_fps.extend(curr_fps)
+        sample_names.extend([strip_run_prefix(curr_sample, counts_run_prefix)] * len(curr_fps))
+    folded_fps = update_combined_counts_store(store_fp, counts_fps, sample_names, replaced_samples)
+    if len(folded_fps) > 0 or not os.path.isfile(output_fp):
+        construct_names, column_names, counts_matrix, _ = read_counts_store(store_fp)
+        write_counts(output_fp, construct_names, column_names, counts_matrix)
+    return folded_fps
+
+
+def _read_combined_counts_store(store_fp):
+    if not os.path.isfile(store_fp):
+        return numpy.array([], dtype=str), [], numpy.zeros((0, 0), dtype=numpy.int64), []
+    construct_names, column_names, counts_matrix, _ = read_counts_store(store_fp)
+    return construct_names, [str(x) for x in column_names], counts_matrix, read_counts_store_sources(store_fp)
+
+
+def _add_count_matrices(counts_info_1, counts_info_2):
+    # joins both matrices' rows on construct id and sums the counts of columns with the same name
+    (construct_names_1, column_names_1, counts_matrix_1), (construct_names_2, column_names_2, counts_matrix_2) = \
+        counts_info_1, counts_info_2
+    all_construct_names = numpy.union1d(construct_names_1, construct_names_2)
+    all_column_names = list(dict.fromkeys(list(column_names_1) + list(column_names_2)))
+    column_indices = {x: i for i, x in enumerate(all_column_names)}
+    result = numpy.zeros((len(all_construct_names), len(all_column_names)), dtype=numpy.int64)
+    for curr_construct_names, curr_column_names, curr_counts_matrix in [counts_info_1, counts_info_2]:
+        row_indices = numpy.searchsorted(all_construct_names, curr_construct_names)
+        curr_column_indices = [column_indices[x] for x in curr_column_names]
+        result[numpy.ix_(row_indices, curr_column_indices)] += curr_counts_matrix
+    return all_construct_names, all_column_names, result
+
+
+def _combine_counts_by_header(counts_fps, run_prefix):
+    # as in count_files_and_dataframes.get_counts_df, each file's counts are named by its (last) count column header;
+    # as when combine_count_files built a data frame, a later file with the same header replaces an earlier one's
+    files_info = [read_counts(x) for x in counts_fps]
+    column_names = []
+    for _, curr_count_headers, _, _ in files_info:
+        _, count_header = os.path.split(str(curr_count_headers[-1]))
+        column_names.append(strip_run_prefix(count_header, run_prefix))
+    return _combine_counts_info(files_info, column_names, is_replaced=True)
+
+
+def _combine_counts_info(files_info, column_names, is_replaced=False):
+    all_construct_names = numpy.unique(numpy.concatenate([x[0] for x in files_info])) if files_info else \
+        numpy.array([], dtype=str)
+    unique_column_names = list(dict.fromkeys(column_names))
+    column_indices = {x: i for i, x in enumerate(unique_column_names)}
+    result = numpy.zeros((len(all_construct_names), len(unique_column_names)), dtype=numpy.int64)
+
+    prev_construct_names = row_indices = None
+    for (curr_construct_names, _, curr_counts_matrix, _), curr_column_name in zip(files_info, column_names):
+        # files from the same library list the same constructs, so their rows only need to be looked up once
+        if prev_construct_names is None or not numpy.array_equal(curr_construct_names, prev_construct_names):
+            row_indices = numpy.searchsorted(all_construct_names, curr_construct_names)
+            prev_construct_names = curr_construct_names
+        if is_replaced:
+            result[:, column_indices[curr_column_name]] = 0
+        numpy.add.at(result[:, column_indices[curr_column_name]], row_indices, curr_counts_matrix[:, -1])
+    return all_construct_names, unique_column_names, result
+
+
+def _make_counts_df(construct_names, column_names, counts_matrix):
+    result = pandas.DataFrame(counts_matrix, columns=column_names)
+    result.insert(0, "construct_id", construct_names)
+    return result
@@ -1,10 +1,14 @@
 # standard libraries
 import logging
+import os
+import shutil
 
 # ccbb libraries
 from ccbbucsd.utilities.bio_seq_utilities import trim_seq
-from ccbbucsd.utilities.basic_fastq import FastqHandler, paired_fastq_generator
+from ccbbucsd.utilities.basic_fastq import make_fastq_handler, paired_fastq_generator
+from ccbbucsd.utilities.fastq_sampling import get_sample_estimates
 from ccbbucsd.utilities.files_and_paths import transform_path
+from ccbbucsd.utilities.worker_telemetry import record_counts, record_progress
 
 __author__ = "Amanda Birmingham"
 __maintainer__ = "Amanda Birmingham"
@@ -16,25 +20,136 @@ def get_filtered_file_suffix():
     return "_len_filtered.fastq"
 
 
-def filter_pair_by_len(min_len, max_len, retain_len, output_dir, fw_fastq_fp, rv_fastq_fp):
-    fw_fastq_handler = FastqHandler(fw_fastq_fp)
-    rv_fastq_handler = FastqHandler(rv_fastq_fp)
-    fw_out_handle, rv_out_handle = _open_output_file_pair(fw_fastq_fp, rv_fastq_fp, output_dir)
-    counters = {"num_pairs": 0, "num_pairs_passing": 0}
+def filter_pair_by_len(min_len, max_len, retain_len, output_dir, fw_fastq_fp, rv_fastq_fp, use_block_reader=False,
+                       sampling=None):
+    """Write the trimmed records of each pair passing the length filter to output_dir and return a summary string.
+
+    If a fastq_sampling.PairSampling is given, only its sample of the pairs is filtered and written, and the summary
+    also reports the passing rate (with a 95% confidence interval) and the passing pairs extrapolated to the whole
+    input.
+    """
+    if sampling is not None:
+        return _filter_sampled_pair_by_len(min_len, max_len, retain_len, output_dir, fw_fastq_fp, rv_fastq_fp,
+                                           sampling)
+
+    fw_fastq_handler = make_fastq_handler(fw_fastq_fp, use_block_reader)
+    rv_fastq_handler = make_fastq_handler(rv_fastq_fp, use_block_reader)
+    fw_out_fp, rv_out_fp = _get_output_fp_pair(fw_fastq_fp, rv_fastq_fp, output_dir)
+    counters = _filter_pair_to_files(fw_fastq_handler, rv_fastq_handler, min_len, max_len, retain_len, fw_out_fp,
+                                     rv_out_fp)
+    record_counts(counters)
+    return _summarize_counts(counters)
+
+
+def filter_shard_pair_by_len(min_len, max_len, retain_len, output_dir, fw_fastq_fp, rv_fastq_fp, fw_byte_range,
+                             rv_byte_range):
+    # for use with parallel_process_paired_read_shards: each shard is written to its own pair of files, which
+    # merge_filtered_shard_pairs later concatenates in order
+    fw_fastq_handler = make_fastq_handler(fw_fastq_fp, True, fw_byte_range)
+    rv_fastq_handler = make_fastq_handler(rv_fastq_fp, True, rv_byte_range)
+    shard_suffix = "" if fw_byte_range is None else _get_shard_suffix(fw_byte_range)
+    fw_out_fp, rv_out_fp = [x + shard_suffix for x in _get_output_fp_pair(fw_fastq_fp, rv_fastq_fp, output_dir)]
+    counters = _filter_pair_to_files(fw_fastq_handler, rv_fastq_handler, min_len, max_len, retain_len, fw_out_fp,
+                                     rv_out_fp)
+    record_counts(counters)
+    return counters, fw_out_fp, rv_out_fp
+
+
+def merge_filtered_shard_pairs(min_len, max_len, retain_len, output_dir, fw_fastq_fp, rv_fastq_fp, shard_results):
+    output_fps = _get_output_fp_pair(fw_fastq_fp, rv_fastq_fp, output_dir)
+    for read_index, curr_output_fp in enumerate(output_fps):
+        shard_fps = [x[read_index + 1] for x in shard_results]
+        if shard_fps == [curr_output_fp]:
+            continue  # single shard was written straight to the output file
+
+        with open(curr_output_fp, 'wb') as output_handle:
+            for curr_shard_fp in shard_fps:
+                with open(curr_shard_fp, 'rb') as shard_handle:
+                    shutil.copyfileobj(shard_handle, output_handle)
+                os.remove(curr_shard_fp)
+
+    counters = {}
+    for curr_counters, _, _ in shard_results:
+        for curr_key, curr_value in curr_counters.items():
+            counters[curr_key] = counters.get(curr_key, 0) + curr_value
+    record_counts(counters)
+    return _summarize_counts(counters)
+
+
+def _filter_sampled_pair_by_len(min_len, max_len, retain_len, output_dir, fw_fastq_fp, rv_fastq_fp, sampling):
+    fw_out_fp, rv_out_fp = _get_output_fp_pair(fw_fastq_fp, rv_fastq_fp, output_dir)
+    counters = make_filter_counters()
+    sample_info = {}
+    sampled_fastq_records = sampling.generate_pairs(fw_fastq_fp, rv_fastq_fp, True, sample_info)
+    filtered_fastq_records = filter_pairs_by_len(sampled_fastq_records, min_len, max_len, retain_len, counters)
+    _write_filtered_pairs(filtered_fastq_records, fw_out_fp, rv_out_fp)
+    counters.update(get_sample_estimates(counters, ["num_pairs_passing"], sample_info))
+    record_counts(counters)
+    return _summarize_counts(counters)
+
 
+def _filter_pair_to_files(fw_fastq_handler, rv_fastq_handler, min_len, max_len, retain_len, fw_out_fp, rv_out_fp):
+    counters = make_filter_counters()
     filtered_fastq_records = _filtered_fastq_generator(fw_fastq_handler, rv_fastq_handler, min_len, max_len, retain_len,
                                                        counters)
+    _write_filtered_pairs(filtered_fastq_records, fw_out_fp, rv_out_fp)
+    return counters
+
+
+def _write_filtered_pairs(filtered_fastq_records, fw_out_fp, rv_out_fp):
+    fw_out_handle = open(fw_out_fp, 'w')
+    rv_out_handle = open(rv_out_fp, 'w')
     for fw_record, rv_record in filtered_fastq_records:
         fw_out_handle.writelines(fw_record.lines)
         rv_out_handle.writelines(rv_record.lines)
 
     fw_out_handle.close()
     rv_out_handle.close()
+
+
+def _get_shard_suffix(byte_range):
+    return ".shard{0}".format(byte_range[0])
+
+
+def filtered_pair_generator(min_len, max_len, retain_len, fw_fastq_fp, rv_fastq_fp, counters, output_dir=None,
+                            use_block_reader=False):
+    """Yield the trimmed (forward, reverse) records of each pair passing the length filter, updating counters.
+
+    This lets filtering feed straight into later steps without the filtered pairs touching disk; the usual
+    _len_filtered.fastq files are written as well only if an output_dir is given.
+    """
+    fw_fastq_handler = make_fastq_handler(fw_fastq_fp, use_block_reader)
+    rv_fastq_handler = make_fastq_handler(rv_fastq_fp, use_block_reader)
+    counters.update(make_filter_counters())
+    filtered_fastq_records = _filtered_fastq_generator(fw_fastq_handler, rv_fastq_handler, min_len, max_len, retain_len,
+                                                       counters)
+    if output_dir is None:
+        yield from filtered_fastq_records
+    else:
+        fw_out_fp, rv_out_fp = _get_output_fp_pair(fw_fastq_fp, rv_fastq_fp, output_dir)
+        with open(fw_out_fp, 'w') as fw_out_handle, open(rv_out_fp, 'w') as rv_out_handle:
+            for fw_record, rv_record in filtered_fastq_records:
+                fw_out_handle.writelines(fw_record.lines)
+                rv_out_handle.writelines(rv_record.lines)
+                yield fw_record, rv_record
+
+
+def make_filter_counters():
+    return {"num_pairs": 0, "num_pairs_passing": 0}
+
+
+def summarize_filter_counts(counters):
     return _summarize_counts(counters)
 
 
-def _filtered_fastq_generator(fw_fastq_handler, rv_fastq_handler, min_len, max_len, retain_len, counters):
-    paired_fastq_records = paired_fastq_generator(fw_fastq_handler, rv_fastq_handler, True)
+def filter_pairs_by_len(paired_fastq_records, min_len, max_len, retain_len, counters):
+    """Yield the trimmed (forward, reverse) records of each input record pair passing the length filter.
+
+    Accepts pairs from any source, e.g. scaffold_trim.scaffold_trimmed_pair_generator, so that trimming can feed
+    filtering directly.
+    """
+    for curr_key in make_filter_counters():
+        counters.setdefault(curr_key, 0)
     for curr_pair_fastq_records in paired_fastq_records:
         counters["num_pairs"] += 1
         _report_progress(counters["num_pairs"])
@@ -53,17 +168,21 @@ def _filtered_fastq_generator(fw_fastq_handler, rv_fastq_handler, min_len, max_l
                 yield fw_record, rv_record
 
 
-def _open_output_file_pair(fw_fastq_fp, rv_fastq_fp, output_dir):
+def _filtered_fastq_generator(fw_fastq_handler, rv_fastq_handler, min_len, max_len, retain_len, counters):
+    paired_fastq_records = paired_fastq_generator(fw_fastq_handler, rv_fastq_handler, True)
+    return filter_pairs_by_len(paired_fastq_records, min_len, max_len, retain_len, counters)
+
+
+def _get_output_fp_pair(fw_fastq_fp, rv_fastq_fp, output_dir):
     fw_fp = transform_path(fw_fastq_fp, output_dir, get_filtered_file_suffix())
     rv_fp = transform_path(rv_fastq_fp, output_dir, get_filtered_file_suffix())
-    fw_handle = open(fw_fp, 'w')
-    rv_handle = open(rv_fp, 'w')
-    return fw_handle, rv_handle
+    return fw_fp, rv_fp
 
 
 def _report_progress(num_fastq_pairs):
     if num_fastq_pairs % 100000 == 0:
         logging.debug("On fastq pair number {0}".format(num_fastq_pairs))
+        record_progress(num_fastq_pairs)
 
 
 def _get_upper_seq(fastq_record):
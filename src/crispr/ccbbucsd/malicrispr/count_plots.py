@@ -1,4 +1,10 @@
+# standard libraries
+import math
+import multiprocessing
+
 # third-party libraries
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 import matplotlib.pyplot
 import numpy
 import pandas
@@ -9,6 +15,7 @@ from ccbbucsd.utilities.files_and_paths import build_multipart_fp, get_file_name
 
 # project-specific libraries
 from ccbbucsd.malicrispr.count_files_and_dataframes import get_counts_df
+from ccbbucsd.malicrispr.count_store import read_counts
 
 __author__ = "Amanda Birmingham"
 __maintainer__ = "Amanda Birmingham"
@@ -16,6 +23,9 @@ __email__ = "abirmingham@ucsd.edu"
 __status__ = "prototype"
 
 DEFAULT_PSEUDOCOUNT = 1
+DEFAULT_FIGSIZE = (20, 20)
+
+_NUM_SAMPLES_PER_BATCH_TASK = 20
 
 
 def get_boxplot_suffix():
@@ -30,27 +40,26 @@ def make_log2_series(input_series, pseudocount_val):
     # note that .reset_index(drop=True) is necessary as matplotlib boxplot function (perhaps among others)
     # throws an error if the input series doesn't include an item with index 0--which can be the case if
     # that first item was NaN and was dropped, and series wasn't reindexed.
-    
+
+
+def make_log2_array(counts_array, pseudocount_val):
+    """Return log2 of the counts plus the pseudocount, for an array of any shape, with infinities made NaN."""
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        result = numpy.log2(numpy.asarray(counts_array, dtype=float) + pseudocount_val)
+    result[numpy.isinf(result)] = numpy.nan
+    return result
+
 
 def show_and_save_histogram(output_fp, title, count_data):
-    matplotlib.pyplot.figure(figsize=(20,20))
-    matplotlib.pyplot.hist(count_data)
-    matplotlib.pyplot.title(title)
-    matplotlib.pyplot.xlabel("log2(raw counts)")
-    matplotlib.pyplot.ylabel("Frequency")
-    matplotlib.pyplot.savefig(output_fp)
+    fig = matplotlib.pyplot.figure(figsize=DEFAULT_FIGSIZE)
+    _draw_histogram(fig, title, count_data)
+    fig.savefig(output_fp)
     matplotlib.pyplot.show()
 
 
 def show_and_save_boxplot(output_fp, title, samples_names, samples_data, rotation_val=0):
-    fig = matplotlib.pyplot.figure(1, figsize=(20,20))
-    ax = fig.add_subplot(111)
-    bp = ax.boxplot(samples_data)
-    ax.set_xticklabels(samples_names, rotation=rotation_val)   
-    ax.set_xlabel("samples")
-    ax.set_ylabel("log2(raw counts)")
-
-    matplotlib.pyplot.title(title)
+    fig = matplotlib.pyplot.figure(1, figsize=DEFAULT_FIGSIZE)
+    _draw_boxplot(fig, title, samples_names, samples_data, rotation_val)
     fig.savefig(output_fp, bbox_inches='tight')
     matplotlib.pyplot.show()
 
@@ -88,3 +97,100 @@ def plot_combined_raw_counts(input_dir, input_run_prefix, combined_suffix, outpu
         
     title = " ".join([input_run_prefix, "all samples", "with pseudocount", str(DEFAULT_PSEUDOCOUNT)])
     show_and_save_boxplot(output_fp, title, samples_names, samples_data, 90)
+
+
+def batch_plot_raw_counts(input_dir, input_run_prefix, counts_suffix, output_dir, output_run_prefix, boxplot_suffix,
+                          num_processes=None, figsize=DEFAULT_FIGSIZE):
+    """Save the same per-sample boxplots and histograms as plot_raw_counts, without displaying them.
+
+    Plots are drawn off-screen (with matplotlib's Agg renderer, never through pyplot), in parallel across
+    num_processes processes (by default, one per cpu); each process reuses one figure for all its plots, so the
+    time and memory taken grow only linearly with the number of samples.  Count files may be text or .npz stores.
+    Returns the paths of the plots saved.
+    """
+    counts_fps_for_run = sorted(get_filepaths_by_prefix_and_suffix(input_dir, input_run_prefix, counts_suffix))
+    num_tasks = int(math.ceil(len(counts_fps_for_run) / _NUM_SAMPLES_PER_BATCH_TASK))
+    task_arguments = [(counts_fps_for_run[x::num_tasks], input_run_prefix, output_dir, boxplot_suffix, figsize)
+                      for x in range(0, num_tasks)]
+
+    result = []
+    if len(task_arguments) > 0:
+        with multiprocessing.Pool(processes=num_processes) as pool:
+            for curr_plot_fps in pool.starmap(_plot_raw_counts_for_samples, task_arguments, chunksize=1):
+                result.extend(curr_plot_fps)
+    return sorted(result)
+
+
+def batch_plot_combined_raw_counts(input_dir, input_run_prefix, combined_suffix, output_dir, output_run_prefix,
+                                   boxplot_suffix, figsize=DEFAULT_FIGSIZE):
+    """Save the same all-samples boxplot as plot_combined_raw_counts, without displaying it; returns its path."""
+    output_fp = build_multipart_fp(output_dir, [output_run_prefix, boxplot_suffix])
+    combined_counts_fp = build_multipart_fp(input_dir, [input_run_prefix, combined_suffix])
+    _, samples_names, counts_matrix, _ = read_counts(combined_counts_fp)
+    log2_matrix = make_log2_array(counts_matrix, DEFAULT_PSEUDOCOUNT)
+    samples_data = [_drop_nans(log2_matrix[:, x]) for x in range(0, len(samples_names))]
+
+    title = " ".join([input_run_prefix, "all samples", "with pseudocount", str(DEFAULT_PSEUDOCOUNT)])
+    fig = _make_offscreen_figure(figsize)
+    _draw_boxplot(fig, title, samples_names, samples_data, 90)
+    fig.savefig(output_fp, bbox_inches='tight')
+    return output_fp
+
+
+def _plot_raw_counts_for_samples(counts_fps, input_run_prefix, output_dir, boxplot_suffix, figsize):
+    samples_names = []
+    samples_counts = []
+    for curr_counts_fp in counts_fps:
+        _, curr_sample, _ = get_file_name_pieces(curr_counts_fp)
+        samples_names.append(strip_run_prefix(curr_sample, input_run_prefix))
+        samples_counts.append(read_counts(curr_counts_fp)[2][:, -1])
+
+    # transform every sample's counts at once, then split them back apart
+    log2_counts = make_log2_array(numpy.concatenate(samples_counts), DEFAULT_PSEUDOCOUNT)
+    samples_log2_counts = numpy.split(log2_counts, numpy.cumsum([len(x) for x in samples_counts])[:-1])
+
+    result = []
+    fig = _make_offscreen_figure(figsize)
+    for curr_sample, curr_log2_counts in zip(samples_names, samples_log2_counts):
+        log2_data = _drop_nans(curr_log2_counts)
+        title = " ".join([input_run_prefix, curr_sample, "with pseudocount", str(DEFAULT_PSEUDOCOUNT)])
+        output_fp_prefix = build_multipart_fp(output_dir, [curr_sample, input_run_prefix])
+
+        boxplot_fp = output_fp_prefix + "_" + boxplot_suffix
+        _draw_boxplot(fig, title, [curr_sample], log2_data)
+        fig.savefig(boxplot_fp, bbox_inches='tight')
+
+        hist_fp = output_fp_prefix + "_" + "hist.png"
+        _draw_histogram(fig, title, log2_data)
+        fig.savefig(hist_fp)
+        result.extend([boxplot_fp, hist_fp])
+    return result
+
+
+def _make_offscreen_figure(figsize):
+    result = Figure(figsize=figsize)
+    FigureCanvasAgg(result)  # attaches itself to the figure
+    return result
+
+
+def _drop_nans(log2_array):
+    return log2_array[~numpy.isnan(log2_array)]
+
+
+def _draw_histogram(fig, title, count_data):
+    fig.clear()  # so a figure can be reused for plot after plot
+    ax = fig.add_subplot(111)
+    ax.hist(count_data)
+    ax.set_title(title)
+    ax.set_xlabel("log2(raw counts)")
+    ax.set_ylabel("Frequency")
+
+
+def _draw_boxplot(fig, title, samples_names, samples_data, rotation_val=0):
+    fig.clear()
+    ax = fig.add_subplot(111)
+    ax.boxplot(samples_data)
+    ax.set_xticklabels(samples_names, rotation=rotation_val)
+    ax.set_xlabel("samples")
+    ax.set_ylabel("log2(raw counts)")
+    ax.set_title(title)
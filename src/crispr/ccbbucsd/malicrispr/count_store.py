@@ -0,0 +1,136 @@
+"""This module reads and writes construct counts as tab-delimited text or as a compact binary (.npz) store."""
+
+# standard libraries
+import csv
+
+# third-party libraries
+import numpy
+
+__author__ = "Amanda Birmingham"
+__maintainer__ = "Amanda Birmingham"
+__email__ = "abirmingham@ucsd.edu"
+__status__ = "development"
+
+_STORE_EXT = ".npz"
+_CONSTRUCT_ID_HEADER = "construct_id"
+
+
+def is_counts_store(counts_fp):
+    return counts_fp.endswith(_STORE_EXT)
+
+
+def get_counts_store_suffix(counts_file_suffix):
+    """Return the suffix of the compact binary store holding the same counts as files with the input text suffix."""
+    return counts_file_suffix.rsplit(".", 1)[0] + _STORE_EXT
+
+
+def write_counts(output_fp, construct_names, count_headers, counts_matrix, counts_by_type=None):
+    """Write a constructs x count columns matrix as a compact binary store if output_fp ends in .npz, else as text.
+
+    construct_names and the rows of counts_matrix are written in the order given.
+    """
+    if is_counts_store(output_fp):
+        write_counts_store(output_fp, construct_names, count_headers, counts_matrix, counts_by_type)
+    else:
+        write_counts_text(output_fp, construct_names, count_headers, counts_matrix, counts_by_type)
+
+
+def read_counts(counts_fp):
+    """Return (construct names, count headers, constructs x count columns matrix, summary counts) from either format."""
+    if is_counts_store(counts_fp):
+        return read_counts_store(counts_fp)
+    return read_counts_text(counts_fp)
+
+
+def write_counts_store(output_fp, construct_names, count_headers, counts_matrix, counts_by_type=None,
+                       source_records=None):
+    """Write the counts to a compact binary store, along with any (path, size, mtime, hash, column) source records.
+
+    Source records note which count files have already been folded into a combined store, and into which column.
+    """
+    counts_by_type = {} if counts_by_type is None else counts_by_type
+    source_records = [] if source_records is None else source_records
+    counts_matrix = numpy.asarray(counts_matrix, dtype=numpy.int64).reshape(len(construct_names), len(count_headers))
+    # numpy.savez_compressed adds .npz to any path not already ending in it, so open the file ourselves
+    with open(output_fp, 'wb') as file_handle:
+        numpy.savez_compressed(file_handle, construct_names=numpy.array(construct_names, dtype=str),
+                               count_headers=numpy.array(count_headers, dtype=str), counts=counts_matrix,
+                               summary_keys=numpy.array(list(counts_by_type.keys()), dtype=str),
+                               summary_values=numpy.array([str(x) for x in counts_by_type.values()], dtype=str),
+                               source_records=numpy.array([[str(y) for y in x] for x in source_records],
+                                                          dtype=str).reshape(len(source_records), 5))
+
+
+def read_counts_store(counts_fp):
+    with numpy.load(counts_fp) as store:
+        summary_counts = {str(x): _parse_summary_value(y) for x, y in zip(store["summary_keys"],
+                                                                           store["summary_values"])}
+        return store["construct_names"], store["count_headers"], store["counts"], summary_counts
+
+
+def read_counts_store_sources(counts_store_fp):
+    """Return the (path, size, mtime, hash, column) records of the count files folded into a combined store."""
+    with numpy.load(counts_store_fp) as store:
+        if "source_records" not in store.files:
+            return []
+        return [(x[0], int(x[1]), float(x[2]), x[3], x[4]) for x in store["source_records"].tolist()]
+
+
+def write_counts_text(output_fp, construct_names, count_headers, counts_matrix, counts_by_type=None):
+    with open(output_fp, 'w') as file_handle:
+        # as pandas.DataFrame.to_csv wrote them, lines end in just a newline
+        writer = csv.writer(file_handle, delimiter="\t", lineterminator="\n")
+        if counts_by_type:
+            summary_pieces = []
+            for curr_key, curr_value in counts_by_type.items():
+                summary_pieces.append("{0}:{1}".format(curr_key, curr_value))
+            writer.writerow(["# " + ",".join(summary_pieces)])
+        writer.writerow([_CONSTRUCT_ID_HEADER] + list(count_headers))
+        for curr_name, curr_counts in zip(construct_names, counts_matrix):
+            writer.writerow([curr_name] + [int(x) for x in curr_counts])
+
+
+def read_counts_text(counts_fp):
+    summary_counts = {}
+    construct_names = []
+    count_rows = []
+    with open(counts_fp) as file_handle:
+        reader = csv.reader(file_handle, delimiter="\t")
+        count_headers = None
+        for curr_row in reader:
+            if len(curr_row) == 0:
+                continue
+            if curr_row[0].startswith("#"):
+                summary_counts.update(_parse_summary_comment(curr_row[0]))
+            elif count_headers is None:
+                count_headers = curr_row[1:]
+            else:
+                construct_names.append(curr_row[0])
+                count_rows.append(curr_row[1:])
+
+    count_headers = [] if count_headers is None else count_headers
+    counts_matrix = numpy.array(count_rows, dtype=numpy.int64).reshape(len(construct_names), len(count_headers))
+    return numpy.array(construct_names, dtype=str), numpy.array(count_headers, dtype=str), counts_matrix, \
+        summary_counts
+
+
+def export_counts_store_to_text(counts_store_fp, output_fp):
+    write_counts_text(output_fp, *read_counts_store(counts_store_fp))
+
+
+def _parse_summary_comment(comment):
+    # e.g. "# num_pairs:6,num_constructs_recognized:3"
+    result = {}
+    for curr_piece in comment.lstrip("#").strip().split(","):
+        curr_key, _, curr_value = curr_piece.partition(":")
+        result[curr_key.strip()] = _parse_summary_value(curr_value)
+    return result
+
+
+def _parse_summary_value(value):
+    # most summary values are counts, but sampled runs also record the sampling method and rate estimates
+    value = str(value).strip()
+    try:
+        return int(value)
+    except ValueError:
+        return value
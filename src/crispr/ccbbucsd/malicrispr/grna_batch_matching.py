@@ -0,0 +1,83 @@
+"""This module matches whole batches of read windows against a gRNA library using vectorized numpy comparisons."""
+
+# third-party libraries
+import numpy
+
+__author__ = "Amanda Birmingham"
+__maintainer__ = "Amanda Birmingham"
+__email__ = "abirmingham@ucsd.edu"
+__status__ = "development"
+
+NO_MATCH = -1
+_MAX_CELLS_PER_CHUNK = 8 * 1024 * 1024  # bounds the size of the reads x library mismatch-count matrix
+_PAD_CODE = 0  # never equal to an encoded base, so padding always counts as a mismatch
+
+
+def _make_complement_lookup():
+    result = numpy.arange(256, dtype=numpy.uint8)  # characters other than canonical bases are left as-is
+    for base, complement in zip(b"ACGTacgt", b"TGCAtgca"):
+        result[base] = complement
+    return result
+
+_COMPLEMENT_LOOKUP = _make_complement_lookup()
+
+
+def encode_seqs(seqs, seq_len, from_3p_end=False):
+    """Encode seqs as a (num seqs x seq_len) uint8 matrix of their first (or last) seq_len characters.
+
+    Also returns a boolean vector marking the seqs that were long enough to fill a full row.
+    """
+    num_seqs = len(seqs)
+    seq_lens = numpy.fromiter(map(len, seqs), dtype=numpy.int64, count=num_seqs)
+    is_full_len = seq_lens >= seq_len
+
+    if num_seqs > 0 and (seq_lens == seq_len).all():
+        # common case (e.g. length-filtered reads): all the characters can be encoded in one step
+        joined_bytes = "".join(seqs).encode("ascii")
+        encoded = numpy.frombuffer(joined_bytes, dtype=numpy.uint8).reshape(num_seqs, seq_len)
+    else:
+        encoded = numpy.full((num_seqs, seq_len), _PAD_CODE, dtype=numpy.uint8)
+        for curr_index, curr_seq in enumerate(seqs):
+            window = curr_seq[-seq_len:] if from_3p_end else curr_seq[:seq_len]
+            if len(window) == seq_len:
+                encoded[curr_index, :] = numpy.frombuffer(window.encode("ascii"), dtype=numpy.uint8)
+    return encoded, is_full_len
+
+
+def rev_comp_encoded_seqs(encoded_seqs):
+    return _COMPLEMENT_LOOKUP[encoded_seqs[:, ::-1]]
+
+
+def find_best_matches(encoded_reads, encoded_library, num_allowed_mismatches):
+    """Return, for each encoded read, the library row index of its best match and the number of mismatches to it.
+
+    Reads with no library entry within num_allowed_mismatches get NO_MATCH for both.  As with the single-read
+    matcher, the entry with the fewest mismatches wins and ties go to the entry that comes first in the library.
+    """
+    num_reads = encoded_reads.shape[0]
+    best_indices = numpy.full(num_reads, NO_MATCH, dtype=numpy.int64)
+    best_num_mismatches = numpy.full(num_reads, NO_MATCH, dtype=numpy.int64)
+    if num_reads == 0 or encoded_library.shape[0] == 0:
+        return best_indices, best_num_mismatches
+
+    # accumulating one position at a time over a reads x library matrix is much faster than building the full
+    # reads x library x position comparison array and summing over its last axis
+    seq_len = encoded_library.shape[1]
+    count_dtype = numpy.uint8 if seq_len <= numpy.iinfo(numpy.uint8).max else numpy.int32
+    library_by_position = numpy.ascontiguousarray(encoded_library.T)
+    chunk_size = max(1, _MAX_CELLS_PER_CHUNK // encoded_library.shape[0])
+    for chunk_start in range(0, num_reads, chunk_size):
+        chunk_end = min(chunk_start + chunk_size, num_reads)
+        chunk_reads = encoded_reads[chunk_start:chunk_end]
+        num_mismatches = numpy.zeros((chunk_end - chunk_start, encoded_library.shape[0]), dtype=count_dtype)
+        for curr_position in range(0, seq_len):
+            num_mismatches += chunk_reads[:, curr_position, None] != library_by_position[curr_position][None, :]
+        chunk_best_indices = num_mismatches.argmin(axis=1)  # argmin returns the first minimum, i.e. library order
+        chunk_best_num_mismatches = num_mismatches[numpy.arange(chunk_end - chunk_start),
+                                                   chunk_best_indices].astype(numpy.int64)
+
+        is_acceptable = chunk_best_num_mismatches <= num_allowed_mismatches
+        best_indices[chunk_start:chunk_end] = numpy.where(is_acceptable, chunk_best_indices, NO_MATCH)
+        best_num_mismatches[chunk_start:chunk_end] = numpy.where(is_acceptable, chunk_best_num_mismatches, NO_MATCH)
+
+    return best_indices, best_num_mismatches
@@ -0,0 +1,184 @@
+"""This module indexes a gRNA library so that reads can be matched to it with up to k mismatches in ~constant time."""
+
+# third-party libraries
+import numpy
+
+__author__ = "Amanda Birmingham"
+__maintainer__ = "Amanda Birmingham"
+__email__ = "abirmingham@ucsd.edu"
+__status__ = "development"
+
+
+class GrnaMismatchIndex:
+    """Exact-match dictionary plus pigeonhole segment index over a list of same-length gRNA sequences.
+
+    If a read window has at most k mismatches to a gRNA, then at least one of k+1 non-overlapping segments of the
+    window must match that gRNA's corresponding segment exactly.  Looking up each segment of the window therefore
+    yields a small candidate set that is guaranteed to contain every gRNA within k mismatches; only those candidates
+    are then checked base by base.
+
+    Matches are resolved by the same rules as a linear scan of the library: the gRNA with the fewest mismatches wins,
+    and ties are broken in favor of the gRNA that comes first in the input list.
+
+    If seed_arrays (from build_seed_arrays, with the same sequences, length and maximum mismatches) are given, e.g.
+    memory-mapped from a compiled library, the exact matches and segments are looked up in those sorted arrays with
+    numpy.searchsorted instead of in dictionaries built by this process.
+    """
+
+    def __init__(self, grna_seqs, seq_len, max_allowed_mismatches, seed_arrays=None):
+        self._grna_seqs = list(grna_seqs)
+        self._seq_len = seq_len
+        self._max_allowed_mismatches = max_allowed_mismatches
+        self._segment_bounds = self._get_segment_bounds(seq_len, max_allowed_mismatches + 1)
+        self._seed_arrays = seed_arrays
+        self._index_by_seq = None
+        self._indices_by_segment_list = None
+        if seed_arrays is None:
+            self._index_by_seq = {}
+            for curr_index, curr_seq in enumerate(self._grna_seqs):
+                self._index_by_seq.setdefault(curr_seq, curr_index)
+            self._indices_by_segment_list = self._build_segment_indices(self._grna_seqs, self._segment_bounds)
+
+    @property
+    def max_allowed_mismatches(self):
+        return self._max_allowed_mismatches
+
+    @classmethod
+    def build_seed_arrays(cls, grna_seqs, seq_len, max_allowed_mismatches):
+        """Return a dictionary of the sorted numpy arrays that can stand in for the index's lookup dictionaries.
+
+        "exact_seqs" holds the distinct gRNA sequences in sorted order and "exact_ids" the (first) gRNA index of each;
+        row i of "segment_seqs" holds every gRNA's segment i in sorted order and the same row of "segment_ids" the gRNA
+        index of each.
+        """
+        grna_seqs = list(grna_seqs)
+        index_by_seq = {}
+        for curr_index, curr_seq in enumerate(grna_seqs):
+            index_by_seq.setdefault(curr_seq, curr_index)
+        exact_seqs = sorted(index_by_seq)
+
+        segment_bounds = cls._get_segment_bounds(seq_len, max_allowed_mismatches + 1)
+        segment_seqs = []
+        segment_ids = []
+        for start, end in [] if segment_bounds is None else segment_bounds:
+            # NB: sort on (segment, index) so each segment's gRNA indices are in library order
+            sorted_segments = sorted((x[start:end], i) for i, x in enumerate(grna_seqs))
+            segment_seqs.append([x[0] for x in sorted_segments])
+            segment_ids.append([x[1] for x in sorted_segments])
+
+        return {"exact_seqs": numpy.array(exact_seqs, dtype="U{0}".format(max(seq_len, 1))),
+                "exact_ids": numpy.array([index_by_seq[x] for x in exact_seqs], dtype=numpy.int64),
+                "segment_seqs": numpy.array(segment_seqs, dtype="U{0}".format(max(seq_len, 1))).reshape(
+                    len(segment_seqs), len(grna_seqs)),
+                "segment_ids": numpy.array(segment_ids, dtype=numpy.int64).reshape(len(segment_ids), len(grna_seqs))}
+
+    @staticmethod
+    def _get_segment_bounds(seq_len, num_segments):
+        if num_segments > seq_len:
+            return None  # can't guarantee an exact segment match, so every gRNA must be checked
+
+        result = []
+        base_len, num_longer = divmod(seq_len, num_segments)
+        start = 0
+        for curr_segment_num in range(0, num_segments):
+            end = start + base_len + (1 if curr_segment_num < num_longer else 0)
+            result.append((start, end))
+            start = end
+        return result
+
+    @staticmethod
+    def _build_segment_indices(grna_seqs, segment_bounds):
+        result = []
+        if segment_bounds is not None:
+            for start, end in segment_bounds:
+                indices_by_segment = {}
+                for curr_index, curr_seq in enumerate(grna_seqs):
+                    indices_by_segment.setdefault(curr_seq[start:end], []).append(curr_index)
+                result.append(indices_by_segment)
+        return result
+
+    def find_best_match(self, input_seq, num_allowed_mismatches):
+        """Return (gRNA list index, number of mismatches) for the best match to input_seq, or (None, None).
+
+        Only the first seq_len bases of input_seq are considered.
+        """
+        if num_allowed_mismatches > self._max_allowed_mismatches:
+            raise ValueError("index supports at most {0} mismatches but {1} were requested".format(
+                self._max_allowed_mismatches, num_allowed_mismatches))
+
+        window = input_seq[:self._seq_len]
+        found_index = self._get_exact_match_index(window)
+        if found_index is not None:
+            return found_index, 0
+
+        if len(window) < self._seq_len:
+            return None, None
+
+        found_num_mismatches = None
+        min_found_mismatches = num_allowed_mismatches + 1  # nothing checked yet so num mismatches is maximum
+        for curr_index in self._get_candidate_indices(window):
+            potential_reference = self._grna_seqs[curr_index]
+            num_mismatches = 0
+            for x in range(0, self._seq_len):
+                if window[x] != potential_reference[x]:
+                    num_mismatches += 1
+                    if num_mismatches >= min_found_mismatches:
+                        break
+
+            if num_mismatches < min_found_mismatches:
+                min_found_mismatches = num_mismatches
+                found_index = curr_index
+                found_num_mismatches = num_mismatches
+
+        return found_index, found_num_mismatches
+
+    def find_best_match_in_window(self, input_seq, num_allowed_mismatches, min_offset, max_offset):
+        """Return (gRNA list index, number of mismatches, offset) for the best match to the seq_len bases starting at
+        any offset from min_offset to max_offset (inclusive) in input_seq, or (None, None, None).
+
+        The segments act as seeds: at each offset, only gRNAs sharing a whole segment with the read there are checked.
+        The match with the fewest mismatches wins; ties go to the lowest offset and then to the first gRNA.
+        """
+        found_index = found_num_mismatches = found_offset = None
+        curr_num_allowed_mismatches = num_allowed_mismatches
+        for curr_offset in range(min_offset, max_offset + 1):
+            window = input_seq[curr_offset:curr_offset + self._seq_len]
+            if len(window) < self._seq_len:
+                break  # every later window is shorter still
+
+            curr_index, curr_num_mismatches = self.find_best_match(window, curr_num_allowed_mismatches)
+            if curr_index is not None:
+                found_index, found_num_mismatches, found_offset = curr_index, curr_num_mismatches, curr_offset
+                if curr_num_mismatches == 0:
+                    break  # can't be beaten by any later offset
+                curr_num_allowed_mismatches = curr_num_mismatches - 1  # later offsets must do strictly better
+
+        return found_index, found_num_mismatches, found_offset
+
+    def _get_candidate_indices(self, window):
+        if self._segment_bounds is None:
+            return range(0, len(self._grna_seqs))
+
+        candidate_indices = set()
+        if self._seed_arrays is None:
+            for (start, end), indices_by_segment in zip(self._segment_bounds, self._indices_by_segment_list):
+                candidate_indices.update(indices_by_segment.get(window[start:end], []))
+        else:
+            segment_seqs = self._seed_arrays["segment_seqs"]
+            segment_ids = self._seed_arrays["segment_ids"]
+            for segment_num, (start, end) in enumerate(self._segment_bounds):
+                first, last = _search_sorted_range(segment_seqs[segment_num], window[start:end])
+                candidate_indices.update(segment_ids[segment_num][first:last].tolist())
+        return sorted(candidate_indices)  # NB: sort so ties are broken in library order, as a linear scan would
+
+    def _get_exact_match_index(self, window):
+        if self._seed_arrays is None:
+            return self._index_by_seq.get(window)
+
+        first, last = _search_sorted_range(self._seed_arrays["exact_seqs"], window)
+        return int(self._seed_arrays["exact_ids"][first]) if last > first else None
+
+
+def _search_sorted_range(sorted_seqs, seq):
+    # the [first, last) positions of seq in sorted_seqs
+    return numpy.searchsorted(sorted_seqs, seq, side="left"), numpy.searchsorted(sorted_seqs, seq, side="right")
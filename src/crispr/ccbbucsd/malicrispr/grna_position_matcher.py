@@ -1,6 +1,14 @@
+# third-party libraries
+import numpy
+
 # ccbb libraries
 from ccbbucsd.utilities.bio_seq_utilities import rev_comp_canonical_dna_seq
 
+# project-specific libraries
+from ccbbucsd.malicrispr.grna_batch_matching import NO_MATCH, encode_seqs, find_best_matches, rev_comp_encoded_seqs
+from ccbbucsd.malicrispr.grna_mismatch_index import GrnaMismatchIndex
+from ccbbucsd.malicrispr.read_match_cache import EvictionPolicy, ReadMatchCache
+
 __author__ = "Amanda Birmingham"
 __maintainer__ = "Amanda Birmingham"
 __email__ = "abirmingham@ucsd.edu"
@@ -8,16 +16,49 @@ __status__ = "development"
 
 
 class GrnaPositionMatcher:
+    """Matches forward and reverse reads to gRNAs with up to a set number of mismatches.
+
+    By default, reads must already be trimmed so that the gRNA is at a fixed position: the first expected_len bases of
+    the forward read and the last expected_len bases of the reverse read.  If a (min offset, max offset)
+    fw_search_window and/or rv_search_window is given, the gRNA (or, in the reverse read, its reverse complement) is
+    instead sought starting at any offset in that range from the read's 5' end, so untrimmed reads can be matched
+    directly; a read whose window is not given is still matched at its fixed position.
+    """
+
     @staticmethod
     def _generate_seqs_to_check(fw_whole_seq, rv_whole_seq):
         rc_whole_rv_seq = rev_comp_canonical_dna_seq(rv_whole_seq)
         return fw_whole_seq, rc_whole_rv_seq
 
-    def __init__(self, grna_names_and_seqs, expected_len, num_allowed_fw_mismatches, num_allowed_rv_mismatches):
+    def __init__(self, grna_names_and_seqs, expected_len, num_allowed_fw_mismatches, num_allowed_rv_mismatches,
+                 cache_size=0, cache_eviction_policy=EvictionPolicy.LRU, encoded_grnas=None, fw_search_window=None,
+                 rv_search_window=None, grna_index=None):
         self._grna_names_and_seqs = grna_names_and_seqs
         self._num_allowed_fw_mismatches = num_allowed_fw_mismatches
         self._num_allowed_rv_mismatches = num_allowed_rv_mismatches
         self._seq_len = expected_len
+        self._grna_names = [x[0] for x in grna_names_and_seqs]
+        self._grna_index = grna_index  # if provided (e.g., by a compiled library), must cover both mismatch counts
+        if grna_index is None:
+            self._grna_index = GrnaMismatchIndex([x[1] for x in grna_names_and_seqs], expected_len,
+                                                 max(num_allowed_fw_mismatches, num_allowed_rv_mismatches))
+        self._encoded_grnas = encoded_grnas  # if not provided, only built if batch matching is used
+        self._match_cache = ReadMatchCache(cache_size, cache_eviction_policy) if cache_size > 0 else None
+
+        self._search_windows = None
+        self._rc_grna_index = None
+        if fw_search_window is not None or rv_search_window is not None:
+            self._search_windows = [None if x is None else tuple(x) for x in [fw_search_window, rv_search_window]]
+            self._rc_grna_index = GrnaMismatchIndex([rev_comp_canonical_dna_seq(x[1]) for x in grna_names_and_seqs],
+                                                    expected_len, self._grna_index.max_allowed_mismatches)
+
+    @property
+    def grna_names(self):
+        return self._grna_names
+
+    @property
+    def match_cache(self):
+        return self._match_cache
 
     @property
     def num_allowed_fw_mismatches(self):
@@ -27,44 +68,152 @@ class GrnaPositionMatcher:
     def num_allowed_rv_mismatches(self):
         return self._num_allowed_rv_mismatches
 
+    @property
+    def search_windows(self):
+        """The (fw, rv) search windows (None for a read matched at its fixed position), or None if neither is set."""
+        return self._search_windows
+
+    @property
+    def match_settings(self):
+        """The gRNAs, gRNA length, allowed mismatches and search windows, which together determine every match."""
+        return {"grna_names_and_seqs": [tuple(x) for x in self._grna_names_and_seqs], "expected_len": self._seq_len,
+                "num_allowed_fw_mismatches": self._num_allowed_fw_mismatches,
+                "num_allowed_rv_mismatches": self._num_allowed_rv_mismatches, "search_windows": self._search_windows}
+
     def find_fw_and_rv_read_matches(self, fw_whole_seq, rv_whole_seq):
+        fw_grna_id, rv_grna_id = self.find_fw_and_rv_read_match_ids(fw_whole_seq, rv_whole_seq)
+        fw_match_name = None if fw_grna_id is None else self._grna_names[fw_grna_id]
+        rv_match_name = None if rv_grna_id is None else self._grna_names[rv_grna_id]
+        return fw_match_name, rv_match_name
+
+    def find_fw_and_rv_read_match_ids(self, fw_whole_seq, rv_whole_seq):
+        """Return the gRNA ids (indices into grna_names) matched by the forward and reverse reads, or None for each."""
+        if self._search_windows is not None:
+            return self._find_windowed_match_ids(fw_whole_seq, rv_whole_seq)
+
         fw_construct_window, rc_rv_construct_window = self._generate_seqs_to_check(fw_whole_seq, rv_whole_seq)
-        return self._id_pair_matches(fw_construct_window, rc_rv_construct_window)
+        if self._match_cache is None:
+            return self._id_pair_match_ids(fw_construct_window, rc_rv_construct_window)
 
-    def _id_pair_matches(self, input1_seq, input2_seq):
-        input2_match_name = None
-        input1_match_name = self._id_sequence_match(self.num_allowed_fw_mismatches, input1_seq)
-        if input1_match_name is not None:
-            input2_match_name = self._id_sequence_match(self.num_allowed_rv_mismatches, input2_seq)
+        # only the first expected_len bases of each window are used in matching, so they are all the key needs
+        cache_key = (fw_construct_window[:self._seq_len], rc_rv_construct_window[:self._seq_len])
+        is_cached, result = self._match_cache.lookup(cache_key)
+        if not is_cached:
+            result = self._id_pair_match_ids(fw_construct_window, rc_rv_construct_window)
+            self._match_cache.store(cache_key, result)
+        return result
+
+    def find_fw_and_rv_read_match_ids_and_offsets(self, fw_whole_seq, rv_whole_seq):
+        """Return (fw gRNA id, fw offset, rv gRNA id, rv offset) for a read pair; unmatched reads get None for both.
+
+        Offsets are where the matched bases start, counted from each read's own 5' end.
+        """
+        if self._search_windows is None:
+            fw_grna_id, rv_grna_id = self.find_fw_and_rv_read_match_ids(fw_whole_seq, rv_whole_seq)
+            fw_offset = None if fw_grna_id is None else 0
+            rv_offset = None if rv_grna_id is None else len(rv_whole_seq) - self._seq_len
+            return fw_grna_id, fw_offset, rv_grna_id, rv_offset
 
+        fw_grna_id, _, fw_offset, rv_grna_id, _, rv_offset = self._find_windowed_matches(fw_whole_seq, rv_whole_seq)
+        return fw_grna_id, fw_offset, rv_grna_id, rv_offset
+
+    def find_fw_and_rv_read_matches_batch(self, fw_whole_seqs, rv_whole_seqs):
+        """Match a batch of read pairs at once using vectorized comparisons against the whole library.
+
+        Returns four numpy arrays: the gRNA indices (into grna_names) of the forward and reverse-complemented reverse
+        read matches, each followed by the corresponding numbers of mismatches.  Unmatched reads get NO_MATCH in both,
+        and (as for single pairs) the reverse read is only matched if the forward read was.  Every read is compared
+        to every gRNA, so this is suited to small and medium-sized libraries.  If search windows are set, each pair is
+        instead matched through the seed index.
+        """
+        if self._search_windows is not None:
+            return self._find_windowed_matches_batch(fw_whole_seqs, rv_whole_seqs)
+
+        encoded_grnas = self._get_encoded_grnas()
+        fw_encoded, fw_is_full_len = encode_seqs(fw_whole_seqs, self._seq_len)
+        fw_indices, fw_num_mismatches = find_best_matches(fw_encoded, encoded_grnas, self.num_allowed_fw_mismatches)
+        fw_indices[~fw_is_full_len] = NO_MATCH
+        fw_num_mismatches[~fw_is_full_len] = NO_MATCH
+
+        rv_indices = numpy.full(len(rv_whole_seqs), NO_MATCH, dtype=numpy.int64)
+        rv_num_mismatches = numpy.full(len(rv_whole_seqs), NO_MATCH, dtype=numpy.int64)
+        rows_to_check = numpy.flatnonzero(fw_indices != NO_MATCH)
+        if len(rows_to_check) > 0:
+            rv_seqs_to_check = [rv_whole_seqs[x] for x in rows_to_check]
+            rv_encoded, rv_is_full_len = encode_seqs(rv_seqs_to_check, self._seq_len, from_3p_end=True)
+            curr_indices, curr_num_mismatches = find_best_matches(rev_comp_encoded_seqs(rv_encoded), encoded_grnas,
+                                                                  self.num_allowed_rv_mismatches)
+            rv_indices[rows_to_check] = numpy.where(rv_is_full_len, curr_indices, NO_MATCH)
+            rv_num_mismatches[rows_to_check] = numpy.where(rv_is_full_len, curr_num_mismatches, NO_MATCH)
+
+        return fw_indices, fw_num_mismatches, rv_indices, rv_num_mismatches
+
+    def _find_windowed_matches_batch(self, fw_whole_seqs, rv_whole_seqs):
+        result = [numpy.full(len(fw_whole_seqs), NO_MATCH, dtype=numpy.int64) for _ in range(0, 4)]
+        for row_index, (fw_whole_seq, rv_whole_seq) in enumerate(zip(fw_whole_seqs, rv_whole_seqs)):
+            matches = self._find_windowed_matches(fw_whole_seq, rv_whole_seq)
+            for output_index, match_index in enumerate([0, 1, 3, 4]):  # ids and mismatch counts but not offsets
+                if matches[match_index] is not None:
+                    result[output_index][row_index] = matches[match_index]
+        return tuple(result)
+
+    def _find_windowed_match_ids(self, fw_whole_seq, rv_whole_seq):
+        if self._match_cache is None:
+            matches = self._find_windowed_matches(fw_whole_seq, rv_whole_seq)
+            return matches[0], matches[3]
+
+        # the gRNA can be anywhere in the window, so the whole reads are the key
+        cache_key = (fw_whole_seq, rv_whole_seq)
+        is_cached, result = self._match_cache.lookup(cache_key)
+        if not is_cached:
+            matches = self._find_windowed_matches(fw_whole_seq, rv_whole_seq)
+            result = (matches[0], matches[3])
+            self._match_cache.store(cache_key, result)
+        return result
+
+    def _find_windowed_matches(self, fw_whole_seq, rv_whole_seq):
+        # as for fixed-position matching, the reverse read is only matched if the forward read was
+        fw_search_window, rv_search_window = self._search_windows
+        fw_min_offset, fw_max_offset = (0, 0) if fw_search_window is None else fw_search_window
+        if rv_search_window is None:
+            # the fixed position is the read's last expected_len bases; a shorter read's only window is too short
+            rv_min_offset = rv_max_offset = max(len(rv_whole_seq) - self._seq_len, 0)
+        else:
+            rv_min_offset, rv_max_offset = rv_search_window
+        fw_match = self._grna_index.find_best_match_in_window(fw_whole_seq, self.num_allowed_fw_mismatches,
+                                                              fw_min_offset, fw_max_offset)
+        rv_match = (None, None, None)
+        if fw_match[0] is not None:
+            rv_match = self._rc_grna_index.find_best_match_in_window(rv_whole_seq, self.num_allowed_rv_mismatches,
+                                                                     rv_min_offset, rv_max_offset)
+        return fw_match + rv_match
+
+    def _get_encoded_grnas(self):
+        if self._encoded_grnas is None:
+            self._encoded_grnas, _ = encode_seqs([x[1] for x in self._grna_names_and_seqs], self._seq_len)
+        return self._encoded_grnas
+
+    def _id_pair_matches(self, input1_seq, input2_seq):
+        input1_match_id, input2_match_id = self._id_pair_match_ids(input1_seq, input2_seq)
+        input1_match_name = None if input1_match_id is None else self._grna_names[input1_match_id]
+        input2_match_name = None if input2_match_id is None else self._grna_names[input2_match_id]
         return input1_match_name, input2_match_name
 
-    def _id_sequence_match(self, num_allowed_mismatches, input_seq):
-        found_name = None
+    def _id_pair_match_ids(self, input1_seq, input2_seq):
+        input2_match_id = None
+        input1_match_id = self._id_sequence_match_id(self.num_allowed_fw_mismatches, input1_seq)
+        if input1_match_id is not None:
+            input2_match_id = self._id_sequence_match_id(self.num_allowed_rv_mismatches, input2_seq)
 
-        # check for perfect matches
-        for potential_name, potential_reference in self._grna_names_and_seqs:
-            if input_seq == potential_reference:
-                found_name = potential_name
-                break
-
-        # if no perfect matches found, check for mismatches
-        if found_name is None:
-            min_found_mismatches = num_allowed_mismatches + 1  # nothing checked yet so num mismatches is maximum
-            found_name = None
-            for potential_name, potential_reference in self._grna_names_and_seqs:
-
-                # this way is not elegant, but it IS fast :) .... >3x faster than XOR approach
-                num_mismatches = 0
-                for x in range(0, self._seq_len):
-                    if input_seq[x] != potential_reference[x]:  # NB assumption that both are the same fixed length!
-                        num_mismatches += 1
-                        if num_mismatches > num_allowed_mismatches:
-                            break
-
-                if num_mismatches < min_found_mismatches:
-                    min_found_mismatches = num_mismatches
-                    if num_mismatches <= num_allowed_mismatches:
-                        found_name = potential_name
+        return input1_match_id, input2_match_id
 
+    def _id_sequence_match(self, num_allowed_mismatches, input_seq):
+        found_name = None
+        found_index = self._id_sequence_match_id(num_allowed_mismatches, input_seq)
+        if found_index is not None:
+            found_name = self._grna_names[found_index]
         return found_name
+
+    def _id_sequence_match_id(self, num_allowed_mismatches, input_seq):
+        found_index, _ = self._grna_index.find_best_match(input_seq, num_allowed_mismatches)
+        return found_index
@@ -0,0 +1,43 @@
+"""This module declares the notebooks of the dual CRISPR pipeline along with the files each one reads and writes."""
+
+# standard libraries
+import enum
+import os
+
+__author__ = "Amanda Birmingham"
+__maintainer__ = "Amanda Birmingham"
+__email__ = "abirmingham@ucsd.edu"
+__status__ = "development"
+
+
+class PipelineSteps(enum.Enum):
+    SCAFFOLD_TRIMMING = 0
+    TRIMMED_READ_FILTERING = 1
+    CONSTRUCT_COUNTING = 2
+    COUNT_COMBINATION = 3
+    COUNT_PLOTTING = 4
+
+
+def get_pipeline_steps(notebooks_dir, fastqs_dir, interim_fastq_set_dir, constructs_fp, fastq_counts_run_prefix):
+    """Return the notebook_pipeliner.execute_run step declarations of the pipeline, by PipelineSteps member.
+
+    Each step is [notebook dir, notebook name, input paths, output paths].  The trimmed, filtered and per-fastq count
+    files of all of a fastq set's runs share its interim directory, so each step's wildcards must match only the
+    files that step itself writes: the scaffold-trimmed fastqs (e.g. X_trimmed53.fastq) but not the length-filtered
+    ones made from them (X_trimmed53_len_filtered.fastq), and only the counts made with this run's
+    fastq_counts_run_prefix (which may hold the {timestamp} placeholder) rather than those of any other run.
+    """
+    trimmed_fastqs = os.path.join(interim_fastq_set_dir, "*_trimmed??.fastq")
+    filtered_fastqs = os.path.join(interim_fastq_set_dir, "*_len_filtered.fastq")
+    fastq_counts = os.path.join(interim_fastq_set_dir, "*_" + fastq_counts_run_prefix + "_counts.txt")
+    combined_counts = os.path.join("{run_dir}", "*counts_combined.txt")
+    return {PipelineSteps.SCAFFOLD_TRIMMING: [notebooks_dir, "Dual CRISPR 1-Construct Scaffold Trimming.ipynb",
+                                              [fastqs_dir], [trimmed_fastqs]],
+            PipelineSteps.TRIMMED_READ_FILTERING: [notebooks_dir, "Dual CRISPR 2-Constuct Filter.ipynb",
+                                                   [trimmed_fastqs], [filtered_fastqs]],
+            PipelineSteps.CONSTRUCT_COUNTING: [notebooks_dir, "Dual CRISPR 3-Construct Counting.ipynb",
+                                               [filtered_fastqs, constructs_fp], [fastq_counts]],
+            PipelineSteps.COUNT_COMBINATION: [notebooks_dir, "Dual CRISPR 4-Count Combination.ipynb",
+                                              [fastq_counts], [combined_counts]],
+            PipelineSteps.COUNT_PLOTTING: [notebooks_dir, "Dual CRISPR 5-Count Plots.ipynb",
+                                           [combined_counts], [os.path.join("{run_dir}", "*.png")]]}
@@ -0,0 +1,74 @@
+"""This module provides a bounded cache of read-window-to-gRNA match results."""
+
+# standard libraries
+import collections
+import enum
+
+__author__ = "Amanda Birmingham"
+__maintainer__ = "Amanda Birmingham"
+__email__ = "abirmingham@ucsd.edu"
+__status__ = "development"
+
+
+class EvictionPolicy(enum.Enum):
+    LRU = "lru"  # evict the entry that was least recently looked up
+    FIFO = "fifo"  # evict the entry that was added first; cheaper, since hits don't reorder the cache
+
+
+class ReadMatchCache:
+    """Bounded map from read windows to their already-resolved matches, including 'no match' results.
+
+    Hit and miss counts are tracked so that the amount of matching work saved can be reported.
+    """
+
+    def __init__(self, max_size, eviction_policy=EvictionPolicy.LRU):
+        if max_size < 1:
+            raise ValueError("cache max_size must be at least 1 but is {0}".format(max_size))
+
+        self._max_size = max_size
+        self._eviction_policy = EvictionPolicy(eviction_policy)
+        self._entries = collections.OrderedDict()
+        self.num_hits = 0
+        self.num_misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self):
+        return self._calc_hit_rate(self.num_hits, self.num_misses)
+
+    @staticmethod
+    def _calc_hit_rate(num_hits, num_misses):
+        num_lookups = num_hits + num_misses
+        return num_hits / num_lookups if num_lookups > 0 else 0.0
+
+    @classmethod
+    def summarize_counts(cls, num_hits, num_misses):
+        return {"num_match_cache_hits": num_hits, "num_match_cache_misses": num_misses,
+                "match_cache_hit_rate": round(cls._calc_hit_rate(num_hits, num_misses), 4)}
+
+    def lookup(self, key):
+        """Return (True, cached value) if key is in the cache, (False, None) otherwise."""
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.num_misses += 1
+            return False, None
+
+        self.num_hits += 1
+        if self._eviction_policy == EvictionPolicy.LRU:
+            self._entries.move_to_end(key)
+        return True, value
+
+    def store(self, key, value):
+        self._entries[key] = value
+        if len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)  # both policies evict from the front of the ordering
+
+    def reset_stats(self):
+        self.num_hits = 0
+        self.num_misses = 0
+
+    def summarize(self):
+        return self.summarize_counts(self.num_hits, self.num_misses)
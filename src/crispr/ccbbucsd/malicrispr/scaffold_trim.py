@@ -1,10 +1,15 @@
 # standard libraries
+import concurrent.futures
 import enum
 
 # third-party libraries
+import cutadapt
+import cutadapt.adapters
+import cutadapt.seqio
 import cutadapt.scripts.cutadapt
 
 # ccbb libraries
+from ccbbucsd.utilities.basic_fastq import BlockFastqHandler, paired_fastq_batch_generator
 from ccbbucsd.utilities.files_and_paths import get_file_name_pieces, make_file_path
 
 __author__ = 'Amanda Birmingham'
@@ -13,6 +18,13 @@ __email__ = "abirmingham@ucsd.edu"
 __status__ = "prototype"
 
 
+# cutadapt's command-line defaults, which the cutadapt runs below use
+_DEFAULT_MAX_ERROR_RATE = 0.1
+_DEFAULT_MIN_OVERLAP = 3
+# ScaffoldTrimmer uses cutadapt's internal adapter API, which cutadapt 2 removed
+_SUPPORTED_CUTADAPT_MAJOR_VERSION = 1
+
+
 class TrimType(enum.Enum):
     FIVE = "5"
     THREE = "3"
@@ -28,6 +40,96 @@ def trim_linked_scaffold(output_dir, fastq_fp, scaffold_seq_5p, scaffold_seq_3p,
     return _run_cutadapt(output_dir, fastq_fp, TrimType.FIVE_THREE, args, quiet)
 
 
+class ScaffoldTrimmer:
+    """Removes a 5' and/or 3' scaffold from fastq records in one pass, as chained cutadapt -g and -a runs would.
+
+    Matching is done by cutadapt's own adapter aligner with cutadapt's default settings, so error-tolerant and
+    truncated scaffold matches are found exactly as in the cutadapt runs.  As in those runs, the 3' scaffold is only
+    looked for in what is left of the read after the 5' scaffold (and everything before it) has been removed.
+    Requires cutadapt 1.x; a RuntimeError is raised for any other version.
+    """
+
+    def __init__(self, scaffold_seq_5p=None, scaffold_seq_3p=None, max_error_rate=_DEFAULT_MAX_ERROR_RATE,
+                 min_overlap=_DEFAULT_MIN_OVERLAP):
+        _check_cutadapt_version()
+        self._adapter_5p = None
+        self._adapter_3p = None
+        if scaffold_seq_5p is not None:
+            self._adapter_5p = cutadapt.adapters.Adapter(scaffold_seq_5p, cutadapt.adapters.FRONT, max_error_rate,
+                                                         min_overlap, name="scaffold_5p")
+        if scaffold_seq_3p is not None:
+            self._adapter_3p = cutadapt.adapters.Adapter(scaffold_seq_3p, cutadapt.adapters.BACK, max_error_rate,
+                                                         min_overlap, name="scaffold_3p")
+
+    @property
+    def trim_type(self):
+        if self._adapter_5p is not None and self._adapter_3p is not None:
+            return TrimType.FIVE_THREE
+        return TrimType.FIVE if self._adapter_5p is not None else TrimType.THREE
+
+    def trim_record(self, fastq_record):
+        """Trim the scaffold(s) from the sequence and quality of the input record in place, and return it."""
+        if self._adapter_5p is not None:
+            match = self._adapter_5p.match_to(_make_cutadapt_read(fastq_record))
+            if match is not None:
+                # front adapter: remove the match and everything before it
+                fastq_record.sequence = fastq_record.sequence[match.rstop:]
+                fastq_record.quality = fastq_record.quality[match.rstop:]
+
+        if self._adapter_3p is not None:
+            match = self._adapter_3p.match_to(_make_cutadapt_read(fastq_record))
+            if match is not None:
+                # back adapter: remove the match and everything after it
+                fastq_record.sequence = fastq_record.sequence[:match.rstart]
+                fastq_record.quality = fastq_record.quality[:match.rstart]
+        return fastq_record
+
+    def trim_records(self, fastq_records):
+        for curr_record in fastq_records:
+            self.trim_record(curr_record)
+        return fastq_records
+
+
+def trim_scaffolds_from_pair(output_dir, full_5p_r1, full_3p_r1, full_5p_r2, full_3p_r2, fw_fastq_fp, rv_fastq_fp):
+    """Write scaffold-trimmed copies of a forward/reverse fastq pair, reading each input file only once.
+
+    Output is equivalent to that of trim_global_scaffold for each file, but is written with the suffix for the
+    trimming done (e.g., _trimmed53.fastq) rather than as a chain of per-scaffold intermediate files.
+    """
+    fw_trimmer = ScaffoldTrimmer(full_5p_r1, full_3p_r1)
+    rv_trimmer = ScaffoldTrimmer(full_5p_r2, full_3p_r2)
+    fw_output_fp = _make_trimmed_fp(output_dir, fw_fastq_fp, fw_trimmer.trim_type)
+    rv_output_fp = _make_trimmed_fp(output_dir, rv_fastq_fp, rv_trimmer.trim_type)
+
+    with open(fw_output_fp, 'w') as fw_out_handle, open(rv_output_fp, 'w') as rv_out_handle:
+        for fw_records, rv_records in _trimmed_pair_batch_generator(fw_trimmer, rv_trimmer, fw_fastq_fp, rv_fastq_fp):
+            fw_out_handle.write("".join([x.to_string() for x in fw_records]))
+            rv_out_handle.write("".join([x.to_string() for x in rv_records]))
+
+    return fw_output_fp, rv_output_fp
+
+
+def scaffold_trimmed_pair_generator(full_5p_r1, full_3p_r1, full_5p_r2, full_3p_r2, fw_fastq_fp, rv_fastq_fp):
+    """Yield scaffold-trimmed (forward, reverse) record pairs, e.g. to feed count_filterer.filter_pairs_by_len."""
+    fw_trimmer = ScaffoldTrimmer(full_5p_r1, full_3p_r1)
+    rv_trimmer = ScaffoldTrimmer(full_5p_r2, full_3p_r2)
+    for fw_records, rv_records in _trimmed_pair_batch_generator(fw_trimmer, rv_trimmer, fw_fastq_fp, rv_fastq_fp):
+        yield from zip(fw_records, rv_records)
+
+
+def _trimmed_pair_batch_generator(fw_trimmer, rv_trimmer, fw_fastq_fp, rv_fastq_fp):
+    # each batch's reverse mates are trimmed on a worker thread while its forward mates are trimmed on this one;
+    # cutadapt's aligner releases the GIL for its alignment loop (see the nogil block in cutadapt/_align.pyx), so the
+    # two mates' alignments can run at the same time
+    paired_batches = paired_fastq_batch_generator(BlockFastqHandler(fw_fastq_fp), BlockFastqHandler(rv_fastq_fp),
+                                                  get_full_record=True)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        for fw_records, rv_records in paired_batches:
+            rv_future = executor.submit(rv_trimmer.trim_records, rv_records)
+            fw_records = fw_trimmer.trim_records(fw_records)
+            yield fw_records, rv_future.result()
+
+
 def trim_global_scaffold(output_dir, fastq_fp, scaffold_seq_5p=None, scaffold_seq_3p=None, quiet=True):
     curr_fastq_fp = fastq_fp
 
@@ -51,9 +153,25 @@ def _run_cutadapt_global(output_dir, input_fastq_fp, seq_to_trim, is_5p, quiet):
     return _run_cutadapt(output_dir, input_fastq_fp, end_name, args, quiet)
 
 
-def _run_cutadapt(output_dir, input_fastq_fp, trim_name, partial_args, quiet):
+def _check_cutadapt_version():
+    major_version = int(cutadapt.__version__.split(".")[0])
+    if major_version != _SUPPORTED_CUTADAPT_MAJOR_VERSION:
+        raise RuntimeError("ScaffoldTrimmer requires cutadapt {0}.x but cutadapt {1} is installed".format(
+            _SUPPORTED_CUTADAPT_MAJOR_VERSION, cutadapt.__version__))
+
+
+def _make_cutadapt_read(fastq_record):
+    # cutadapt's matches slice the read they were found in, so it must be one of cutadapt's own sequence objects
+    return cutadapt.seqio.Sequence("", fastq_record.sequence, fastq_record.quality)
+
+
+def _make_trimmed_fp(output_dir, input_fastq_fp, trim_name):
     _, input_base, _ = get_file_name_pieces(input_fastq_fp)
-    output_fastq_fp = make_file_path(output_dir, input_base, get_trimmed_suffix(trim_name))
+    return make_file_path(output_dir, input_base, get_trimmed_suffix(trim_name))
+
+
+def _run_cutadapt(output_dir, input_fastq_fp, trim_name, partial_args, quiet):
+    output_fastq_fp = _make_trimmed_fp(output_dir, input_fastq_fp, trim_name)
     args = [x for x in partial_args]
     if quiet:
         args.append("--quiet")
@@ -0,0 +1,131 @@
+"""This module generates deterministic synthetic dual-gRNA libraries and paired fastqs, untrimmed or scaffold-trimmed,
+for them."""
+
+# standard libraries
+import os
+import random
+
+# ccbb libraries
+from ccbbucsd.utilities.bio_seq_utilities import rev_comp_canonical_dna_seq
+
+# project-specific libraries
+from ccbbucsd.malicrispr.construct_file_extracter import get_construct_separator
+
+__author__ = "Amanda Birmingham"
+__maintainer__ = "Amanda Birmingham"
+__email__ = "abirmingham@ucsd.edu"
+__status__ = "development"
+
+# the full scaffolds around gRNA A in the forward read and the reverse complement of gRNA B in the reverse read (as
+# in mali_pipeliner.py); the start of the 3' forward one and the end of the 5' reverse one are also what is left
+# behind when scaffold trimming falls short
+FULL_5P_R1 = "TATATATCTTGTGGAAAGGACGAAACACCG"
+FULL_5P_R2 = "CCTTATTTTAACTTGCTATTTCTAGCTCTAAAAC"
+FULL_3P_R1 = "GTTTCAGAGCTATGCTGGAAACTGCATAGCAAGTTGAAATAAGGCTAGTCCGTTATCAACTTGAAAAAGTGGCACCGAGTCGGTGCTTTTTTGTACTGAG"
+FULL_3P_R2 = "CAAACAAGGCTTTTCTCCAAGGGATATTTATAGTCTCAAAACACACAATTACTTTACAGTTAGGGTGAGTTTCCTTTTGTGCTGTTTTTTAAAATA"
+_BASES = "ACGT"
+
+
+def make_synthetic_library(num_constructs, min_grna_len=19, max_grna_len=21, seed=0):
+    """Return a random library's full-length gRNA (name, sequence) tuples and its construct names.
+
+    Constructs pair distinct A and B gRNAs, using about the square root of num_constructs gRNAs on each side, as in a
+    combinatorial screen; gRNA lengths are spread evenly from min_grna_len to max_grna_len.
+    """
+    rng = random.Random(seed)
+    num_grnas_per_side = 1
+    while num_grnas_per_side * num_grnas_per_side < num_constructs:
+        num_grnas_per_side += 1
+
+    grnas = []
+    unique_seqs = set()
+    while len(grnas) < 2 * num_grnas_per_side:
+        grna_len = min_grna_len + len(grnas) % (max_grna_len - min_grna_len + 1)
+        grna_seq = "".join(rng.choice(_BASES) for _ in range(0, grna_len))
+        if grna_seq[-min_grna_len:] in unique_seqs:
+            continue  # gRNAs must still be distinct once trimmed to the length matched
+        unique_seqs.add(grna_seq[-min_grna_len:])
+        side = "a" if len(grnas) < num_grnas_per_side else "b"
+        grnas.append(("{0}{1}".format(side, len(grnas) % num_grnas_per_side), grna_seq))
+
+    all_pairs = [(x, y) for x in range(0, num_grnas_per_side) for y in range(num_grnas_per_side, len(grnas))]
+    construct_pairs = sorted(rng.sample(all_pairs, num_constructs))
+    construct_names = [get_construct_separator().join([grnas[x][0], grnas[y][0]]) for x, y in construct_pairs]
+    return grnas, construct_names
+
+
+def write_synthetic_fastq_pair(output_dir, base_name, grnas, construct_names, num_pairs, mismatch_rate=0.0,
+                               truncation_rate=0.0, max_truncation_len=10, seed=0):
+    """Write num_pairs of scaffold-trimmed read pairs, for randomly chosen constructs, to a forward/reverse fastq pair.
+
+    Each forward read is gRNA A and each reverse read the reverse complement of gRNA B, with each base substituted
+    with probability mismatch_rate; in a fraction truncation_rate of pairs, scaffold trimming is taken to have missed
+    up to max_truncation_len scaffold bases, which are left on the 3' end of the forward read and the 5' end of the
+    reverse read.  Returns the forward and reverse fastq paths.
+    """
+    rng = random.Random(seed)
+    construct_seqs = _get_construct_seqs(grnas, construct_names)
+
+    def generate_seq_pairs():
+        for _ in range(0, num_pairs):
+            grna_seq_a, grna_seq_b = rng.choice(construct_seqs)
+            fw_seq = _add_mismatches(grna_seq_a, mismatch_rate, rng)
+            rv_seq = _add_mismatches(rev_comp_canonical_dna_seq(grna_seq_b), mismatch_rate, rng)
+            if truncation_rate > 0 and rng.random() < truncation_rate:
+                fw_seq += FULL_3P_R1[:rng.randint(1, max_truncation_len)]
+                rv_seq = FULL_5P_R2[-rng.randint(1, max_truncation_len):] + rv_seq
+            yield fw_seq, rv_seq
+
+    return _write_fastq_pair(output_dir, base_name, generate_seq_pairs())
+
+
+def write_synthetic_untrimmed_fastq_pair(output_dir, base_name, grnas, construct_names, num_pairs, read_len=75,
+                                         min_5p_scaffold_len=10, max_5p_scaffold_len=20, mismatch_rate=0.0, seed=0):
+    """Write num_pairs of untrimmed read pairs, for randomly chosen constructs, to a forward/reverse fastq pair.
+
+    Each read is read_len bases long: the last min_5p_scaffold_len to max_5p_scaffold_len bases of the 5' scaffold
+    (FULL_5P_R1 or FULL_5P_R2), then gRNA A or the reverse complement of gRNA B, with each base substituted with
+    probability mismatch_rate, then as much of the 3' scaffold (FULL_3P_R1 or FULL_3P_R2) as fits.  These are inputs
+    for scaffold trimming, after which the reads should hold just the gRNAs.  Returns the forward and reverse fastq
+    paths.
+    """
+    rng = random.Random(seed)
+    construct_seqs = _get_construct_seqs(grnas, construct_names)
+
+    def make_read(scaffold_5p, grna_seq, scaffold_3p):
+        result = scaffold_5p[-rng.randint(min_5p_scaffold_len, max_5p_scaffold_len):] + \
+            _add_mismatches(grna_seq, mismatch_rate, rng)
+        return (result + scaffold_3p)[:read_len]
+
+    def generate_seq_pairs():
+        for _ in range(0, num_pairs):
+            grna_seq_a, grna_seq_b = rng.choice(construct_seqs)
+            yield make_read(FULL_5P_R1, grna_seq_a, FULL_3P_R1), \
+                make_read(FULL_5P_R2, rev_comp_canonical_dna_seq(grna_seq_b), FULL_3P_R2)
+
+    return _write_fastq_pair(output_dir, base_name, generate_seq_pairs())
+
+
+def _get_construct_seqs(grnas, construct_names):
+    grna_seqs_by_name = dict(grnas)
+    return [[grna_seqs_by_name[y] for y in x.split(get_construct_separator())] for x in construct_names]
+
+
+def _write_fastq_pair(output_dir, base_name, seq_pairs):
+    output_fps = [os.path.join(output_dir, "{0}_R{1}_001.fastq".format(base_name, x)) for x in [1, 2]]
+    with open(output_fps[0], 'w') as fw_handle, open(output_fps[1], 'w') as rv_handle:
+        for pair_index, (fw_seq, rv_seq) in enumerate(seq_pairs):
+            for read_num, curr_handle, curr_seq in [(1, fw_handle, fw_seq), (2, rv_handle, rv_seq)]:
+                curr_handle.write("@SYN:1:FC:1:1101:{0}:{1} {2}:N:0:ATCACG\n{3}\n+\n{4}\n".format(
+                    pair_index // 10000, pair_index % 10000, read_num, curr_seq, "G" * len(curr_seq)))
+    return output_fps
+
+
+def _add_mismatches(seq, mismatch_rate, rng):
+    if mismatch_rate <= 0:
+        return seq
+    bases = list(seq)
+    for base_index, curr_base in enumerate(bases):
+        if rng.random() < mismatch_rate:
+            bases[base_index] = rng.choice([x for x in _BASES if x != curr_base])
+    return "".join(bases)
@@ -0,0 +1,67 @@
+# standard libraries
+import unittest
+
+# ccbb libraries
+from ccbbucsd.utilities.basic_fastq import FastqRecord
+
+# project-specific libraries
+from ccbbucsd.malicrispr.barcode_demultiplexer import BARCODE_FROM_FW_PREFIX, BarcodeDemultiplexer
+
+__author__ = "Amanda Birmingham"
+__maintainer__ = "Amanda Birmingham"
+__email__ = "abirmingham@ucsd.edu"
+__status__ = "development"
+
+
+class TestBarcodeDemultiplexer(unittest.TestCase):
+    sample_names_and_barcodes = [("sample_1", "ATCACG"), ("sample_2", "TTAGGC")]
+
+    @staticmethod
+    def _make_record(name, sequence):
+        return FastqRecord(name, sequence, "+", "I" * len(sequence))
+
+    # region init tests
+    def test_init_rejects_barcodes_too_close_together(self):
+        with self.assertRaises(ValueError):
+            BarcodeDemultiplexer([("sample_1", "ATCACG"), ("sample_2", "ATCAGC")], 1)
+
+    def test_init_rejects_barcodes_of_different_lengths(self):
+        with self.assertRaises(ValueError):
+            BarcodeDemultiplexer([("sample_1", "ATCACG"), ("sample_2", "TTAGGCA")], 1)
+
+    # endregion
+
+    # region get_sample_id tests
+    def test_get_sample_id(self):
+        demultiplexer = BarcodeDemultiplexer(self.sample_names_and_barcodes, 1)
+        self.assertEqual(0, demultiplexer.get_sample_id("ATCACG"))
+        self.assertEqual(1, demultiplexer.get_sample_id("TTAGGA"))  # one mismatch
+        self.assertIsNone(demultiplexer.get_sample_id("TTAGCA"))  # two mismatches
+        self.assertIsNone(demultiplexer.get_sample_id("ATCAC"))  # too short
+        self.assertEqual(1, demultiplexer.get_sample_id("TTAGGA"))  # remembered assignment
+
+    # endregion
+
+    # region group_pairs_by_sample tests
+    def test_group_pairs_by_sample_from_header(self):
+        demultiplexer = BarcodeDemultiplexer(self.sample_names_and_barcodes, 1)
+        fw_records = [self._make_record("@read1 1:N:0:ATCACC", "acgt"),
+                      self._make_record("@read2 1:N:0:TTAGGC", "CCCC"),
+                      self._make_record("@read3 1:N:0:GGGGGG", "TTTT"),
+                      self._make_record("@read4", "AAAA")]
+        rv_records = [self._make_record(x.name.replace("1:N", "2:N"), "GG" + x.sequence) for x in fw_records]
+        seqs_by_sample_id, num_undetermined = demultiplexer.group_pairs_by_sample(fw_records, rv_records)
+        self.assertEqual({0: (["ACGT"], ["GGACGT"]), 1: (["CCCC"], ["GGCCCC"])}, seqs_by_sample_id)
+        self.assertEqual(2, num_undetermined)
+
+    def test_group_pairs_by_sample_from_fw_prefix(self):
+        demultiplexer = BarcodeDemultiplexer(self.sample_names_and_barcodes, 1, BARCODE_FROM_FW_PREFIX)
+        fw_records = [self._make_record("@read1", "TTAGGCAAAA"),
+                      self._make_record("@read2", "ATCACGCCCC"),
+                      self._make_record("@read3", "TTAGGCGGGG")]
+        rv_records = [self._make_record(x.name, "TTTT") for x in fw_records]
+        seqs_by_sample_id, num_undetermined = demultiplexer.group_pairs_by_sample(fw_records, rv_records)
+        self.assertEqual({0: (["CCCC"], ["TTTT"]), 1: (["AAAA", "GGGG"], ["TTTT", "TTTT"])}, seqs_by_sample_id)
+        self.assertEqual(0, num_undetermined)
+
+    # endregion
@@ -0,0 +1,78 @@
+# standard libraries
+import os
+import tempfile
+import unittest
+
+# third-party libraries
+import numpy
+
+# project-specific libraries
+from ccbbucsd.malicrispr.compiled_library import compile_library, get_compiled_library_dir, load_compiled_library
+from ccbbucsd.malicrispr.construct_file_extracter import extract_construct_and_grna_info, trim_grnas
+
+__author__ = "Amanda Birmingham"
+__maintainer__ = "Amanda Birmingham"
+__email__ = "abirmingham@ucsd.edu"
+__status__ = "development"
+
+
+class TestFunctions(unittest.TestCase):
+    constructs_str = """id\tgene_a\tseq_a\tgene_b\tseq_b
+a1__b1\ta\tAAAAACCCCCGGGGGTTTTTA\tb\tCCCCCAAAAAGGGGGTTTTTC
+a1__b2\ta\tAAAAACCCCCGGGGGTTTTTA\tb\tGGGGGAAAAACCCCCTTTTTG
+a2__b1\ta\tTTTTTCCCCCGGGGGAAAAAT\tb\tCCCCCAAAAAGGGGGTTTTTC
+"""
+    col_indices = [0, 2, 4]
+
+    def _write_constructs_file(self, temp_dir):
+        constructs_fp = os.path.join(temp_dir, "test_library.txt")
+        with open(constructs_fp, 'w') as file_handle:
+            file_handle.write(self.constructs_str)
+        return constructs_fp
+
+    # region compile_library tests
+    def test_compile_library_round_trip(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            constructs_fp = self._write_constructs_file(temp_dir)
+            library_dir = compile_library(os.path.join(temp_dir, "cache"), constructs_fp, self.col_indices, 19)
+            compiled_library = load_compiled_library(library_dir)
+
+            construct_names, grna_name_seq_pairs = extract_construct_and_grna_info(constructs_fp, self.col_indices)
+            self.assertEqual(construct_names, compiled_library.construct_names)
+            self.assertEqual(trim_grnas(grna_name_seq_pairs, 19), compiled_library.grna_names_and_seqs)
+
+            grna_matcher = compiled_library.make_grna_matcher(1, 1)
+            construct_index = compiled_library.construct_index
+            fw_grna_id, rv_grna_id = grna_matcher.find_fw_and_rv_read_match_ids("AAACCCCCGGGGGTTTTTA",
+                                                                                "CAAAAAGGGGGTTTTTCCC")
+            self.assertEqual("a1__b2", construct_index.construct_names[
+                construct_index.get_construct_id(fw_grna_id, rv_grna_id)])
+            self.assertTrue(os.path.isfile(os.path.join(library_dir, "seed_1mm_segment_seqs.npy")))
+            self.assertIsInstance(compiled_library.get_seed_arrays(1)["segment_seqs"], numpy.memmap)
+            self.assertIsInstance(construct_index.pair_keys, numpy.memmap)
+
+    def test_compile_library_reuses_compiled_copy(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            constructs_fp = self._write_constructs_file(temp_dir)
+            cache_dir = os.path.join(temp_dir, "cache")
+            library_dir = compile_library(cache_dir, constructs_fp, self.col_indices, 19)
+            modified_time = os.path.getmtime(os.path.join(library_dir, "pair_keys.npy"))
+            self.assertEqual(library_dir, compile_library(cache_dir, constructs_fp, self.col_indices, 19))
+            self.assertEqual(modified_time, os.path.getmtime(os.path.join(library_dir, "pair_keys.npy")))
+            self.assertEqual([os.path.basename(library_dir)], os.listdir(cache_dir))
+
+    # endregion
+
+    # region get_compiled_library_dir tests
+    def test_get_compiled_library_dir_changes_with_inputs(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            constructs_fp = self._write_constructs_file(temp_dir)
+            library_dir = get_compiled_library_dir(temp_dir, constructs_fp, self.col_indices, 19)
+            self.assertNotEqual(library_dir, get_compiled_library_dir(temp_dir, constructs_fp, self.col_indices, 20))
+            self.assertNotEqual(library_dir, get_compiled_library_dir(temp_dir, constructs_fp, [0, 4, 2], 19))
+
+            with open(constructs_fp, 'a') as file_handle:
+                file_handle.write("a2__b2\ta\tTTTTTCCCCCGGGGGAAAAAT\tb\tGGGGGAAAAACCCCCTTTTTG\n")
+            self.assertNotEqual(library_dir, get_compiled_library_dir(temp_dir, constructs_fp, self.col_indices, 19))
+
+    # endregion
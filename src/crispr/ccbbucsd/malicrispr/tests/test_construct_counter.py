@@ -1,12 +1,28 @@
 # standard libraries
+import os
+import tempfile
 import unittest
+import unittest.mock
 
 # ccbb libraries
-from ccbbucsd.utilities.basic_fastq import FastqHandler
+from ccbbucsd.utilities.basic_fastq import BlockFastqHandler, FastqHandler, get_paired_shard_byte_ranges
+from ccbbucsd.utilities.fastq_sampling import SAMPLE_STRIDE, PairSampling
+from ccbbucsd.utilities.parallel_process_fastqs import parallel_process_paired_read_shards
 
 # project-specific libraries
-from ccbbucsd.malicrispr.construct_counter import _match_and_count_constructs, get_counter_from_names
+from ccbbucsd.malicrispr import construct_counter
+from ccbbucsd.malicrispr.construct_counter import _match_and_count_constructs, \
+    _match_and_count_constructs_in_batches, generate_compiled_library_construct_counts, generate_construct_counts, \
+    generate_demultiplexed_construct_counts, generate_filtered_construct_counts, \
+    generate_multi_library_construct_counts, generate_shard_construct_counts, merge_summary_counts, \
+    write_merged_shard_construct_counts
+from ccbbucsd.malicrispr.barcode_demultiplexer import BarcodeDemultiplexer
+from ccbbucsd.malicrispr.compiled_library import compile_library
+from ccbbucsd.malicrispr.construct_index import ConstructIndex
+from ccbbucsd.malicrispr.count_filterer import filter_pair_by_len, get_filtered_file_suffix
+from ccbbucsd.malicrispr.count_store import read_counts
 from ccbbucsd.malicrispr.grna_position_matcher import GrnaPositionMatcher
+from ccbbucsd.malicrispr.unrecognized_tracker import UnrecognizedTracker, get_unrecognized_fp
 
 __author__ = "Amanda Birmingham"
 __maintainer__ = "Amanda Birmingham"
@@ -15,10 +31,8 @@ __status__ = "development"
 
 
 class TestFunctions(unittest.TestCase):
-    # region _match_and_count_constructs
-    def test__match_and_count_constructs(self):
-        # 1: three; 2: two; 3: two; 4: none; 5: two; 6: one
-        fw_fastqs = """@D00611:278:HK55CBCXX:1:1101:1138:2170 1:N:0:ATCACG
+    # 1: three; 2: two; 3: two; 4: none; 5: two; 6: one
+    fw_fastqs = """@D00611:278:HK55CBCXX:1:1101:1138:2170 1:N:0:ATCACG
 ATGCAAGCTCATTGTGAAC
 +
 GGGGGGGIGGGGGIGAAGG
@@ -44,8 +58,8 @@ TGTCTGGCCGCGAAGCAGT
 IIIIIIIIIIIIIIIGIII
 """
 
-        # 1: two rc; 2: none; 3: one rc; 4: none; 5: one rc; 6: two rc
-        rv_fastqs = """@D00611:278:HK55CBCXX:1:1101:1138:2170 2:N:0:ATCACG
+    # 1: two rc; 2: none; 3: one rc; 4: none; 5: one rc; 6: two rc
+    rv_fastqs = """@D00611:278:HK55CBCXX:1:1101:1138:2170 2:N:0:ATCACG
 GTGCGGGTTTCGTACCGAA
 +
 GGIIGIIGGGGGAGAGGII
@@ -71,16 +85,28 @@ GTGCGGGTTTCGTACCGAA
 GGIIIGIIGIIIIIIIIII
 """
 
-        fw_fastq_handler = FastqHandler(fw_fastqs, True)
-        rv_fastq_handler = FastqHandler(rv_fastqs, True)
-        grna_names_and_seqs = [("one", "TGTCTGGCCGCGAAGCAGT"),
-                               ("two","TTCGGTACGAAACCCGCAC"),  # note one mismatch to fastq seq
-                               ("three", "ATGCAAGCTCATTGTGAAC")]
-        construct_names = ["three__one", "two__one", "three__two"]
-        construct_counts = get_counter_from_names(construct_names)
-        grna_matcher = GrnaPositionMatcher(grna_names_and_seqs, 19, 1, 1)
-        output_construct_counts, output_summary_counts = _match_and_count_constructs(grna_matcher, construct_counts,
-                                                                                     fw_fastq_handler, rv_fastq_handler)
+    grna_names_and_seqs = [("one", "TGTCTGGCCGCGAAGCAGT"),
+                           ("two", "TTCGGTACGAAACCCGCAC"),  # note one mismatch to fastq seq
+                           ("three", "ATGCAAGCTCATTGTGAAC")]
+    construct_names = ["three__one", "two__one", "three__two"]
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.temp_dir = temp_dir.name
+        self.grna_matcher = GrnaPositionMatcher(self.grna_names_and_seqs, 19, 1, 1)
+
+    def _write_fastq_pair(self, fw_fastqs=None, rv_fastqs=None, base_name="test"):
+        # writes the forward and reverse reads (by default, the fw_fastqs and rv_fastqs above) to the temp dir
+        fw_fp = os.path.join(self.temp_dir, base_name + "_R1_001.fastq")
+        rv_fp = os.path.join(self.temp_dir, base_name + "_R2_001.fastq")
+        for curr_fp, curr_fastqs in [(fw_fp, fw_fastqs or self.fw_fastqs), (rv_fp, rv_fastqs or self.rv_fastqs)]:
+            with open(curr_fp, 'w') as file_handle:
+                file_handle.write(curr_fastqs)
+        return fw_fp, rv_fp
+
+    def _assert_expected_counts(self, construct_index, output_construct_counts, output_summary_counts):
+        output_construct_counts = dict(zip(construct_index.construct_names, output_construct_counts.tolist()))
         self.assertEqual(3, len(output_construct_counts))
         self.assertEqual(0, output_construct_counts["three__one"])
         self.assertEqual(2, output_construct_counts["two__one"])
@@ -95,4 +121,302 @@ GGIIIGIIGIIIIIIIIII
         self.assertEqual(1, output_summary_counts["num_constructs_unrecognized"])  # one__two
         self.assertEqual(3, output_summary_counts["num_constructs_recognized"])
 
+    # region _match_and_count_constructs
+    def test__match_and_count_constructs(self):
+        fw_fastq_handler = FastqHandler(self.fw_fastqs, True)
+        rv_fastq_handler = FastqHandler(self.rv_fastqs, True)
+        construct_index = ConstructIndex(self.grna_matcher.grna_names, self.construct_names)
+        output_construct_counts, output_summary_counts = _match_and_count_constructs(self.grna_matcher, construct_index,
+                                                                                     fw_fastq_handler, rv_fastq_handler)
+        self._assert_expected_counts(construct_index, output_construct_counts, output_summary_counts)
+
+    def test__match_and_count_constructs_with_match_cache(self):
+        fw_fastq_handler = FastqHandler(self.fw_fastqs, True)
+        rv_fastq_handler = FastqHandler(self.rv_fastqs, True)
+        grna_matcher = GrnaPositionMatcher(self.grna_names_and_seqs, 19, 1, 1, cache_size=2)
+        construct_index = ConstructIndex(grna_matcher.grna_names, self.construct_names)
+        output_construct_counts, output_summary_counts = _match_and_count_constructs(grna_matcher, construct_index,
+                                                                                     fw_fastq_handler, rv_fastq_handler)
+        cache_summary = {x: output_summary_counts.pop(x) for x in grna_matcher.match_cache.summarize()}
+        self._assert_expected_counts(construct_index, output_construct_counts, output_summary_counts)
+        # pair 5 is a repeat of pair 3
+        self.assertEqual({"num_match_cache_hits": 1, "num_match_cache_misses": 5, "match_cache_hit_rate": 0.1667},
+                         cache_summary)
+
+    # endregion
+
+    # region _match_and_count_constructs_in_batches
+    def test__match_and_count_constructs_in_batches(self):
+        # small block size so that the pairs are spread over several batches
+        fw_fastq_handler = BlockFastqHandler(self.fw_fastqs, True, block_size=200)
+        rv_fastq_handler = BlockFastqHandler(self.rv_fastqs, True, block_size=200)
+        construct_index = ConstructIndex(self.grna_matcher.grna_names, self.construct_names)
+        output_construct_counts, output_summary_counts = _match_and_count_constructs_in_batches(
+            self.grna_matcher, construct_index, fw_fastq_handler, rv_fastq_handler)
+        self._assert_expected_counts(construct_index, output_construct_counts, output_summary_counts)
+
+    # endregion
+
+    # region generate_filtered_construct_counts
+    def test_generate_filtered_construct_counts_matches_separate_steps(self):
+        # one extra pair that is too long to pass the length filter
+        fw_fastqs = self.fw_fastqs + "@extra 1:N:0:ATCACG\nAATGCAAGCTCATTGTGAACAAAAAA\n+\nIIIIIIIIIIIIIIIIIIIIIIIIII\n"
+        rv_fastqs = self.rv_fastqs + "@extra 2:N:0:ATCACG\nGTGCGGGTTTCGTACCGAA\n+\nIIIIIIIIIIIIIIIIIII\n"
+        fw_fp, rv_fp = self._write_fastq_pair(fw_fastqs, rv_fastqs)
+        separate_dir = os.path.join(self.temp_dir, "separate")
+        fused_dir = os.path.join(self.temp_dir, "fused")
+        os.mkdir(separate_dir)
+        os.mkdir(fused_dir)
+
+        separate_summary = filter_pair_by_len(19, 21, 19, separate_dir, fw_fp, rv_fp)
+        filtered_fps = [os.path.join(separate_dir, "test_R{0}_001{1}".format(x, get_filtered_file_suffix()))
+                        for x in [1, 2]]
+        generate_construct_counts(self.grna_matcher, self.construct_names, os.path.join(separate_dir, "counts.txt"),
+                                  *filtered_fps, num_unrecognized_to_keep=10)
+
+        fused_summary = generate_filtered_construct_counts(
+            self.grna_matcher, self.construct_names, os.path.join(fused_dir, "counts.txt"), fw_fp, rv_fp, 19, 21, 19,
+            num_unrecognized_to_keep=10)
+        # no filtered fastqs unless asked for
+        self.assertEqual(["counts.txt", "counts_unrecognized.txt"], sorted(os.listdir(fused_dir)))
+        batch_summary = generate_filtered_construct_counts(
+            self.grna_matcher, self.construct_names, os.path.join(fused_dir, "batch_counts.txt"), fw_fp, rv_fp, 19, 21,
+            19, filtered_fastqs_dir=fused_dir, use_batch_matching=True, num_unrecognized_to_keep=10)
+
+        output_contents = {}
+        for curr_fp in [os.path.join(separate_dir, "counts.txt"), os.path.join(fused_dir, "counts.txt"),
+                        os.path.join(fused_dir, "batch_counts.txt")] + filtered_fps + \
+                [x.replace(separate_dir, fused_dir) for x in filtered_fps] + \
+                [os.path.join(separate_dir, "counts_unrecognized.txt"),
+                 os.path.join(fused_dir, "counts_unrecognized.txt"),
+                 os.path.join(fused_dir, "batch_counts_unrecognized.txt")]:
+            with open(curr_fp) as file_handle:
+                output_contents[curr_fp] = file_handle.read()
+
+        self.assertEqual("num_pairs:7,num_pairs_passing:6", separate_summary)
+        self.assertEqual(separate_summary, fused_summary)
+        self.assertEqual(separate_summary, batch_summary)
+        output_values = list(output_contents.values())
+        self.assertEqual(output_values[0], output_values[1])
+        self.assertEqual(output_values[0], output_values[2])
+        self.assertEqual(output_values[3:5], output_values[5:7])
+        self.assertEqual(output_values[7], output_values[8])
+        self.assertEqual(output_values[7], output_values[9])
+
+    # endregion
+
+    # region generate_shard_construct_counts
+    def test_generate_shard_construct_counts_merged(self):
+        fw_fp, rv_fp = self._write_fastq_pair()
+        shard_results = []
+        for fw_byte_range, rv_byte_range in get_paired_shard_byte_ranges(fw_fp, rv_fp, 3, num_records_per_entry=1):
+            shard_results.append(generate_shard_construct_counts(self.grna_matcher, self.construct_names, "run",
+                                                                 self.temp_dir, fw_fp, rv_fp, fw_byte_range,
+                                                                 rv_byte_range))
+
+        self.assertEqual(3, len(shard_results))
+        output_construct_counts = sum(x[0] for x in shard_results)  # counts by construct id just add up
+        output_summary_counts = merge_summary_counts([x[1] for x in shard_results])
+        self._assert_expected_counts(ConstructIndex(self.grna_matcher.grna_names, self.construct_names),
+                                     output_construct_counts, output_summary_counts)
+
+    def test_write_merged_shard_construct_counts_per_pair(self):
+        fastqs_dir = os.path.join(self.temp_dir, "fastqs")
+        os.mkdir(fastqs_dir)
+        for curr_sample in ["a", "b"]:
+            for curr_read, curr_fastqs in [("R1", self.fw_fastqs), ("R2", self.rv_fastqs)]:
+                with open(os.path.join(fastqs_dir, "{0}_L001_{1}_001.fastq".format(curr_sample, curr_read)),
+                          'w') as file_handle:
+                    file_handle.write(curr_fastqs)
+
+        results = parallel_process_paired_read_shards(
+            fastqs_dir, ".fastq", 2, generate_shard_construct_counts, write_merged_shard_construct_counts,
+            [self.grna_matcher, self.construct_names, "run", self.temp_dir], num_shards_per_pair=2)
+        # each pair's shards are merged into that pair's own counts file, with no unrecognized side file unless
+        # one is asked for
+        output_by_fp = {x: read_counts(os.path.join(self.temp_dir, x)) for x in os.listdir(self.temp_dir)
+                        if x != "fastqs"}
+
+        self.assertEqual([("a_L001_001", None), ("b_L001_001", None)], results)
+        self.assertEqual(["a_L001_001_run_counts.txt", "b_L001_001_run_counts.txt"], sorted(output_by_fp))
+        for construct_names, _, counts_matrix, summary_counts in output_by_fp.values():
+            self._assert_expected_counts(ConstructIndex(self.grna_matcher.grna_names, construct_names.tolist()),
+                                         counts_matrix[:, 0], summary_counts)
+
+    # endregion
+
+    # region sampling
+    def test_generate_construct_counts_with_sampling(self):
+        fw_fp, rv_fp = self._write_fastq_pair()
+
+        full_fp = os.path.join(self.temp_dir, "full_counts.txt")
+        generate_construct_counts(self.grna_matcher, self.construct_names, full_fp, fw_fp, rv_fp)
+        sample_summaries = []
+        for use_batch_matching in [False, True]:
+            sample_fp = os.path.join(self.temp_dir, "sample_counts.txt")
+            sample_summaries.append(generate_construct_counts(
+                self.grna_matcher, self.construct_names, sample_fp, fw_fp, rv_fp,
+                use_batch_matching=use_batch_matching, sampling=PairSampling(SAMPLE_STRIDE, 100)))
+            with open(full_fp) as full_handle, open(sample_fp) as sample_handle:
+                # sample covers the whole (tiny) file, so counts match those of a full run
+                self.assertEqual(full_handle.readlines()[1:], sample_handle.readlines()[1:])
+
+        self.assertEqual(sample_summaries[0], sample_summaries[1])
+        self.assertIn("num_constructs_recognized_rate:0.5000 [", sample_summaries[0])
+        self.assertIn("est_num_constructs_recognized:3 [", sample_summaries[0])
+        self.assertIn("sample_method:stride", sample_summaries[0])
+
+    # endregion
+
+    # region checkpointing
+    def test_generate_construct_counts_resumes_from_checkpoint(self):
+        fw_fp, rv_fp = self._write_fastq_pair()
+        full_fp = os.path.join(self.temp_dir, "full_counts.txt")
+        generate_construct_counts(self.grna_matcher, self.construct_names, full_fp, fw_fp, rv_fp,
+                                  num_unrecognized_to_keep=10)
+
+        # kill the run after its second two-pair chunk
+        resumed_fp = os.path.join(self.temp_dir, "resumed_counts.txt")
+        count_chunk = construct_counter._match_and_count_constructs_from_files
+        with unittest.mock.patch.object(construct_counter, "_match_and_count_constructs_from_files",
+                                        side_effect=self._make_failing_side_effect(count_chunk, 2)):
+            with self.assertRaises(RuntimeError):
+                generate_construct_counts(self.grna_matcher, self.construct_names, resumed_fp, fw_fp, rv_fp,
+                                          num_unrecognized_to_keep=10, num_pairs_per_checkpoint=2)
+        checkpoint_fp = os.path.join(self.temp_dir, "resumed_counts_checkpoint.pkl")
+        self.assertTrue(os.path.isfile(checkpoint_fp))
+        self.assertFalse(os.path.isfile(resumed_fp))
+
+        with unittest.mock.patch.object(construct_counter, "_match_and_count_constructs_from_files",
+                                        side_effect=count_chunk) as mock_count:
+            generate_construct_counts(self.grna_matcher, self.construct_names, resumed_fp, fw_fp, rv_fp,
+                                      num_unrecognized_to_keep=10, num_pairs_per_checkpoint=2, resume=True)
+            self.assertEqual(1, mock_count.call_count)  # only the last chunk was left to count
+        self.assertFalse(os.path.isfile(checkpoint_fp))
+
+        output_contents = []
+        for curr_fp in [full_fp, resumed_fp, get_unrecognized_fp(full_fp), get_unrecognized_fp(resumed_fp)]:
+            with open(curr_fp) as file_handle:
+                output_contents.append(file_handle.read())
+
+        self.assertEqual(output_contents[0], output_contents[1])
+        self.assertEqual(output_contents[2], output_contents[3])
+
+    def test_generate_construct_counts_ignores_checkpoint_for_other_match_settings(self):
+        fw_fp, rv_fp = self._write_fastq_pair()
+        resumed_fp = os.path.join(self.temp_dir, "resumed_counts.txt")
+        count_chunk = construct_counter._match_and_count_constructs_from_files
+        with unittest.mock.patch.object(construct_counter, "_match_and_count_constructs_from_files",
+                                        side_effect=self._make_failing_side_effect(count_chunk, 2)):
+            with self.assertRaises(RuntimeError):
+                generate_construct_counts(self.grna_matcher, self.construct_names, resumed_fp, fw_fp, rv_fp,
+                                          num_pairs_per_checkpoint=2)
+
+        # a run allowing no mismatches would not have made the saved counts, so must start over
+        with unittest.mock.patch.object(construct_counter, "_match_and_count_constructs_from_files",
+                                        side_effect=count_chunk) as mock_count:
+            generate_construct_counts(GrnaPositionMatcher(self.grna_names_and_seqs, 19, 0, 0),
+                                      self.construct_names, resumed_fp, fw_fp, rv_fp, num_pairs_per_checkpoint=2,
+                                      resume=True)
+            self.assertEqual(3, mock_count.call_count)
+
+    @staticmethod
+    def _make_failing_side_effect(func, num_successful_calls):
+        call_counter = [0]
+
+        def side_effect(*args):
+            call_counter[0] += 1
+            if call_counter[0] > num_successful_calls:
+                raise RuntimeError("simulated interruption")
+            return func(*args)
+        return side_effect
+
+    # endregion
+
+    # region generate_multi_library_construct_counts
+    def test_generate_multi_library_construct_counts(self):
+        library_strs = {"test_library": """id\tgene_a\tseq_a\tgene_b\tseq_b
+three__one\tthree\tATGCAAGCTCATTGTGAAC\tone\tTGTCTGGCCGCGAAGCAGT
+two__one\ttwo\tTTCGGTACGAAACCCGCAC\tone\tTGTCTGGCCGCGAAGCAGT
+three__two\tthree\tATGCAAGCTCATTGTGAAC\ttwo\tTTCGGTACGAAACCCGCAC
+""", "other_library": """id\tgene_a\tseq_a\tgene_b\tseq_b
+x1__y1\tx\tAAAAACCCCCGGGGGTTTT\ty\tCCCCCAAAAAGGGGGTTTT
+"""}
+        fw_fp, rv_fp = self._write_fastq_pair()
+        library_dirs = []
+        for curr_name, curr_library_str in sorted(library_strs.items(), reverse=True):
+            constructs_fp = os.path.join(self.temp_dir, curr_name + ".txt")
+            with open(constructs_fp, 'w') as file_handle:
+                file_handle.write(curr_library_str)
+            library_dirs.append(compile_library(os.path.join(self.temp_dir, "cache"), constructs_fp, [0, 2, 4], 19))
+
+        single_fp = os.path.join(self.temp_dir, "single_counts.txt")
+        generate_compiled_library_construct_counts(library_dirs[0], 1, single_fp, fw_fp, rv_fp)
+        output_contents = {}
+        for use_batch_matching in [False, True]:
+            output_fps = [os.path.join(self.temp_dir, "{0}_{1}_counts.txt".format(use_batch_matching, x))
+                          for x in range(0, len(library_dirs))]
+            output_summary = generate_multi_library_construct_counts(library_dirs, 1, output_fps, fw_fp, rv_fp,
+                                                                     use_batch_matching=use_batch_matching)
+            self.assertEqual("test_library: num_pairs:6,num_constructs_recognized:3,recognized_rate:0.5000\n"
+                             "other_library: num_pairs:6,num_constructs_recognized:0,recognized_rate:0.0000",
+                             output_summary)
+            for curr_fp in [single_fp] + output_fps:
+                with open(curr_fp) as file_handle:
+                    output_contents[curr_fp] = file_handle.read()
+
+        output_values = list(output_contents.values())
+        self.assertEqual(output_values[0], output_values[1])  # same counts as when counted alone
+        self.assertEqual(output_values[1:3], output_values[3:5])  # same counts with and without batch matching
+        self.assertIn("x1__y1\t0", output_values[2])
+
+    # endregion
+
+    # region generate_demultiplexed_construct_counts
+    def test_generate_demultiplexed_construct_counts(self):
+        # all but the fourth pair (which matches no gRNAs anyway) carry barcode ATCACG
+        fw_fp, rv_fp = self._write_fastq_pair(base_name="Undetermined")
+        single_fp = os.path.join(self.temp_dir, "single_counts.txt")
+        generate_construct_counts(self.grna_matcher, self.construct_names, single_fp, fw_fp, rv_fp)
+
+        output_summaries = []
+        for use_batch_matching in [False, True]:
+            demultiplexer = BarcodeDemultiplexer([("sample1", "ATCACG"), ("sample2", "TTAGGC")], 0)
+            output_summaries.append(generate_demultiplexed_construct_counts(
+                self.grna_matcher, self.construct_names, demultiplexer, self.temp_dir, "run", fw_fp, rv_fp,
+                use_batch_matching=use_batch_matching))
+        output_contents = []
+        for curr_fp in [single_fp] + [os.path.join(self.temp_dir, x + "_run_counts.txt") for x in
+                                      ["sample1", "sample2"]]:
+            with open(curr_fp) as file_handle:
+                output_contents.append(file_handle.read().splitlines())
+
+        self.assertEqual("sample1: num_pairs:5,num_constructs_recognized:3\nsample2: num_pairs:0,"
+                         "num_constructs_recognized:0\nundetermined: num_pairs:1", output_summaries[0])
+        self.assertEqual(output_summaries[0], output_summaries[1])
+        self.assertEqual(output_contents[0][1:], output_contents[1][1:])  # same counts, but one fewer pair
+        self.assertEqual(["three__one\t0", "three__two\t0", "two__one\t0"], output_contents[2][2:])
+
+    # endregion
+
+    # region unrecognized tracking
+    def test__match_and_count_constructs_tracks_unrecognized(self):
+        fw_fastq_handler = FastqHandler(self.fw_fastqs, True)
+        rv_fastq_handler = FastqHandler(self.rv_fastqs, True)
+        construct_index = ConstructIndex(self.grna_matcher.grna_names, self.construct_names)
+        unrecognized_tracker = UnrecognizedTracker(10)
+        _match_and_count_constructs(self.grna_matcher, construct_index, fw_fastq_handler, rv_fastq_handler,
+                                    unrecognized_tracker)
+
+        output_fp = os.path.join(self.temp_dir, "unrecognized.txt")
+        unrecognized_tracker.write(output_fp, construct_index)
+        with open(output_fp) as file_handle:
+            output_lines = file_handle.read().splitlines()
+
+        self.assertEqual(["# num_pairs_unrecognized:2,num_constructs_unrecognized:1",
+                          "type\tunrecognized\tapprox_count\tmax_overcount",
+                          "sequence\tCAACGGGCGTGCCCGGAAA,GACACCCAGGGAGCGCGCC\t1\t0",
+                          "sequence\tTTCGGTACGAAACCAGCAC,TATGCCGGGACTAGAATGG\t1\t0",
+                          "construct\tone__two\t1\t0"], output_lines)
+
     # endregion
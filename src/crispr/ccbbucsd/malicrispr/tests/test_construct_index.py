@@ -0,0 +1,62 @@
+# standard libraries
+import unittest
+
+# third-party libraries
+import numpy
+
+# project-specific libraries
+from ccbbucsd.malicrispr.construct_index import NO_CONSTRUCT, ConstructIndex
+
+__author__ = "Amanda Birmingham"
+__maintainer__ = "Amanda Birmingham"
+__email__ = "abirmingham@ucsd.edu"
+__status__ = "development"
+
+
+class TestConstructIndex(unittest.TestCase):
+    grna_names = ["one", "two", "three"]
+    construct_names = ["three__one", "two__one", "three__two", "three__one", "four__one"]
+
+    # region construct_names tests
+    def test_construct_names_drops_repeats_but_keeps_unmatchable(self):
+        index = ConstructIndex(self.grna_names, self.construct_names)
+        self.assertEqual(["three__one", "two__one", "three__two", "four__one"], index.construct_names)
+        self.assertEqual(4, index.num_constructs)
+
+    # endregion
+
+    # region get_construct_id tests
+    def test_get_construct_id_recognized(self):
+        index = ConstructIndex(self.grna_names, self.construct_names)
+        self.assertEqual(0, index.get_construct_id(2, 0))
+        self.assertEqual(2, index.get_construct_id(2, 1))
+
+    def test_get_construct_id_unrecognized(self):
+        index = ConstructIndex(self.grna_names, self.construct_names)
+        self.assertEqual(NO_CONSTRUCT, index.get_construct_id(0, 1))  # one__two is not in the library
+        self.assertEqual("one__two", index.get_construct_name(0, 1))
+
+    def test_get_construct_id_from_pair_arrays(self):
+        built_index = ConstructIndex(self.grna_names, self.construct_names)
+        index = ConstructIndex(self.grna_names, numpy.array(built_index.construct_names),
+                               built_index.pair_keys, built_index.pair_construct_ids)
+        for grna_id_A in range(0, len(self.grna_names)):
+            for grna_id_B in range(0, len(self.grna_names)):
+                self.assertEqual(built_index.get_construct_id(grna_id_A, grna_id_B),
+                                 index.get_construct_id(grna_id_A, grna_id_B))
+        self.assertEqual(NO_CONSTRUCT, index.get_construct_id(3, 3))  # past the last pair key
+
+    # endregion
+
+    # region get_construct_ids tests
+    def test_get_construct_ids(self):
+        index = ConstructIndex(self.grna_names, self.construct_names)
+        output = index.get_construct_ids(numpy.array([2, 0, 1, 2, 2]), numpy.array([0, 1, 0, 1, 2]))
+        self.assertEqual([0, NO_CONSTRUCT, 1, 2, NO_CONSTRUCT], output.tolist())
+
+    def test_get_construct_ids_empty_library(self):
+        index = ConstructIndex(self.grna_names, [])
+        output = index.get_construct_ids(numpy.array([2, 0]), numpy.array([0, 1]))
+        self.assertEqual([NO_CONSTRUCT, NO_CONSTRUCT], output.tolist())
+
+    # endregion
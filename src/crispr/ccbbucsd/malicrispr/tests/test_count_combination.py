@@ -0,0 +1,148 @@
+# standard libraries
+import os
+import tempfile
+import unittest
+
+# project-specific libraries
+from ccbbucsd.malicrispr.count_combination import combine_count_files, combine_counts, \
+    update_combined_counts_store, write_collapsed_count_files, write_combined_count_file, \
+    write_incremental_combined_count_file
+from ccbbucsd.malicrispr.count_store import read_counts, read_counts_store_sources, write_counts
+
+__author__ = "Amanda Birmingham"
+__maintainer__ = "Amanda Birmingham"
+__email__ = "abirmingham@ucsd.edu"
+__status__ = "development"
+
+
+class TestFunctions(unittest.TestCase):
+    # the second lane's file lists its constructs in a different order and is missing one
+    lane_files_info = [("run_s1_L001_001_counts.npz", ["a__b", "a__c", "b__c"], [1, 2, 3]),
+                       ("run_s1_L002_001_counts.txt", ["b__c", "a__b"], [10, 20]),
+                       ("run_s2_L001_001_counts.npz", ["a__b", "a__c", "b__c"], [0, 5, 0])]
+
+    def _write_lane_files(self, temp_dir):
+        result = []
+        for curr_name, curr_construct_names, curr_counts in self.lane_files_info:
+            curr_fp = os.path.join(temp_dir, curr_name)
+            write_counts(curr_fp, curr_construct_names, ["counts"], [[x] for x in curr_counts], {"num_pairs": 9})
+            result.append(curr_fp)
+        return result
+
+    # region combine_counts tests
+    def test_combine_counts(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            counts_fps = self._write_lane_files(temp_dir)
+            construct_names, column_names, counts_matrix = combine_counts(counts_fps, ["s1", "s1", "s2"])
+
+        self.assertEqual(["a__b", "a__c", "b__c"], list(construct_names))
+        self.assertEqual(["s1", "s2"], column_names)
+        self.assertEqual([[21, 0], [2, 5], [13, 0]], counts_matrix.tolist())
+
+    # endregion
+
+    # region write_collapsed_count_files/write_combined_count_file tests
+    def test_write_collapsed_then_combined_count_files(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            counts_dir = os.path.join(temp_dir, "counts")
+            collapsed_dir = os.path.join(temp_dir, "collapsed")
+            os.mkdir(counts_dir)
+            os.mkdir(collapsed_dir)
+            counts_fps = self._write_lane_files(counts_dir)
+            # the .txt lane file must be in the same format as the others to be picked up
+            txt_construct_names, _, txt_counts_matrix, _ = read_counts(counts_fps[1])
+            os.remove(counts_fps[1])
+            write_counts(counts_fps[1].replace(".txt", ".npz"), txt_construct_names, ["counts"], txt_counts_matrix)
+
+            write_collapsed_count_files(counts_dir, collapsed_dir, "coll", "run", "counts.npz", "collapsed.npz")
+            collapsed_fps = sorted(os.listdir(collapsed_dir))
+            write_combined_count_file(collapsed_dir, temp_dir, "comb", "coll", "collapsed.npz", "combined.txt")
+            with open(os.path.join(temp_dir, "comb_combined.txt")) as file_handle:
+                combined_lines = file_handle.read().splitlines()
+            combined_df = combine_count_files([os.path.join(collapsed_dir, x) for x in collapsed_fps], "coll")
+
+        self.assertEqual(["coll_s1_counts_collapsed.npz", "coll_s2_counts_collapsed.npz"], collapsed_fps)
+        self.assertEqual(["construct_id\ts1_counts\ts2_counts", "a__b\t21\t0", "a__c\t2\t5", "b__c\t13\t0"],
+                         combined_lines)
+        self.assertEqual(["construct_id", "s1_counts", "s2_counts"], list(combined_df.columns))
+        self.assertEqual([21, 2, 13], combined_df["s1_counts"].tolist())
+
+    def test_write_combined_count_file_same_header_replaces(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            counts_fps = []
+            for curr_name, curr_counts in [("coll_s1_collapsed.txt", [1, 2]), ("coll_s2_collapsed.txt", [5, 6])]:
+                counts_fps.append(os.path.join(temp_dir, curr_name))
+                write_counts(counts_fps[-1], ["a__b", "a__c"], ["s"], [[x] for x in curr_counts])
+            write_combined_count_file(temp_dir, temp_dir, "comb", "coll", "collapsed.txt", "combined.txt")
+            with open(os.path.join(temp_dir, "comb_combined.txt"), 'rb') as file_handle:
+                combined_text = file_handle.read()
+            combined_df = combine_count_files(counts_fps, "coll")
+
+        # as when the files were combined as data frames, the later file's column replaces the earlier one's
+        self.assertEqual(b"construct_id\ts\na__b\t5\na__c\t6\n", combined_text)
+        self.assertEqual([5, 6], combined_df["s"].tolist())
+
+    # endregion
+
+    # region update_combined_counts_store tests
+    def test_update_combined_counts_store(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store_fp = os.path.join(temp_dir, "combined.npz")
+            counts_fps = self._write_lane_files(temp_dir)
+            first_folded = update_combined_counts_store(store_fp, counts_fps[:1] + counts_fps[2:], ["s1", "s2"])
+            second_folded = update_combined_counts_store(store_fp, counts_fps, ["s1", "s1", "s2"])
+            third_folded = update_combined_counts_store(store_fp, counts_fps, ["s1", "s1", "s2"])
+            after_new_lane = read_counts(store_fp)
+
+            # resequenced s2 replaces its old data, even though the old file is given no longer
+            reseq_fp = os.path.join(temp_dir, "run_s2_reseq_counts.npz")
+            write_counts(reseq_fp, ["a__b", "c__d"], ["counts"], [[4], [6]])
+            replace_folded = update_combined_counts_store(store_fp, counts_fps[:2] + [reseq_fp], ["s1", "s1", "s2"],
+                                                          replaced_column_names=["s2"])
+            after_replace = read_counts(store_fp)
+            num_sources = len(read_counts_store_sources(store_fp))
+
+        self.assertEqual(counts_fps[:1] + counts_fps[2:], first_folded)
+        self.assertEqual(counts_fps[1:2], second_folded)
+        self.assertEqual([], third_folded)
+        self.assertEqual([[21, 0], [2, 5], [13, 0]], after_new_lane[2].tolist())
+        self.assertEqual([reseq_fp], replace_folded)
+        self.assertEqual(["a__b", "a__c", "b__c", "c__d"], list(after_replace[0]))
+        self.assertEqual(["s1", "s2"], list(after_replace[1]))
+        self.assertEqual([[21, 4], [2, 0], [13, 0], [0, 6]], after_replace[2].tolist())
+        self.assertEqual(3, num_sources)
+
+    def test_update_combined_counts_store_refolds_changed_file(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store_fp = os.path.join(temp_dir, "combined.npz")
+            counts_fps = self._write_lane_files(temp_dir)
+            update_combined_counts_store(store_fp, counts_fps, ["s1", "s1", "s2"])
+            write_counts(counts_fps[1], ["a__b"], ["counts"], [[100]])
+            os.utime(counts_fps[1], (1, 1))  # make sure the change is noticed even on a coarse-grained file system
+            changed_folded = update_combined_counts_store(store_fp, counts_fps, ["s1", "s1", "s2"])
+            output = read_counts(store_fp)
+
+        self.assertEqual(counts_fps[:2], changed_folded)  # the whole of the changed file's sample is rebuilt
+        self.assertEqual([[101, 0], [2, 5], [3, 0]], output[2].tolist())
+
+    def test_write_incremental_combined_count_file(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            counts_dir = os.path.join(temp_dir, "counts")
+            os.mkdir(counts_dir)
+            counts_fps = self._write_lane_files(counts_dir)
+            os.remove(counts_fps[1])
+            first_folded = write_incremental_combined_count_file(counts_dir, temp_dir, "comb", "run", "counts.npz",
+                                                                 "combined.txt")
+            second_folded = write_incremental_combined_count_file(counts_dir, temp_dir, "comb", "run", "counts.npz",
+                                                                  "combined.txt")
+            with open(os.path.join(temp_dir, "comb_combined.txt")) as file_handle:
+                combined_lines = file_handle.read().splitlines()
+            output_names = sorted(os.listdir(temp_dir))
+
+        self.assertEqual(2, len(first_folded))
+        self.assertEqual([], second_folded)
+        self.assertEqual(["construct_id\ts1_counts\ts2_counts", "a__b\t1\t0", "a__c\t2\t5", "b__c\t3\t0"],
+                         combined_lines)
+        self.assertEqual(["comb_combined.npz", "comb_combined.txt", "counts"], output_names)
+
+    # endregion
@@ -0,0 +1,77 @@
+# standard libraries
+import os
+import tempfile
+import unittest
+
+# third-party libraries
+try:
+    import matplotlib
+    matplotlib.use("Agg")  # the tests only save plots, so need no display
+except ImportError:
+    matplotlib = None
+import numpy
+import pandas
+
+# project-specific libraries
+from ccbbucsd.malicrispr.count_store import write_counts
+if matplotlib is not None:
+    from ccbbucsd.malicrispr.count_plots import batch_plot_combined_raw_counts, batch_plot_raw_counts, \
+        make_log2_array, make_log2_series
+
+__author__ = "Amanda Birmingham"
+__maintainer__ = "Amanda Birmingham"
+__email__ = "abirmingham@ucsd.edu"
+__status__ = "development"
+
+
+@unittest.skipUnless(matplotlib, "matplotlib is not installed")
+class TestFunctions(unittest.TestCase):
+    construct_names = ["a1__b1", "a1__b2", "a2__b1", "a2__b2"]
+
+    # region make_log2_array tests
+    def test_make_log2_array_matches_make_log2_series(self):
+        counts = [0, 1, 7, 0, 1023]
+        for pseudocount in [1, 0]:
+            expected = make_log2_series(pandas.Series(counts), pseudocount).tolist()
+            output = make_log2_array(numpy.array(counts), pseudocount)
+            self.assertEqual(expected, output[~numpy.isnan(output)].tolist())
+
+        # with no pseudocount, log2 of a zero count is undefined
+        self.assertEqual([True, False, False, True, False], numpy.isnan(make_log2_array(counts, 0)).tolist())
+
+    # endregion
+
+    # region batch_plot_raw_counts tests
+    def test_batch_plot_raw_counts(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output_dir = os.path.join(temp_dir, "plots")
+            os.mkdir(output_dir)
+            for curr_sample, curr_counts in [("sampleA", [0, 5, 10, 200]), ("sampleB", [3, 0, 0, 7])]:
+                write_counts(os.path.join(temp_dir, "run1_{0}_counts.txt".format(curr_sample)), self.construct_names,
+                             ["run1_{0}".format(curr_sample)], numpy.array(curr_counts).reshape(-1, 1))
+
+            output = batch_plot_raw_counts(temp_dir, "run1", "_counts.txt", output_dir, "run2", "boxplots.png",
+                                           num_processes=1, figsize=(4, 4))
+            expected = sorted(os.path.join(output_dir, "{0}_counts_run1_{1}".format(x, y))
+                              for x in ["sampleA", "sampleB"] for y in ["boxplots.png", "hist.png"])
+            self.assertEqual(expected, output)
+            self.assertEqual([os.path.basename(x) for x in expected], sorted(os.listdir(output_dir)))
+            self.assertTrue(all(os.path.getsize(x) > 0 for x in expected))
+
+    # endregion
+
+    # region batch_plot_combined_raw_counts tests
+    def test_batch_plot_combined_raw_counts(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output_dir = os.path.join(temp_dir, "plots")
+            os.mkdir(output_dir)
+            write_counts(os.path.join(temp_dir, "run1_combined_counts.txt"), self.construct_names,
+                         ["sampleA", "sampleB"], numpy.array([[0, 3], [5, 0], [10, 0], [200, 7]]))
+
+            output = batch_plot_combined_raw_counts(temp_dir, "run1", "combined_counts.txt", output_dir, "run2",
+                                                    "boxplots.png", figsize=(4, 4))
+            self.assertEqual(os.path.join(output_dir, "run2_boxplots.png"), output)
+            self.assertEqual(["run2_boxplots.png"], os.listdir(output_dir))
+            self.assertGreater(os.path.getsize(output), 0)
+
+    # endregion
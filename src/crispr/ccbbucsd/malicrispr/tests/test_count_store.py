@@ -0,0 +1,76 @@
+# standard libraries
+import os
+import tempfile
+import unittest
+
+# project-specific libraries
+from ccbbucsd.malicrispr.count_store import export_counts_store_to_text, get_counts_store_suffix, read_counts, \
+    write_counts
+
+__author__ = "Amanda Birmingham"
+__maintainer__ = "Amanda Birmingham"
+__email__ = "abirmingham@ucsd.edu"
+__status__ = "development"
+
+
+class TestFunctions(unittest.TestCase):
+    construct_names = ["a__b", "a__c", "b__c"]
+    counts_matrix = [[3, 0], [1, 7], [0, 2]]
+    counts_by_type = {"num_pairs": 20, "num_constructs_recognized": 13, "sample_method": "first"}
+
+    def _assert_counts_equal(self, expected_headers, expected_summary, output):
+        construct_names, count_headers, counts_matrix, summary_counts = output
+        self.assertEqual(self.construct_names, list(construct_names))
+        self.assertEqual(expected_headers, list(count_headers))
+        self.assertEqual(self.counts_matrix, counts_matrix.tolist())
+        self.assertEqual(expected_summary, summary_counts)
+
+    # region get_counts_store_suffix tests
+    def test_get_counts_store_suffix(self):
+        self.assertEqual("counts.npz", get_counts_store_suffix("counts.txt"))
+
+    # endregion
+
+    # region write_counts/read_counts tests
+    def test_write_and_read_counts_store(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store_fp = os.path.join(temp_dir, "sample_counts.npz")
+            write_counts(store_fp, self.construct_names, ["s1", "s2"], self.counts_matrix, self.counts_by_type)
+            output = read_counts(store_fp)
+            self.assertEqual(["sample_counts.npz"], os.listdir(temp_dir))
+
+        self._assert_counts_equal(["s1", "s2"], self.counts_by_type, output)
+
+    def test_write_and_read_counts_text(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            text_fp = os.path.join(temp_dir, "sample_counts.txt")
+            write_counts(text_fp, self.construct_names, ["s1", "s2"], self.counts_matrix, self.counts_by_type)
+            with open(text_fp, 'rb') as file_handle:
+                text_lines = file_handle.read().decode().split("\n")
+            output = read_counts(text_fp)
+
+        # lines end in just a newline, as pandas wrote them
+        self.assertEqual(["# num_pairs:20,num_constructs_recognized:13,sample_method:first",
+                          "construct_id\ts1\ts2", "a__b\t3\t0", "a__c\t1\t7", "b__c\t0\t2", ""], text_lines)
+        self._assert_counts_equal(["s1", "s2"], self.counts_by_type, output)
+
+    # endregion
+
+    # region export_counts_store_to_text tests
+    def test_export_counts_store_to_text(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store_fp = os.path.join(temp_dir, "sample_counts.npz")
+            text_fp = os.path.join(temp_dir, "sample_counts.txt")
+            exported_fp = os.path.join(temp_dir, "exported_counts.txt")
+            for curr_fp in [store_fp, text_fp]:
+                write_counts(curr_fp, self.construct_names, ["counts"], [x[:1] for x in self.counts_matrix],
+                             self.counts_by_type)
+            export_counts_store_to_text(store_fp, exported_fp)
+            with open(text_fp) as file_handle:
+                expected = file_handle.read()
+            with open(exported_fp) as file_handle:
+                output = file_handle.read()
+
+        self.assertEqual(expected, output)
+
+    # endregion
@@ -0,0 +1,128 @@
+# standard libraries
+import random
+import unittest
+
+# project-specific libraries
+from ccbbucsd.malicrispr.grna_mismatch_index import GrnaMismatchIndex
+
+__author__ = "Amanda Birmingham"
+__maintainer__ = "Amanda Birmingham"
+__email__ = "abirmingham@ucsd.edu"
+__status__ = "development"
+
+
+class TestGrnaMismatchIndex(unittest.TestCase):
+    @staticmethod
+    def _linear_scan_best_match(grna_seqs, input_seq, num_allowed_mismatches):
+        best_index = None
+        best_num_mismatches = num_allowed_mismatches + 1
+        for curr_index, curr_seq in enumerate(grna_seqs):
+            num_mismatches = sum(1 for x, y in zip(input_seq, curr_seq) if x != y)
+            if num_mismatches < best_num_mismatches:
+                best_index = curr_index
+                best_num_mismatches = num_mismatches
+        return (best_index, best_num_mismatches) if best_index is not None else (None, None)
+
+    # region find_best_match tests
+    def test_find_best_match_perfect(self):
+        index = GrnaMismatchIndex(["ACCG", "AAAT"], 4, 1)
+        self.assertEqual((1, 0), index.find_best_match("AAAT", 1))
+
+    def test_find_best_match_acceptable_mismatch(self):
+        index = GrnaMismatchIndex(["ACCG", "AAAT"], 4, 1)
+        self.assertEqual((1, 1), index.find_best_match("AACT", 1))
+
+    def test_find_best_match_unacceptable_mismatch(self):
+        index = GrnaMismatchIndex(["ACCG", "AAAT"], 4, 2)
+        self.assertEqual((None, None), index.find_best_match("TTCA", 1))
+        self.assertEqual((None, None), index.find_best_match("TTCA", 2))
+
+    def test_find_best_match_tie_goes_to_first_grna(self):
+        # AACC is one mismatch from both AACG and AACT
+        index = GrnaMismatchIndex(["GGGG", "AACT", "AACG"], 4, 1)
+        self.assertEqual((1, 1), index.find_best_match("AACC", 1))
+
+    def test_find_best_match_more_mismatches_than_segments(self):
+        index = GrnaMismatchIndex(["AC", "GT"], 2, 2)
+        self.assertEqual((1, 1), index.find_best_match("TT", 2))
+        self.assertEqual((0, 2), index.find_best_match("CA", 2))
+
+    def test_find_best_match_too_many_mismatches_requested(self):
+        index = GrnaMismatchIndex(["ACCG", "AAAT"], 4, 1)
+        with self.assertRaises(ValueError):
+            index.find_best_match("AAAT", 2)
+
+    def test_find_best_match_agrees_with_linear_scan(self):
+        rng = random.Random(42)
+        seq_len = 19
+        grna_seqs = sorted(set("".join(rng.choice("ACGT") for _ in range(seq_len)) for _ in range(500)))
+        index = GrnaMismatchIndex(grna_seqs, seq_len, 2)
+
+        for _ in range(300):
+            read_seq = list(rng.choice(grna_seqs))
+            for _ in range(rng.randint(0, 4)):
+                read_seq[rng.randrange(seq_len)] = rng.choice("ACGTN")
+            read_seq = "".join(read_seq)
+
+            for num_allowed_mismatches in [0, 1, 2]:
+                self.assertEqual(self._linear_scan_best_match(grna_seqs, read_seq, num_allowed_mismatches),
+                                 index.find_best_match(read_seq, num_allowed_mismatches))
+
+    def test_find_best_match_with_seed_arrays_agrees_with_dictionaries(self):
+        rng = random.Random(3)
+        seq_len = 19
+        grna_seqs = ["".join(rng.choice("ACGT") for _ in range(seq_len)) for _ in range(300)]
+        grna_seqs.append(grna_seqs[5])  # a repeated sequence still matches its first occurrence
+
+        for max_allowed_mismatches in [0, 2, 20]:
+            index = GrnaMismatchIndex(grna_seqs, seq_len, max_allowed_mismatches)
+            seed_index = GrnaMismatchIndex(grna_seqs, seq_len, max_allowed_mismatches,
+                                           GrnaMismatchIndex.build_seed_arrays(grna_seqs, seq_len,
+                                                                               max_allowed_mismatches))
+            for _ in range(200):
+                read_seq = list(rng.choice(grna_seqs))
+                for _ in range(rng.randint(0, 4)):
+                    read_seq[rng.randrange(seq_len)] = rng.choice("ACGTN")
+                read_seq = "".join(read_seq)
+                num_allowed_mismatches = min(max_allowed_mismatches, 2)
+                self.assertEqual(index.find_best_match(read_seq, num_allowed_mismatches),
+                                 seed_index.find_best_match(read_seq, num_allowed_mismatches))
+
+    # endregion
+
+    # region find_best_match_in_window tests
+    def test_find_best_match_in_window_shifted(self):
+        index = GrnaMismatchIndex(["ACCGTA", "AAATTT"], 6, 1)
+        self.assertEqual((1, 0, 3), index.find_best_match_in_window("GGGAAATTTGG", 1, 0, 5))
+        self.assertEqual((None, None, None), index.find_best_match_in_window("GGGAAATTTGG", 1, 0, 1))
+
+    def test_find_best_match_in_window_prefers_fewer_mismatches_then_lower_offset(self):
+        index = GrnaMismatchIndex(["ACCGTA", "AAATTT"], 6, 1)
+        # one-mismatch match at offset 0, perfect match at offset 7
+        self.assertEqual((1, 0, 7), index.find_best_match_in_window("AAATTAGAAATTT", 1, 0, 8))
+        # one-mismatch matches at offsets 0 and 7
+        self.assertEqual((1, 1, 0), index.find_best_match_in_window("AAATTAGAAATTA", 1, 0, 8))
+
+    def test_find_best_match_in_window_agrees_with_linear_scan(self):
+        rng = random.Random(7)
+        seq_len = 19
+        grna_seqs = sorted(set("".join(rng.choice("ACGT") for _ in range(seq_len)) for _ in range(200)))
+        index = GrnaMismatchIndex(grna_seqs, seq_len, 2)
+
+        for _ in range(100):
+            read_seq = list(rng.choice(grna_seqs))
+            for _ in range(rng.randint(0, 3)):
+                read_seq[rng.randrange(seq_len)] = rng.choice("ACGTN")
+            prefix = "".join(rng.choice("ACGT") for _ in range(rng.randint(0, 10)))
+            read_seq = prefix + "".join(read_seq) + "".join(rng.choice("ACGT") for _ in range(5))
+
+            expected = (None, None, None)
+            for curr_offset in range(0, 11):
+                curr_index, curr_num_mismatches = self._linear_scan_best_match(
+                    grna_seqs, read_seq[curr_offset:curr_offset + seq_len], 2)
+                if len(read_seq) - curr_offset >= seq_len and curr_index is not None and \
+                        (expected[0] is None or curr_num_mismatches < expected[1]):
+                    expected = (curr_index, curr_num_mismatches, curr_offset)
+            self.assertEqual(expected, index.find_best_match_in_window(read_seq, 2, 0, 10))
+
+    # endregion
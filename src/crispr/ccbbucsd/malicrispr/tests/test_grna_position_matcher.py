@@ -96,3 +96,80 @@ class TestGrnaPositionMatcher(unittest.TestCase):
         self.assertEqual(grnaB, name3)
 
     # endregion
+
+    # region find_fw_and_rv_read_matches_batch tests
+    def test_find_fw_and_rv_read_matches_batch(self):
+        names_and_seqs = [("test_grna_1", "ACCG"),
+                          ("test_grna_2", "AAAT"),
+                          ("something_else", "GGAG")]
+        matcher = GrnaPositionMatcher(names_and_seqs, 4, 1, 1)
+        fw_seqs = ["AACT", "AACT", "TTCA", "ACCGT", "AAC"]
+        rv_seqs = ["CTCA", "GGGG", "CTCC", "ACGGT", "CTCA"]
+        fw_indices, fw_mismatches, rv_indices, rv_mismatches = matcher.find_fw_and_rv_read_matches_batch(fw_seqs,
+                                                                                                         rv_seqs)
+        self.assertEqual([1, 1, -1, 0, -1], fw_indices.tolist())
+        self.assertEqual([1, 1, -1, 0, -1], fw_mismatches.tolist())
+        self.assertEqual([2, -1, -1, 0, -1], rv_indices.tolist())  # rv not matched when fw isn't
+        self.assertEqual([1, -1, -1, 0, -1], rv_mismatches.tolist())
+
+        for x in range(0, len(fw_seqs)):
+            grnaA, grnaB = matcher.find_fw_and_rv_read_matches(fw_seqs[x], rv_seqs[x])
+            self.assertEqual(grnaA, matcher.grna_names[fw_indices[x]] if fw_indices[x] >= 0 else None)
+            self.assertEqual(grnaB, matcher.grna_names[rv_indices[x]] if rv_indices[x] >= 0 else None)
+
+    # endregion
+
+    # region search window tests
+    def test_find_fw_and_rv_read_match_ids_and_offsets_untrimmed(self):
+        names_and_seqs = [("test_grna_1", "ACCGTA"),
+                          ("test_grna_2", "AAATTT"),
+                          ("something_else", "GGAGCA")]
+        matcher = GrnaPositionMatcher(names_and_seqs, 6, 1, 1, fw_search_window=(2, 6), rv_search_window=(0, 4))
+        # fw: scaffold + test_grna_2 (one mismatch) + tail; rv: scaffold + rev comp of something_else + tail
+        output = matcher.find_fw_and_rv_read_match_ids_and_offsets("CCCCAAACTTGGG", "TTTGCTCCCCCCC")
+        self.assertEqual((1, 4, 2, 2), output)
+        self.assertEqual((1, 2), matcher.find_fw_and_rv_read_match_ids("CCCCAAACTTGGG", "TTTGCTCCCCCCC"))
+        self.assertEqual(("test_grna_2", "something_else"),
+                         matcher.find_fw_and_rv_read_matches("CCCCAAACTTGGG", "TTTGCTCCCCCCC"))
+
+        # gRNA outside of the window isn't found
+        self.assertEqual((None, None, None, None),
+                         matcher.find_fw_and_rv_read_match_ids_and_offsets("CCCCCCCAAATTT", "TTTGCTCCCCCCC"))
+
+    def test_search_windows_at_zero_match_fixed_position(self):
+        names_and_seqs = [("test_grna_1", "ACCG"),
+                          ("test_grna_2", "AAAT"),
+                          ("something_else", "GGAG")]
+        fixed_matcher = GrnaPositionMatcher(names_and_seqs, 4, 1, 1)
+        windowed_matcher = GrnaPositionMatcher(names_and_seqs, 4, 1, 1, fw_search_window=(0, 0), cache_size=10)
+        fw_seqs = ["AACT", "AACT", "TTCA", "ACCG", "AAC"]
+        rv_seqs = ["CTCA", "GGGG", "CTCC", "CGGT", "CTCA"]
+        fixed_output = fixed_matcher.find_fw_and_rv_read_matches_batch(fw_seqs, rv_seqs)
+        windowed_output = windowed_matcher.find_fw_and_rv_read_matches_batch(fw_seqs, rv_seqs)
+        for fixed_array, windowed_array in zip(fixed_output, windowed_output):
+            self.assertEqual(fixed_array.tolist(), windowed_array.tolist())
+
+        for fw_seq, rv_seq in zip(fw_seqs, rv_seqs):
+            self.assertEqual(fixed_matcher.find_fw_and_rv_read_match_ids_and_offsets(fw_seq, rv_seq),
+                             windowed_matcher.find_fw_and_rv_read_match_ids_and_offsets(fw_seq, rv_seq))
+            self.assertEqual(fixed_matcher.find_fw_and_rv_read_match_ids(fw_seq, rv_seq),
+                             windowed_matcher.find_fw_and_rv_read_match_ids(fw_seq, rv_seq))
+
+    def test_unset_rv_search_window_matches_fixed_position_in_longer_reads(self):
+        names_and_seqs = [("test_grna_1", "ACCG"),
+                          ("test_grna_2", "AAAT"),
+                          ("something_else", "GGAG")]
+        fixed_matcher = GrnaPositionMatcher(names_and_seqs, 4, 1, 1)
+        windowed_matcher = GrnaPositionMatcher(names_and_seqs, 4, 1, 1, fw_search_window=(0, 2))
+        # rv reads longer than the gRNA, holding its reverse complement at the 3' end, at the 5' end, or not at all
+        fw_seqs = ["AACTGG", "AAATGG", "ACCGGG", "ACCGGG", "AAATG"]
+        rv_seqs = ["GGGGCTCC", "CTCCGGGG", "AAAACGGT", "AAAACGGTA", "TT"]
+        self.assertEqual((1, 0, 2, 4), windowed_matcher.find_fw_and_rv_read_match_ids_and_offsets(fw_seqs[0],
+                                                                                                   rv_seqs[0]))
+        self.assertEqual((1, 0, None, None), windowed_matcher.find_fw_and_rv_read_match_ids_and_offsets(fw_seqs[1],
+                                                                                                         rv_seqs[1]))
+        for fw_seq, rv_seq in zip(fw_seqs, rv_seqs):
+            self.assertEqual(fixed_matcher.find_fw_and_rv_read_match_ids_and_offsets(fw_seq, rv_seq),
+                             windowed_matcher.find_fw_and_rv_read_match_ids_and_offsets(fw_seq, rv_seq))
+
+    # endregion
@@ -0,0 +1,115 @@
+# standard libraries
+import glob
+import os
+import tempfile
+import unittest
+import unittest.mock
+
+# ccbb libraries
+from ccbbucsd.utilities.files_and_paths import build_multipart_fp, transform_path
+try:
+    from ccbbucsd.utilities import notebook_pipeliner
+except ImportError:  # the notebook runner needs the jupyter libraries
+    notebook_pipeliner = None
+
+# project-specific libraries
+from ccbbucsd.malicrispr.construct_counter import get_counts_file_suffix
+from ccbbucsd.malicrispr.count_combination import get_combined_counts_file_suffix
+from ccbbucsd.malicrispr.count_filterer import get_filtered_file_suffix
+from ccbbucsd.malicrispr.mali_pipeline_steps import PipelineSteps, get_pipeline_steps
+
+__author__ = "Amanda Birmingham"
+__maintainer__ = "Amanda Birmingham"
+__email__ = "abirmingham@ucsd.edu"
+__status__ = "development"
+
+
+@unittest.skipUnless(notebook_pipeliner, "the jupyter libraries are not installed")
+class TestFunctions(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.processed_dir = os.path.join(temp_dir.name, "processed")
+        self.fastqs_dir = os.path.join(temp_dir.name, "raw")
+        self.interim_dir = os.path.join(temp_dir.name, "interim")
+        for curr_dir in [self.processed_dir, self.fastqs_dir, self.interim_dir]:
+            os.mkdir(curr_dir)
+        for curr_read in ["R1", "R2"]:
+            with open(os.path.join(self.fastqs_dir, "sample_L001_{0}_001.fastq.gz".format(curr_read)), 'w') as \
+                    file_handle:
+                file_handle.write(curr_read)
+        self.constructs_fp = os.path.join(temp_dir.name, "constructs.txt")
+        with open(self.constructs_fp, 'w') as file_handle:
+            file_handle.write("constructs")
+
+        # counts left in the shared interim directory by an earlier run of the same fastqs
+        self.other_counts_fp = build_multipart_fp(self.interim_dir, ["sample_L001_001_trimmed53_len_filtered",
+                                                                     "ds_20150101000000", get_counts_file_suffix()])
+        with open(self.other_counts_fp, 'w') as file_handle:
+            file_handle.write("other run")
+
+        notebooks_dir = os.path.join(temp_dir.name, "notebooks")
+        self.steps = get_pipeline_steps(notebooks_dir, self.fastqs_dir, self.interim_dir, self.constructs_fp,
+                                        "ds_{timestamp}")
+        os.mkdir(notebooks_dir)
+        for curr_step in self.steps.values():
+            with open(os.path.join(notebooks_dir, curr_step[1]), 'w') as file_handle:
+                file_handle.write(curr_step[1])
+        self.run_params = {notebook_pipeliner.DATASET_NAME_KEY: "ds", notebook_pipeliner.ALG_NAME_KEY: "alg",
+                           "g_fastq_counts_run_prefix": "ds_{timestamp}", "g_run_prefix": "{run_prefix}",
+                           "g_run_dir": "{run_dir}"}
+
+    def _execute_notebook(self, notebook_filename, notebook_filename_out, params_dict, run_path="",
+                          kernel_manager=None):
+        # stands in for executing each step's notebook, writing the same file names it does
+        with open(notebook_filename_out, 'w') as file_handle:
+            file_handle.write("{}")
+        step = [x for x, y in self.steps.items() if y[1] == notebook_filename][0]
+        if step == PipelineSteps.SCAFFOLD_TRIMMING:
+            output_fps = [transform_path(x, self.interim_dir, "_trimmed53.fastq")
+                          for x in glob.glob(os.path.join(self.fastqs_dir, "*.fastq.gz"))]
+        elif step == PipelineSteps.TRIMMED_READ_FILTERING:
+            output_fps = [transform_path(x, self.interim_dir, get_filtered_file_suffix())
+                          for x in glob.glob(os.path.join(self.interim_dir, "*_trimmed53.fastq"))]
+        elif step == PipelineSteps.CONSTRUCT_COUNTING:
+            output_fps = [build_multipart_fp(self.interim_dir, ["sample_L001_001_trimmed53_len_filtered",
+                                                                params_dict["g_fastq_counts_run_prefix"],
+                                                                get_counts_file_suffix()])]
+        elif step == PipelineSteps.COUNT_COMBINATION:
+            output_fps = [build_multipart_fp(params_dict["g_run_dir"], [params_dict["g_run_prefix"],
+                                                                        get_combined_counts_file_suffix()])]
+        else:
+            output_fps = [build_multipart_fp(params_dict["g_run_dir"], [params_dict["g_run_prefix"], "box.png"])]
+        for curr_fp in output_fps:
+            with open(curr_fp, 'w') as file_handle:
+                file_handle.write(os.path.basename(curr_fp))
+
+    def _execute_run(self):
+        with unittest.mock.patch.object(notebook_pipeliner, "execute_notebook", side_effect=self._execute_notebook), \
+                unittest.mock.patch.object(notebook_pipeliner, "export_notebook_to_html"):
+            return notebook_pipeliner.execute_run(self.steps, self.run_params, list(PipelineSteps),
+                                                  self.processed_dir, run_folder="run1")
+
+    # region get_pipeline_steps tests
+    def test_get_pipeline_steps_unchanged_run_skips_every_step(self):
+        self.assertTrue(all(x[1] for x in self._execute_run()))
+        # the filtered fastqs, written next to the trimmed ones, aren't inputs of the filtering step
+        self.assertEqual([(x, False) for x in PipelineSteps], self._execute_run())
+
+    def test_get_pipeline_steps_counts_of_other_runs_ignored(self):
+        self._execute_run()
+        counts_fps = glob.glob(os.path.join(self.interim_dir, "*" + get_counts_file_suffix()))
+        self.assertEqual(2, len(counts_fps))
+        os.remove([x for x in counts_fps if x != self.other_counts_fp][0])
+
+        # the earlier run's counts don't stand in for this run's missing ones
+        self.assertEqual([(PipelineSteps.SCAFFOLD_TRIMMING, False), (PipelineSteps.TRIMMED_READ_FILTERING, False),
+                          (PipelineSteps.CONSTRUCT_COUNTING, True), (PipelineSteps.COUNT_COMBINATION, False),
+                          (PipelineSteps.COUNT_PLOTTING, False)], self._execute_run())
+
+        # nor are they inputs of the count combination step
+        with open(self.other_counts_fp, 'w') as file_handle:
+            file_handle.write("other run, changed")
+        self.assertEqual([(x, False) for x in PipelineSteps], self._execute_run())
+
+    # endregion
@@ -0,0 +1,61 @@
+# standard libraries
+import unittest
+
+# project-specific libraries
+from ccbbucsd.malicrispr.read_match_cache import EvictionPolicy, ReadMatchCache
+
+__author__ = "Amanda Birmingham"
+__maintainer__ = "Amanda Birmingham"
+__email__ = "abirmingham@ucsd.edu"
+__status__ = "development"
+
+
+class TestReadMatchCache(unittest.TestCase):
+    # region lookup/store tests
+    def test_lookup_caches_no_match_results(self):
+        cache = ReadMatchCache(2)
+        self.assertEqual((False, None), cache.lookup(("AAAA", "CCCC")))
+        cache.store(("AAAA", "CCCC"), (None, None))
+        self.assertEqual((True, (None, None)), cache.lookup(("AAAA", "CCCC")))
+        self.assertEqual(1, cache.num_hits)
+        self.assertEqual(1, cache.num_misses)
+        self.assertEqual(0.5, cache.hit_rate)
+
+    def test_store_evicts_least_recently_used(self):
+        cache = ReadMatchCache(2, EvictionPolicy.LRU)
+        cache.store("one", 1)
+        cache.store("two", 2)
+        cache.lookup("one")  # one is now more recently used than two
+        cache.store("three", 3)
+        self.assertEqual(2, len(cache))
+        self.assertEqual((True, 1), cache.lookup("one"))
+        self.assertEqual((False, None), cache.lookup("two"))
+
+    def test_store_evicts_first_in(self):
+        cache = ReadMatchCache(2, "fifo")
+        cache.store("one", 1)
+        cache.store("two", 2)
+        cache.lookup("one")  # doesn't matter for fifo
+        cache.store("three", 3)
+        self.assertEqual((False, None), cache.lookup("one"))
+        self.assertEqual((True, 2), cache.lookup("two"))
+
+    def test_init_bad_size(self):
+        with self.assertRaises(ValueError):
+            ReadMatchCache(0)
+
+    # endregion
+
+    # region summarize tests
+    def test_summarize(self):
+        cache = ReadMatchCache(10)
+        cache.store("one", 1)
+        for _ in range(3):
+            cache.lookup("one")
+        cache.lookup("two")
+        self.assertEqual({"num_match_cache_hits": 3, "num_match_cache_misses": 1, "match_cache_hit_rate": 0.75},
+                         cache.summarize())
+        cache.reset_stats()
+        self.assertEqual(0.0, cache.hit_rate)
+
+    # endregion
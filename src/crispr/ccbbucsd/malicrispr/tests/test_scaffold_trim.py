@@ -0,0 +1,96 @@
+# standard libraries
+import os
+import tempfile
+import unittest
+
+# third-party libraries
+try:
+    import cutadapt
+except ImportError:
+    cutadapt = None
+
+# ccbb libraries
+from ccbbucsd.utilities.basic_fastq import FastqHandler, paired_fastq_generator
+
+# project-specific libraries
+if cutadapt is not None:
+    from ccbbucsd.malicrispr.scaffold_trim import ScaffoldTrimmer, scaffold_trimmed_pair_generator, \
+        trim_global_scaffold, trim_scaffolds_from_pair
+
+__author__ = "Amanda Birmingham"
+__maintainer__ = "Amanda Birmingham"
+__email__ = "abirmingham@ucsd.edu"
+__status__ = "development"
+
+_FULL_5P_R1 = "TATATATCTTGTGGAAAGGACGAAACACCG"
+_FULL_5P_R2 = "CCTTATTTTAACTTGCTATTTCTAGCTCTAAAAC"
+_FULL_3P_R1 = "GTTTCAGAGCTATGCTGGAAACTGCATAGCAAGTTGAAATAAGGCTAGTCCGTTATCAACTTGAAAAAGTGGCACCGAGTCGGTGCTTTTTTGTACTGAG"
+_FULL_3P_R2 = "CAAACAAGGCTTTTCTCCAAGGGATATTTATAGTCTCAAAACACACAATTACTTTACAGTTAGGGTGAGTTTCCTTTTGTGCTGTTTTTTAAAATA"
+
+# full and truncated scaffolds, a mismatch within the 5' scaffold, a missing 3' scaffold, and no scaffold at all
+_FW_SEQS = ["TTGTGGAAAGGACGAAACACCGACGTACGTACGTACGTACGGTTTCAGAGCTATGCTG",
+            "GGACGAAACACCGTTTTCCCCAAAAGGGGTTTTGTTTC",
+            "TTGTGGAAAGGACGTAACACCGACGTACGTACGTACGTACGGTTTCAGAG",
+            "TTGTGGAAAGGACGAAACACCGACGTACGTACGTACGTACGTGGTGG",
+            "ACGTACGTACGTACGTACGT"]
+_RV_SEQS = ["TAGCTCTAAAACCGTACGTACGTACGTACGTCAAACAAGGCTTTTCTCC",
+            "TTTCTAGCTCTAAAACAAAACCCCTTTTGGGGAAAACAAACAAGG",
+            "AACTTGCTATTTCTAGCTCTAAAACCGTACGTACGTACGTACGTCAAAC",
+            "GCTCTAAAACCGTACGTACGTACGTACGTAAAAAAAA",
+            "CGTACGTACGTACGTACGTA"]
+
+
+def _write_fastq(output_fp, seqs):
+    with open(output_fp, 'w') as file_handle:
+        for index, curr_seq in enumerate(seqs):
+            file_handle.write("@read{0}\n{1}\n+\n{2}\n".format(index, curr_seq, "I" * len(curr_seq)))
+
+
+def _read_seqs_and_quals(fw_fastq_fp, rv_fastq_fp):
+    return [((x.sequence, x.quality), (y.sequence, y.quality)) for x, y in
+            paired_fastq_generator(FastqHandler(fw_fastq_fp), FastqHandler(rv_fastq_fp), True)]
+
+
+@unittest.skipUnless(cutadapt, "cutadapt is not installed")
+class TestScaffoldTrimmer(unittest.TestCase):
+    # region trimming vs cutadapt command line tests
+    def _write_inputs_and_cli_outputs(self, temp_dir):
+        fw_fp = os.path.join(temp_dir, "sample_L001_R1_001.fastq")
+        rv_fp = os.path.join(temp_dir, "sample_L001_R2_001.fastq")
+        _write_fastq(fw_fp, _FW_SEQS)
+        _write_fastq(rv_fp, _RV_SEQS)
+        cli_dir = os.path.join(temp_dir, "cli")
+        os.mkdir(cli_dir)
+        # chained cutadapt -g and -a runs, as the scaffold trimming notebook does
+        cli_fw_fp = trim_global_scaffold(cli_dir, fw_fp, _FULL_5P_R1, _FULL_3P_R1)
+        cli_rv_fp = trim_global_scaffold(cli_dir, rv_fp, _FULL_5P_R2, _FULL_3P_R2)
+        return fw_fp, rv_fp, _read_seqs_and_quals(cli_fw_fp, cli_rv_fp)
+
+    def test_trim_record_matches_cutadapt_cli(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            fw_fp, rv_fp, expected_output = self._write_inputs_and_cli_outputs(temp_dir)
+            fw_trimmer = ScaffoldTrimmer(_FULL_5P_R1, _FULL_3P_R1)
+            rv_trimmer = ScaffoldTrimmer(_FULL_5P_R2, _FULL_3P_R2)
+            output = [((fw_trimmer.trim_record(x).sequence, x.quality), (rv_trimmer.trim_record(y).sequence,
+                                                                           y.quality))
+                      for x, y in paired_fastq_generator(FastqHandler(fw_fp), FastqHandler(rv_fp), True)]
+        self.assertEqual(expected_output, output)
+
+    def test_scaffold_trimmed_pair_generator_matches_cutadapt_cli(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            fw_fp, rv_fp, expected_output = self._write_inputs_and_cli_outputs(temp_dir)
+            output = [((x.sequence, x.quality), (y.sequence, y.quality)) for x, y in scaffold_trimmed_pair_generator(
+                _FULL_5P_R1, _FULL_3P_R1, _FULL_5P_R2, _FULL_3P_R2, fw_fp, rv_fp)]
+        self.assertEqual(expected_output, output)
+
+    def test_trim_scaffolds_from_pair_matches_cutadapt_cli(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            fw_fp, rv_fp, expected_output = self._write_inputs_and_cli_outputs(temp_dir)
+            output_fps = trim_scaffolds_from_pair(temp_dir, _FULL_5P_R1, _FULL_3P_R1, _FULL_5P_R2, _FULL_3P_R2,
+                                                  fw_fp, rv_fp)
+            output = _read_seqs_and_quals(*output_fps)
+        self.assertEqual(["sample_L001_R1_001_trimmed53.fastq", "sample_L001_R2_001_trimmed53.fastq"],
+                         [os.path.basename(x) for x in output_fps])
+        self.assertEqual(expected_output, output)
+
+    # endregion
@@ -0,0 +1,97 @@
+# standard libraries
+import os
+import tempfile
+import unittest
+
+# ccbb libraries
+from ccbbucsd.utilities.basic_fastq import FastqHandler, paired_fastq_generator
+from ccbbucsd.utilities.bio_seq_utilities import rev_comp_canonical_dna_seq
+
+# project-specific libraries
+from ccbbucsd.malicrispr.synthetic_screen_data import FULL_3P_R1, FULL_3P_R2, FULL_5P_R1, FULL_5P_R2, \
+    make_synthetic_library, write_synthetic_fastq_pair, write_synthetic_untrimmed_fastq_pair
+
+__author__ = "Amanda Birmingham"
+__maintainer__ = "Amanda Birmingham"
+__email__ = "abirmingham@ucsd.edu"
+__status__ = "development"
+
+
+class TestFunctions(unittest.TestCase):
+    def _write_and_read_pairs(self, num_constructs, num_pairs, write_func=write_synthetic_fastq_pair, **kwargs):
+        grnas, construct_names = make_synthetic_library(num_constructs)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            fw_fp, rv_fp = write_func(temp_dir, "syn", grnas, construct_names, num_pairs, **kwargs)
+            self.assertEqual(["syn_R1_001.fastq", "syn_R2_001.fastq"], [os.path.basename(x) for x in [fw_fp, rv_fp]])
+            return grnas, list(paired_fastq_generator(FastqHandler(fw_fp), FastqHandler(rv_fp)))
+
+    # region make_synthetic_library tests
+    def test_make_synthetic_library(self):
+        grnas, construct_names = make_synthetic_library(10, min_grna_len=19, max_grna_len=21)
+        self.assertEqual(8, len(grnas))  # 4 per side, as 3x3 would be fewer than 10 constructs
+        self.assertEqual(["a0", "a1", "a2", "a3", "b0", "b1", "b2", "b3"], [x[0] for x in grnas])
+        self.assertEqual({19, 20, 21}, set(len(x[1]) for x in grnas))
+        self.assertEqual(8, len(set(x[1][-19:] for x in grnas)))
+        self.assertEqual(10, len(set(construct_names)))
+        self.assertEqual(sorted(construct_names), construct_names)
+        self.assertTrue(all(x.startswith("a") and "__b" in x for x in construct_names))
+
+    def test_make_synthetic_library_deterministic(self):
+        self.assertEqual(make_synthetic_library(50, seed=3), make_synthetic_library(50, seed=3))
+        self.assertNotEqual(make_synthetic_library(50, seed=3), make_synthetic_library(50, seed=4))
+
+    # endregion
+
+    # region write_synthetic_fastq_pair tests
+    def test_write_synthetic_fastq_pair_exact(self):
+        grnas, pairs = self._write_and_read_pairs(20, 100)
+        grna_seqs = set(x[1] for x in grnas)
+        self.assertEqual(100, len(pairs))
+        self.assertTrue(all(x[0] in grna_seqs and rev_comp_canonical_dna_seq(x[1]) in grna_seqs for x in pairs))
+
+    def test_write_synthetic_fastq_pair_deterministic(self):
+        kwargs = {"mismatch_rate": 0.05, "truncation_rate": 0.2, "seed": 7}
+        self.assertEqual(self._write_and_read_pairs(20, 50, **kwargs), self._write_and_read_pairs(20, 50, **kwargs))
+
+    def test_write_synthetic_fastq_pair_mismatches(self):
+        grnas, pairs = self._write_and_read_pairs(20, 200, mismatch_rate=0.1)
+        grna_seqs = set(x[1] for x in grnas)
+        num_inexact_fw = sum(1 for x in pairs if x[0] not in grna_seqs)
+        self.assertTrue(0 < num_inexact_fw < 200)
+        self.assertTrue(all(19 <= len(x[0]) <= 21 and 19 <= len(x[1]) <= 21 for x in pairs))
+
+    def test_write_synthetic_fastq_pair_truncation(self):
+        grnas, pairs = self._write_and_read_pairs(20, 200, truncation_rate=0.5, max_truncation_len=4)
+        grna_seqs = set(x[1] for x in grnas)
+        truncated_pairs = [x for x in pairs if x[0] not in grna_seqs]
+        self.assertTrue(0 < len(truncated_pairs) < 200)
+        for fw_seq, rv_seq in truncated_pairs:
+            self.assertTrue(any(fw_seq[-x:] == "GTTT"[:x] and fw_seq[:-x] in grna_seqs for x in range(1, 5)))
+            self.assertTrue(any(rv_seq[:x] == "AAAC"[-x:] and rev_comp_canonical_dna_seq(rv_seq[x:]) in grna_seqs
+                                for x in range(1, 5)))
+
+    # endregion
+
+    # region write_synthetic_untrimmed_fastq_pair tests
+    def test_write_synthetic_untrimmed_fastq_pair(self):
+        grnas, pairs = self._write_and_read_pairs(20, 100, write_synthetic_untrimmed_fastq_pair, read_len=60,
+                                                  min_5p_scaffold_len=8, max_5p_scaffold_len=12)
+        grna_seqs = set(x[1] for x in grnas)
+        self.assertEqual(100, len(pairs))
+        self.assertTrue(all(len(x[0]) == 60 and len(x[1]) == 60 for x in pairs))
+
+        # each read is the end of its 5' scaffold, then its gRNA, then the start of its 3' scaffold
+        def get_grna_lens(read_seq, scaffold_5p, scaffold_3p, is_rev_comp):
+            return [y for x in range(8, 13) for y in range(19, 22) if read_seq[:x] == scaffold_5p[-x:] and
+                    (rev_comp_canonical_dna_seq(read_seq[x:x + y]) if is_rev_comp else read_seq[x:x + y]) in
+                    grna_seqs and read_seq[x + y:] == scaffold_3p[:60 - x - y]]
+
+        self.assertTrue(all(len(get_grna_lens(x[0], FULL_5P_R1, FULL_3P_R1, False)) > 0 and
+                            len(get_grna_lens(x[1], FULL_5P_R2, FULL_3P_R2, True)) > 0 for x in pairs))
+
+    def test_write_synthetic_untrimmed_fastq_pair_deterministic(self):
+        kwargs = {"mismatch_rate": 0.05, "seed": 7}
+        self.assertEqual(self._write_and_read_pairs(20, 50, write_synthetic_untrimmed_fastq_pair, **kwargs),
+                         self._write_and_read_pairs(20, 50, write_synthetic_untrimmed_fastq_pair, **kwargs))
+
+    # endregion
@@ -0,0 +1,80 @@
+# standard libraries
+import json
+import os
+import tempfile
+import unittest
+
+# third-party libraries
+try:
+    import cutadapt
+except ImportError:
+    cutadapt = None
+
+# project-specific libraries
+from ccbbucsd.malicrispr.throughput_benchmark import BenchmarkSettings, compare_benchmark_results, run_benchmarks
+
+__author__ = "Amanda Birmingham"
+__maintainer__ = "Amanda Birmingham"
+__email__ = "abirmingham@ucsd.edu"
+__status__ = "development"
+
+
+class TestFunctions(unittest.TestCase):
+    settings = BenchmarkSettings(num_count_files_to_combine=2, num_repeats=1)
+    scales = {"tiny": (12, 300)}
+
+    # region run_benchmarks tests
+    def test_run_benchmarks(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output_fp = os.path.join(temp_dir, "results.json")
+            output = run_benchmarks(output_fp, self.scales, self.settings, work_dir=temp_dir)
+            with open(output_fp) as file_handle:
+                written_output = json.load(file_handle)
+            self.assertEqual(["results.json"], os.listdir(temp_dir))  # the synthetic data is cleaned up
+
+        self.assertEqual(json.loads(json.dumps(output)), written_output)
+        self.assertEqual(self.settings.to_dict(), output["settings"])
+        self.assertIn("git_commit", output["environment"])
+        # scaffold trimming is only timed if cutadapt is installed
+        expected_benchmarks = ["scaffold_trimmed_pair_generator"] if cutadapt is not None else []
+        expected_benchmarks.extend(["filter_pair_by_len", "GrnaPositionMatcher_init", "GrnaPositionMatcher_pairs",
+                                    "GrnaPositionMatcher_batch", "generate_construct_counts",
+                                    "generate_construct_counts_batch", "combine_count_files"])
+        self.assertEqual(expected_benchmarks, [x["benchmark"] for x in output["results"]])
+        for curr_result in output["results"]:
+            self.assertEqual("tiny", curr_result["scale"])
+            self.assertGreater(curr_result["items_per_sec"], 0)
+        results_by_benchmark = {x["benchmark"]: x for x in output["results"]}
+        for curr_benchmark in expected_benchmarks[:-6]:  # the trimming and filtering, which read every pair
+            self.assertEqual(300, results_by_benchmark[curr_benchmark]["num_items"])
+            self.assertGreater(results_by_benchmark[curr_benchmark]["mb_per_sec"], 0)
+        self.assertIsNone(results_by_benchmark["GrnaPositionMatcher_init"]["mb_per_sec"])
+        self.assertEqual(24, results_by_benchmark["combine_count_files"]["num_items"])
+
+    # endregion
+
+    # region compare_benchmark_results tests
+    def test_compare_benchmark_results(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            baseline_fp = os.path.join(temp_dir, "baseline.json")
+            current_fp = os.path.join(temp_dir, "current.json")
+            baseline = {"format_version": 1, "settings": {"seed": 0},
+                        "results": [{"benchmark": "x", "scale": "small", "items_per_sec": 100.0},
+                                    {"benchmark": "y", "scale": "small", "items_per_sec": 50.0}]}
+            current = {"format_version": 1, "settings": {"seed": 0},
+                       "results": [{"benchmark": "x", "scale": "small", "items_per_sec": 150.0},
+                                   {"benchmark": "z", "scale": "small", "items_per_sec": 10.0}]}
+            for curr_fp, curr_output in [(baseline_fp, baseline), (current_fp, current)]:
+                with open(curr_fp, 'w') as file_handle:
+                    json.dump(curr_output, file_handle)
+            output = compare_benchmark_results(baseline_fp, current_fp)
+
+            current["settings"]["seed"] = 1
+            with open(current_fp, 'w') as file_handle:
+                json.dump(current, file_handle)
+            with self.assertRaises(ValueError):
+                compare_benchmark_results(baseline_fp, current_fp)
+
+        self.assertEqual([("x", "small", 100.0, 150.0, 1.5)], output)
+
+    # endregion
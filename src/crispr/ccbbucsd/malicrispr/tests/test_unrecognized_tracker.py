@@ -0,0 +1,60 @@
+# standard libraries
+import unittest
+
+# project-specific libraries
+from ccbbucsd.malicrispr.unrecognized_tracker import HeavyHitterSketch, get_unrecognized_fp
+
+__author__ = "Amanda Birmingham"
+__maintainer__ = "Amanda Birmingham"
+__email__ = "abirmingham@ucsd.edu"
+__status__ = "development"
+
+
+class TestFunctions(unittest.TestCase):
+    # region get_unrecognized_fp tests
+    def test_get_unrecognized_fp(self):
+        self.assertEqual("/my/dir/sample_counts_unrecognized.txt",
+                         get_unrecognized_fp("/my/dir/sample_counts.txt"))
+
+    # endregion
+
+
+class TestHeavyHitterSketch(unittest.TestCase):
+    # region add tests
+    def test_add_exact_below_capacity(self):
+        sketch = HeavyHitterSketch(2)
+        sketch.add_all(["a", "b", "a", "c", "a", "b"])
+        self.assertEqual([("a", 3, 0), ("b", 2, 0)], sketch.get_top_items())
+        self.assertEqual(6, sketch.total_count)
+
+    def test_add_keeps_heavy_hitters_within_overcount(self):
+        sketch = HeavyHitterSketch(2)
+        items = ["a"] * 50 + ["b"] * 30 + ["x{0}".format(i) for i in range(40)] + ["a"] * 5
+        for curr_item in items:
+            sketch.add(curr_item)
+
+        self.assertLessEqual(len(sketch), 4)
+        top_items = sketch.get_top_items()
+        self.assertEqual(["a", "b"], [x[0] for x in top_items])
+        for curr_item, curr_count, curr_overcount in top_items:
+            true_count = items.count(curr_item)
+            self.assertLessEqual(true_count, curr_count)
+            self.assertLessEqual(curr_count - curr_overcount, true_count)
+
+    def test_init_rejects_nonpositive_size(self):
+        with self.assertRaises(ValueError):
+            HeavyHitterSketch(0)
+
+    # endregion
+
+    # region merge tests
+    def test_merge(self):
+        first_sketch = HeavyHitterSketch(3)
+        first_sketch.add_all(["a", "a", "b"])
+        second_sketch = HeavyHitterSketch(3)
+        second_sketch.add_all(["a", "c", "c", "c"])
+        first_sketch.merge(second_sketch)
+        self.assertEqual([("a", 3, 0), ("c", 3, 0), ("b", 1, 0)], first_sketch.get_top_items())
+        self.assertEqual(7, first_sketch.total_count)
+
+    # endregion
@@ -0,0 +1,220 @@
+"""This module times the scaffold trimming, length filtering, gRNA matching, counting and count combination steps on
+synthetic data."""
+
+# standard libraries
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import timeit
+
+# third-party libraries
+import numpy
+
+# ccbb libraries
+from ccbbucsd.utilities.basic_fastq import make_fastq_handler, paired_fastq_generator
+
+# project-specific libraries
+from ccbbucsd.malicrispr.construct_counter import generate_construct_counts
+from ccbbucsd.malicrispr.construct_file_extracter import trim_grnas
+from ccbbucsd.malicrispr.count_combination import combine_count_files
+from ccbbucsd.malicrispr.count_filterer import filter_pair_by_len, get_filtered_file_suffix
+from ccbbucsd.malicrispr.grna_position_matcher import GrnaPositionMatcher
+from ccbbucsd.malicrispr.synthetic_screen_data import FULL_3P_R1, FULL_3P_R2, FULL_5P_R1, FULL_5P_R2, \
+    make_synthetic_library, write_synthetic_fastq_pair, write_synthetic_untrimmed_fastq_pair
+try:
+    from ccbbucsd.malicrispr.scaffold_trim import scaffold_trimmed_pair_generator
+except ImportError:  # scaffold trimming needs cutadapt
+    scaffold_trimmed_pair_generator = None
+
+__author__ = "Amanda Birmingham"
+__maintainer__ = "Amanda Birmingham"
+__email__ = "abirmingham@ucsd.edu"
+__status__ = "development"
+
+_FORMAT_VERSION = 1
+
+# name: (number of constructs, number of read pairs)
+DEFAULT_SCALES = {"small": (1000, 20000), "medium": (10000, 100000), "large": (60000, 500000)}
+
+
+class BenchmarkSettings:
+    """The synthetic data and counting settings shared by all scales of a benchmark run.
+
+    Results are only comparable between runs with the same settings (and seed), so they are stored with the results.
+    """
+
+    def __init__(self, min_grna_len=19, max_grna_len=21, retain_len=19, mismatch_rate=0.01, truncation_rate=0.05,
+                 num_allowed_mismatches=1, num_count_files_to_combine=24, num_repeats=3, seed=0):
+        self.min_grna_len = min_grna_len
+        self.max_grna_len = max_grna_len
+        self.retain_len = retain_len
+        self.mismatch_rate = mismatch_rate
+        self.truncation_rate = truncation_rate
+        self.num_allowed_mismatches = num_allowed_mismatches
+        self.num_count_files_to_combine = num_count_files_to_combine
+        self.num_repeats = num_repeats
+        self.seed = seed
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+def run_benchmarks(output_fp, scales=None, settings=None, work_dir=None):
+    """Time each step at each scale and write the results, with the settings and environment, as json to output_fp.
+
+    scales is a dictionary of (number of constructs, number of read pairs) by scale name (by default,
+    DEFAULT_SCALES).  Each timing is the best of settings.num_repeats runs.  Each result gives its throughput in
+    items (read pairs, except for count combination, where it is construct counts) per second and, where the step
+    reads input files, in MB of input per second.  Scaffold trimming is only timed if cutadapt is installed.
+    Returns the results document.
+    """
+    scales = DEFAULT_SCALES if scales is None else scales
+    settings = BenchmarkSettings() if settings is None else settings
+    results = []
+    for scale_name, (num_constructs, num_pairs) in scales.items():
+        scale_dir = tempfile.mkdtemp(dir=work_dir)
+        try:
+            results.extend(_run_scale_benchmarks(scale_dir, scale_name, num_constructs, num_pairs, settings))
+        finally:
+            shutil.rmtree(scale_dir)
+
+    output = {"format_version": _FORMAT_VERSION, "environment": _get_environment(), "settings": settings.to_dict(),
+              "results": results}
+    with open(output_fp, 'w') as file_handle:
+        json.dump(output, file_handle, indent=1, sort_keys=True)
+    return output
+
+
+def compare_benchmark_results(baseline_fp, current_fp):
+    """Return (benchmark, scale, baseline items/sec, current items/sec, current/baseline) for results in both files.
+
+    Raises a ValueError if the two runs used different settings, as their results then can't be compared.
+    """
+    with open(baseline_fp) as file_handle:
+        baseline = json.load(file_handle)
+    with open(current_fp) as file_handle:
+        current = json.load(file_handle)
+    if baseline["settings"] != current["settings"] or baseline["format_version"] != current["format_version"]:
+        raise ValueError("Benchmark results in {0} and {1} were made with different settings".format(baseline_fp,
+                                                                                                   current_fp))
+
+    baseline_rates = {(x["benchmark"], x["scale"]): x["items_per_sec"] for x in baseline["results"]}
+    result = []
+    for curr_result in current["results"]:
+        curr_key = (curr_result["benchmark"], curr_result["scale"])
+        if curr_key in baseline_rates:
+            baseline_rate = baseline_rates[curr_key]
+            result.append(curr_key + (baseline_rate, curr_result["items_per_sec"],
+                                      curr_result["items_per_sec"] / baseline_rate))
+    return result
+
+
+def _run_scale_benchmarks(scale_dir, scale_name, num_constructs, num_pairs, settings):
+    full_grnas, construct_names = make_synthetic_library(num_constructs, settings.min_grna_len, settings.max_grna_len,
+                                                         settings.seed)
+    fw_fp, rv_fp = write_synthetic_fastq_pair(scale_dir, "synthetic", full_grnas, construct_names, num_pairs,
+                                              settings.mismatch_rate, settings.truncation_rate, seed=settings.seed)
+    grna_names_and_seqs = trim_grnas(full_grnas, settings.retain_len)
+    results = []
+
+    def add_result(benchmark_name, elapsed_seconds, num_items, input_fps=None):
+        num_bytes = None if input_fps is None else sum(os.path.getsize(x) for x in input_fps)
+        results.append({"benchmark": benchmark_name, "scale": scale_name, "num_constructs": num_constructs,
+                        "num_pairs": num_pairs, "seconds": elapsed_seconds, "num_items": num_items,
+                        "items_per_sec": num_items / elapsed_seconds,
+                        "num_bytes": num_bytes,
+                        "mb_per_sec": None if num_bytes is None else num_bytes / 1e6 / elapsed_seconds})
+
+    if scaffold_trimmed_pair_generator is not None:
+        untrimmed_dir = os.path.join(scale_dir, "untrimmed")
+        os.mkdir(untrimmed_dir)
+        untrimmed_fps = write_synthetic_untrimmed_fastq_pair(untrimmed_dir, "synthetic", full_grnas, construct_names,
+                                                             num_pairs, mismatch_rate=settings.mismatch_rate,
+                                                             seed=settings.seed)
+        add_result("scaffold_trimmed_pair_generator", _time_best(settings.num_repeats, _trim_pairs, *untrimmed_fps),
+                   num_pairs, untrimmed_fps)
+
+    filtered_dir = os.path.join(scale_dir, "filtered")
+    os.mkdir(filtered_dir)
+    add_result("filter_pair_by_len", _time_best(settings.num_repeats, filter_pair_by_len, settings.min_grna_len,
+                                                settings.max_grna_len, settings.retain_len, filtered_dir, fw_fp,
+                                                rv_fp),
+               num_pairs, [fw_fp, rv_fp])
+    filtered_fps = [os.path.join(filtered_dir, os.path.basename(x).replace(".fastq", get_filtered_file_suffix()))
+                    for x in [fw_fp, rv_fp]]
+    filtered_seqs = list(paired_fastq_generator(make_fastq_handler(filtered_fps[0]),
+                                                make_fastq_handler(filtered_fps[1])))
+    num_filtered_pairs = len(filtered_seqs)
+
+    add_result("GrnaPositionMatcher_init", _time_best(
+        settings.num_repeats, GrnaPositionMatcher, grna_names_and_seqs, settings.retain_len,
+        settings.num_allowed_mismatches, settings.num_allowed_mismatches), len(grna_names_and_seqs))
+    grna_matcher = GrnaPositionMatcher(grna_names_and_seqs, settings.retain_len, settings.num_allowed_mismatches,
+                                       settings.num_allowed_mismatches)
+    add_result("GrnaPositionMatcher_pairs", _time_best(settings.num_repeats, _match_pairs, grna_matcher,
+                                                       filtered_seqs), num_filtered_pairs)
+    fw_seqs = [x[0] for x in filtered_seqs]
+    rv_seqs = [x[1] for x in filtered_seqs]
+    add_result("GrnaPositionMatcher_batch", _time_best(settings.num_repeats,
+                                                       grna_matcher.find_fw_and_rv_read_matches_batch, fw_seqs,
+                                                       rv_seqs), num_filtered_pairs)
+
+    counts_fp = os.path.join(scale_dir, "synthetic_counts.txt")
+    for use_batch_matching in [False, True]:
+        benchmark_name = "generate_construct_counts" + ("_batch" if use_batch_matching else "")
+        add_result(benchmark_name, _time_best(settings.num_repeats, generate_construct_counts, grna_matcher,
+                                              construct_names, counts_fp, filtered_fps[0], filtered_fps[1],
+                                              use_block_reader=True, use_batch_matching=use_batch_matching),
+                   num_filtered_pairs, filtered_fps)
+
+    lane_counts_fps = []
+    for lane_index in range(0, settings.num_count_files_to_combine):
+        lane_counts_fp = os.path.join(scale_dir, "synthetic_L{0:03d}_001_counts.txt".format(lane_index + 1))
+        shutil.copyfile(counts_fp, lane_counts_fp)
+        lane_counts_fps.append(lane_counts_fp)
+    add_result("combine_count_files", _time_best(settings.num_repeats, combine_count_files, lane_counts_fps, ""),
+               num_constructs * len(lane_counts_fps), lane_counts_fps)
+    return results
+
+
+def _trim_pairs(fw_fastq_fp, rv_fastq_fp):
+    for _ in scaffold_trimmed_pair_generator(FULL_5P_R1, FULL_3P_R1, FULL_5P_R2, FULL_3P_R2, fw_fastq_fp,
+                                             rv_fastq_fp):
+        pass
+
+
+def _match_pairs(grna_matcher, paired_seqs):
+    for fw_seq, rv_seq in paired_seqs:
+        grna_matcher.find_fw_and_rv_read_match_ids(fw_seq, rv_seq)
+
+
+def _time_best(num_repeats, func, *func_args, **func_kwargs):
+    result = None
+    for _ in range(0, num_repeats):
+        start_time = timeit.default_timer()
+        func(*func_args, **func_kwargs)
+        elapsed_seconds = timeit.default_timer() - start_time
+        result = elapsed_seconds if result is None else min(result, elapsed_seconds)
+    return result
+
+
+def _get_environment():
+    # the commit lets results be lined up against the code that produced them
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                         stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"git_commit": commit, "python": platform.python_version(), "numpy": numpy.__version__,
+            "platform": platform.platform(), "cpu_count": os.cpu_count(),
+            "timestamp": datetime.datetime.now().isoformat()}
+
+
+if __name__ == '__main__':
+    # e.g. python -m ccbbucsd.malicrispr.throughput_benchmark results.json small medium
+    run_benchmarks(sys.argv[1], {x: DEFAULT_SCALES[x] for x in sys.argv[2:]} if len(sys.argv) > 2 else None)
@@ -0,0 +1,126 @@
+"""This module keeps bounded-memory tallies of the most common unrecognized read pairs and constructs."""
+
+# standard libraries
+import collections
+import csv
+
+# ccbb libraries
+from ccbbucsd.utilities.files_and_paths import get_file_name_pieces, make_file_path
+
+__author__ = "Amanda Birmingham"
+__maintainer__ = "Amanda Birmingham"
+__email__ = "abirmingham@ucsd.edu"
+__status__ = "development"
+
+
+def get_unrecognized_file_suffix():
+    return "_unrecognized.txt"
+
+
+def get_unrecognized_fp(counts_fp):
+    counts_dir, counts_base, _ = get_file_name_pieces(counts_fp)
+    return make_file_path(counts_dir, counts_base, get_unrecognized_file_suffix())
+
+
+class HeavyHitterSketch:
+    """Space-saving style top-k tally that never holds more than 2 * max_num_items items.
+
+    Whenever the tally grows past 2 * max_num_items, it is cut back to the max_num_items items with the highest
+    counts.  An item added after that starts from the highest count that was dropped, so every reported count is at
+    least the item's true count and at most its max_overcount above it; any item whose true count exceeds the highest
+    dropped count is guaranteed to still be in the tally.
+    """
+
+    def __init__(self, max_num_items):
+        if max_num_items < 1:
+            raise ValueError("max_num_items must be at least 1 but is {0}".format(max_num_items))
+        self._max_num_items = max_num_items
+        self._counts = {}
+        self._overcounts = {}
+        self._dropped_count_floor = 0
+        self.total_count = 0
+
+    def __len__(self):
+        return len(self._counts)
+
+    def add(self, item, count=1):
+        self.total_count += count
+        curr_count = self._counts.get(item)
+        if curr_count is not None:
+            self._counts[item] = curr_count + count
+        else:
+            self._counts[item] = self._dropped_count_floor + count
+            self._overcounts[item] = self._dropped_count_floor
+            if len(self._counts) > 2 * self._max_num_items:
+                self._prune()
+
+    def add_all(self, items):
+        # tallying the batch first means each distinct item is looked up only once
+        for curr_item, curr_count in collections.Counter(items).items():
+            self.add(curr_item, curr_count)
+
+    def merge(self, other_sketch):
+        for curr_item, curr_count in other_sketch._counts.items():
+            curr_overcount = other_sketch._overcounts[curr_item]
+            if curr_item in self._counts:
+                self._counts[curr_item] += curr_count
+                self._overcounts[curr_item] += curr_overcount
+            else:
+                # the item may have been dropped from this sketch, so it could have had up to the floor here
+                self._counts[curr_item] = self._dropped_count_floor + curr_count
+                self._overcounts[curr_item] = self._dropped_count_floor + curr_overcount
+        for curr_item in self._counts:
+            if curr_item not in other_sketch._counts:
+                self._counts[curr_item] += other_sketch._dropped_count_floor
+                self._overcounts[curr_item] += other_sketch._dropped_count_floor
+        self._dropped_count_floor += other_sketch._dropped_count_floor
+        self.total_count += other_sketch.total_count
+        if len(self._counts) > 2 * self._max_num_items:
+            self._prune()
+
+    def get_top_items(self):
+        """Return up to max_num_items (item, approximate count, max overcount) tuples, highest count first."""
+        sorted_items = sorted(self._counts.items(), key=lambda x: (-x[1], x[0]))[:self._max_num_items]
+        return [(x[0], x[1], self._overcounts[x[0]]) for x in sorted_items]
+
+    def _prune(self):
+        sorted_items = sorted(self._counts.items(), key=lambda x: x[1], reverse=True)
+        self._dropped_count_floor = max(self._dropped_count_floor, sorted_items[self._max_num_items][1])
+        self._counts = dict(sorted_items[:self._max_num_items])
+        self._overcounts = {x: self._overcounts[x] for x in self._counts}
+
+
+class UnrecognizedTracker:
+    """Tallies the most common unrecognized read pairs and unrecognized (gRNA A id, gRNA B id) constructs."""
+
+    def __init__(self, max_num_items):
+        self._sequence_sketch = HeavyHitterSketch(max_num_items)
+        self._construct_sketch = HeavyHitterSketch(max_num_items)
+
+    def add_sequence_pair(self, fw_seq, rv_seq):
+        self._sequence_sketch.add((fw_seq, rv_seq))
+
+    def add_sequence_pairs(self, fw_seqs, rv_seqs):
+        self._sequence_sketch.add_all(zip(fw_seqs, rv_seqs))
+
+    def add_construct(self, grna_id_A, grna_id_B):
+        self._construct_sketch.add((grna_id_A, grna_id_B))
+
+    def add_constructs(self, grna_ids_A, grna_ids_B):
+        self._construct_sketch.add_all(zip(grna_ids_A, grna_ids_B))
+
+    def merge(self, other_tracker):
+        self._sequence_sketch.merge(other_tracker._sequence_sketch)
+        self._construct_sketch.merge(other_tracker._construct_sketch)
+
+    def write(self, output_fp, construct_index):
+        with open(output_fp, 'w') as file_handle:
+            writer = csv.writer(file_handle, delimiter="\t")
+            writer.writerow(["# num_pairs_unrecognized:{0},num_constructs_unrecognized:{1}".format(
+                self._sequence_sketch.total_count, self._construct_sketch.total_count)])
+            writer.writerow(["type", "unrecognized", "approx_count", "max_overcount"])
+            for (fw_seq, rv_seq), curr_count, curr_overcount in self._sequence_sketch.get_top_items():
+                writer.writerow(["sequence", "{0},{1}".format(fw_seq, rv_seq), curr_count, curr_overcount])
+            for (grna_id_A, grna_id_B), curr_count, curr_overcount in self._construct_sketch.get_top_items():
+                writer.writerow(["construct", construct_index.get_construct_name(grna_id_A, grna_id_B), curr_count,
+                                 curr_overcount])
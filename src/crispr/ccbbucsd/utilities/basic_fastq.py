@@ -1,5 +1,12 @@
 # standard libraries
 import io
+import os
+
+# third-party libraries
+import numpy
+
+# ccbb libraries
+from ccbbucsd.utilities.compressed_input import is_gzipped, open_binary_input, open_text_input
 
 __author__ = "Amanda Birmingham"
 __maintainer__ = "Amanda Birmingham"
@@ -40,13 +47,35 @@ class BasicFastq:
         self.lines = []
 
 
+class FastqRecord:
+    """A single fastq record as produced by BlockFastqHandler.
+
+    Stores the four record lines without their line endings; exposes the same sequence/quality/lines/to_string
+    interface as BasicFastq so that either can be written out or trimmed by the same code.
+    """
+    __slots__ = ("name", "sequence", "separator", "quality")
+
+    def __init__(self, name, sequence, separator, quality):
+        self.name = name
+        self.sequence = sequence
+        self.separator = separator
+        self.quality = quality
+
+    @property
+    def lines(self):
+        return [self.name + "\n", self.sequence + "\n", self.separator + "\n", self.quality + "\n"]
+
+    def to_string(self):
+        return "".join(self.lines)
+
+
 class FastqHandler:
     file_suffix = "fastq"
 
     def __init__(self, file_path, input_is_fastq_string=False):
         if not input_is_fastq_string:
             self.filepath = file_path
-            self.generator = open(self.filepath, 'r')
+            self.generator = open_text_input(self.filepath)
         else:
             self.filepath = None
             self.generator = io.StringIO(file_path)
@@ -65,7 +94,260 @@ class FastqHandler:
         self.generator.close()
 
 
+class BlockFastqHandler:
+    """Read fastq records from large binary blocks rather than one text line at a time.
+
+    Each call to get_next_batch returns all of the whole 4-line records contained in the next block read from the
+    input; any partial record at the end of a block is carried over to the next call.
+
+    If a (start, end) byte_range is given, only the records in that part of the (uncompressed) input are read; the
+    range must begin and end on record boundaries, such as those from get_paired_shard_byte_ranges.
+    """
+    file_suffix = "fastq"
+    default_block_size = 4 * 1024 * 1024
+    num_lines_per_record = 4
+
+    def __init__(self, file_path, input_is_fastq_string=False, block_size=None, byte_range=None):
+        if not input_is_fastq_string:
+            self.filepath = file_path
+            self.generator = open_binary_input(self.filepath)
+        else:
+            self.filepath = None
+            self.generator = io.BytesIO(file_path.encode())
+
+        self.block_size = block_size if block_size is not None else self.default_block_size
+        self.is_done = True
+        self._remainder = b""
+        self._is_exhausted = False
+        self._num_bytes_left = None
+        if byte_range is not None:
+            start, end = byte_range
+            self.generator.seek(start)
+            self._num_bytes_left = end - start
+
+    def get_next_batch(self, get_full_record=True):
+        """Return the next list of records (or, if get_full_record is False, of upper-cased sequences).
+
+        An empty list is returned once the input is exhausted.
+        """
+        record_lines = self._get_next_record_lines()
+        if get_full_record:
+            result = list(map(FastqRecord, record_lines[0::4], record_lines[1::4], record_lines[2::4],
+                              record_lines[3::4]))
+        else:
+            result = [x.upper() for x in record_lines[1::4]]
+        return result
+
+    def get_next_sequence_and_quality_batch(self):
+        """Return the sequences and qualities of the next batch of records as two parallel lists."""
+        record_lines = self._get_next_record_lines()
+        return record_lines[1::4], record_lines[3::4]
+
+    def close(self):
+        self.generator.close()
+
+    def _get_next_record_lines(self):
+        while not self._is_exhausted:
+            new_block = self._read_block()
+            if not new_block:
+                self._is_exhausted = True
+                break
+
+            data = self._remainder + new_block
+            end_index = self._find_end_of_last_whole_record(data)
+            if end_index > 0:
+                self._remainder = data[end_index:]
+                return self._split_into_lines(data[:end_index])
+            self._remainder = data
+
+        # input exhausted: whatever is left over is either nothing, a final record lacking its last newline, or junk
+        data = self._remainder
+        self._remainder = b""
+        if not data.strip():
+            return []
+
+        if not data.endswith(b"\n"):
+            data += b"\n"
+        num_lines = data.count(b"\n")
+        num_whole_lines = num_lines - (num_lines % self.num_lines_per_record)
+        if num_whole_lines != num_lines:
+            self.is_done = False
+        if num_whole_lines == 0:
+            return []
+        return self._split_into_lines(data[:self._find_nth_newline_end(data, num_whole_lines)])
+
+    def _read_block(self):
+        if self._num_bytes_left is None:
+            return self.generator.read(self.block_size)
+
+        result = self.generator.read(min(self.block_size, self._num_bytes_left))
+        self._num_bytes_left -= len(result)
+        return result
+
+    def _find_end_of_last_whole_record(self, data):
+        num_lines = data.count(b"\n")
+        num_whole_lines = num_lines - (num_lines % self.num_lines_per_record)
+        if num_whole_lines == 0:
+            return 0
+        return self._find_nth_newline_end(data, num_whole_lines, num_lines)
+
+    @staticmethod
+    def _find_nth_newline_end(data, n, num_lines=None):
+        # walk backwards from the end, since the n-th newline is always within 3 newlines of the last one
+        num_lines = data.count(b"\n") if num_lines is None else num_lines
+        end_index = len(data)
+        for _ in range(0, num_lines - n + 1):
+            end_index = data.rfind(b"\n", 0, end_index)
+        return end_index + 1
+
+    @staticmethod
+    def _split_into_lines(whole_records_bytes):
+        text = whole_records_bytes.decode()
+        if "\r" in text:
+            text = text.replace("\r\n", "\n")
+        lines = text.split("\n")
+        lines.pop()  # data always ends in a newline, so the last "line" is an empty string
+        return lines
+
+
+def make_fastq_handler(file_path, use_block_reader=False, byte_range=None):
+    if byte_range is not None:
+        return BlockFastqHandler(file_path, byte_range=byte_range)  # only the block reader can read part of a file
+    return BlockFastqHandler(file_path) if use_block_reader else FastqHandler(file_path)
+
+
+def build_record_offset_index(file_path, num_records_per_entry, block_size=None, start_offset=0):
+    """Return the byte offsets of records 0, n, 2n, ... in an uncompressed fastq, plus its total number of records.
+
+    Only newlines are counted, so this reads the file at close to disk speed.  If a record-aligned start_offset is
+    given, only the part of the file from there on is read, and records are numbered (and counted) from there.
+    """
+    block_size = block_size if block_size is not None else BlockFastqHandler.default_block_size
+    num_lines_per_entry = num_records_per_entry * BlockFastqHandler.num_lines_per_record
+    offsets = [start_offset]
+    num_lines_seen = 0
+    num_bytes_seen = start_offset
+    last_byte = b"\n"
+    next_entry_line_num = num_lines_per_entry  # the next entry's record starts just after this many newlines
+
+    with open(file_path, 'rb') as file_handle:
+        file_handle.seek(start_offset)
+        block = file_handle.read(block_size)
+        while block:
+            newline_positions = numpy.flatnonzero(numpy.frombuffer(block, dtype=numpy.uint8) == ord("\n"))
+            num_block_lines = len(newline_positions)
+            while next_entry_line_num <= num_lines_seen + num_block_lines:
+                newline_position = int(newline_positions[next_entry_line_num - num_lines_seen - 1])
+                offsets.append(num_bytes_seen + newline_position + 1)
+                next_entry_line_num += num_lines_per_entry
+            num_lines_seen += num_block_lines
+            num_bytes_seen += len(block)
+            last_byte = block[-1:]
+            block = file_handle.read(block_size)
+
+    if last_byte != b"\n":
+        num_lines_seen += 1  # final record is missing only its last newline
+    if len(offsets) > 1 and offsets[-1] >= num_bytes_seen:
+        offsets.pop()  # an entry at the very end of the file doesn't start any records
+    return offsets, num_lines_seen // BlockFastqHandler.num_lines_per_record
+
+
+def get_paired_shard_byte_ranges(fw_fastq_fp, rv_fastq_fp, num_shards, num_records_per_entry=65536):
+    """Split a forward/reverse fastq pair into up to num_shards pairs of byte ranges holding the same records.
+
+    Returns a list of (fw byte range, rv byte range) tuples in file order.  Compressed files can't be entered part-way
+    through, so they are always returned as a single (None, None) shard meaning "the whole file".
+    """
+    if num_shards <= 1 or is_gzipped(fw_fastq_fp) or is_gzipped(rv_fastq_fp):
+        return [(None, None)]
+
+    fw_offsets, fw_num_records = build_record_offset_index(fw_fastq_fp, num_records_per_entry)
+    rv_offsets, rv_num_records = build_record_offset_index(rv_fastq_fp, num_records_per_entry)
+    if fw_num_records != rv_num_records:
+        raise ValueError("{0} has {1} records but {2} has {3}".format(fw_fastq_fp, fw_num_records, rv_fastq_fp,
+                                                                      rv_num_records))
+
+    # both files have entries at the same record numbers, so boundaries chosen from the entries line up
+    num_entries = len(fw_offsets)
+    num_shards = min(num_shards, num_entries)
+    boundary_entries = sorted(set(round(x * num_entries / num_shards) for x in range(0, num_shards)))
+    fw_ends = [fw_offsets[x] for x in boundary_entries[1:]] + [os.path.getsize(fw_fastq_fp)]
+    rv_ends = [rv_offsets[x] for x in boundary_entries[1:]] + [os.path.getsize(rv_fastq_fp)]
+
+    result = []
+    for shard_index, start_entry in enumerate(boundary_entries):
+        result.append(((fw_offsets[start_entry], fw_ends[shard_index]),
+                       (rv_offsets[start_entry], rv_ends[shard_index])))
+    return result
+
+
+def get_paired_chunk_byte_ranges(fw_fastq_fp, rv_fastq_fp, num_records_per_chunk, start_offsets=(0, 0)):
+    """Split an uncompressed forward/reverse fastq pair, from the record-aligned start offsets on, into chunks.
+
+    Returns a list of (fw byte range, rv byte range) tuples in file order; each chunk holds num_records_per_chunk
+    records (the last usually holds fewer).  Only the files from the start offsets on are read, so a resumed run
+    doesn't re-index the part of the files it has already counted.
+    """
+    fw_offsets, fw_num_records = build_record_offset_index(fw_fastq_fp, num_records_per_chunk,
+                                                           start_offset=start_offsets[0])
+    rv_offsets, rv_num_records = build_record_offset_index(rv_fastq_fp, num_records_per_chunk,
+                                                           start_offset=start_offsets[1])
+    if fw_num_records != rv_num_records:
+        raise ValueError("{0} has {1} records but {2} has {3} from byte offsets {4}".format(
+            fw_fastq_fp, fw_num_records, rv_fastq_fp, rv_num_records, tuple(start_offsets)))
+
+    boundaries = list(zip(fw_offsets, rv_offsets))
+    boundaries.append((os.path.getsize(fw_fastq_fp), os.path.getsize(rv_fastq_fp)))
+
+    result = []
+    for chunk_start, chunk_end in zip(boundaries[:-1], boundaries[1:]):
+        if chunk_end[0] > chunk_start[0]:
+            result.append(((chunk_start[0], chunk_end[0]), (chunk_start[1], chunk_end[1])))
+    return result
+
+
+def paired_fastq_batch_generator(fw_fastq_handler, rv_fastq_handler, get_full_record=False):
+    """Yield synchronized (forward batch, reverse batch) list pairs from two BlockFastqHandlers."""
+    fastq_handlers = [fw_fastq_handler, rv_fastq_handler]
+    pending_batches = [[], []]
+    is_exhausted = [False, False]
+
+    while True:
+        for handler_index, curr_handler in enumerate(fastq_handlers):
+            if not pending_batches[handler_index] and not is_exhausted[handler_index]:
+                pending_batches[handler_index] = curr_handler.get_next_batch(get_full_record)
+                is_exhausted[handler_index] = len(pending_batches[handler_index]) == 0
+
+        num_in_sync = min(len(pending_batches[0]), len(pending_batches[1]))
+        if num_in_sync == 0:
+            break
+
+        if num_in_sync == len(pending_batches[0]) and num_in_sync == len(pending_batches[1]):
+            result = (pending_batches[0], pending_batches[1])
+            pending_batches = [[], []]
+        else:
+            result = (pending_batches[0][:num_in_sync], pending_batches[1][:num_in_sync])
+            pending_batches = [pending_batches[0][num_in_sync:], pending_batches[1][num_in_sync:]]
+        yield result
+
+    for curr_handler in fastq_handlers:
+        if not curr_handler.is_done:
+            print(("Error: {0} generator terminated"
+                   "with unfinished record").format(curr_handler.filepath))
+
+    if pending_batches[0] or pending_batches[1]:
+        print("Error--fastq records aren't in sync")
+
+    for curr_handler in fastq_handlers:
+        curr_handler.close()
+
+
 def paired_fastq_generator(fw_fastq_handler, rv_fastq_handler, get_full_record=False):
+    if hasattr(fw_fastq_handler, "get_next_batch") and hasattr(rv_fastq_handler, "get_next_batch"):
+        for fw_batch, rv_batch in paired_fastq_batch_generator(fw_fastq_handler, rv_fastq_handler, get_full_record):
+            yield from zip(fw_batch, rv_batch)
+        return
+
     fastq_handlers = [fw_fastq_handler, rv_fastq_handler]
 
     while True:
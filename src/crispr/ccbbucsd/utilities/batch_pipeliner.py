@@ -0,0 +1,203 @@
+"""This module runs the notebook pipelines of many datasets at once, sharing one budget of processors among them."""
+
+# standard libraries
+import collections
+import contextlib
+import csv
+import datetime
+import logging
+import threading
+import timeit
+import traceback
+
+# ccbb libraries
+from ccbbucsd.utilities.analysis_run_prefixes import get_run_prefix, get_timestamp
+from ccbbucsd.utilities.notebook_pipeliner import ALG_NAME_KEY, DATASET_NAME_KEY, execute_run
+from ccbbucsd.utilities.notebook_runner import BackgroundHtmlExporter
+
+__author__ = "Amanda Birmingham"
+__maintainer__ = "Amanda Birmingham"
+__email__ = "abirmingham@ucsd.edu"
+__status__ = "development"
+
+STEP_EXECUTED = "executed"
+STEP_SKIPPED = "skipped"
+STEP_FAILED = "failed"
+STEP_NOT_RUN = "not run"
+
+DatasetRun = collections.namedtuple("DatasetRun", ["dataset_name", "possible_actions_dict", "run_params",
+                                                   "run_folder"])
+
+
+def read_dataset_manifest(manifest_fp):
+    """Return a list of dictionaries, one per dataset, from a tab-delimited manifest with a header line.
+
+    Blank lines and lines starting with # are ignored; empty values are returned as None.
+    """
+    with open(manifest_fp) as file_handle:
+        lines = [x for x in file_handle if x.strip() and not x.startswith("#")]
+    reader = csv.DictReader(lines, delimiter="\t")
+    return [{x.strip(): (y.strip() if y and y.strip() else None) for x, y in curr_row.items()} for curr_row in reader]
+
+
+def execute_batch(dataset_runs, ordered_run_steps, parent_dir, num_processors, num_processors_by_step,
+                  num_processors_key, report_fp=None, **execute_run_kwargs):
+    """Run ordered_run_steps for each of the DatasetRuns at the same time, without using more than num_processors.
+
+    Each dataset's steps run in order, each as a notebook_pipeliner.execute_run of a single step in the dataset's
+    run_folder, so steps already done there are skipped as usual.  A step may start only once the number of
+    processors num_processors_by_step gives it (one, for steps not listed) is free, and its notebook is told that
+    number through the num_processors_key parameter.  Waiting steps start in the order they asked, except that a
+    later step that fits in the free processors (e.g., a light plotting step) may start ahead of an earlier one that
+    doesn't (e.g., a heavy counting step waiting for another to finish), as long as the steps started that way never
+    hold processors the earlier one needs; heavy steps therefore aren't starved by a stream of light ones.  A failed
+    step stops its dataset's pipeline but not the others.  Datasets without a run_folder get a new one named, as
+    execute_run would name it, for the batch's start time, which is also the timestamp their steps are run with.
+
+    If export_html_in_background is set, one notebook_runner.BackgroundHtmlExporter is shared by every step of every
+    dataset, and the batch waits for its exports only at the end, rather than each step waiting for its own export
+    while holding its processors.
+
+    Returns a list of report rows (dataset, step, status, number of processors, start time, elapsed seconds,
+    message), which are also written, tab-delimited, to report_fp if it is given.
+    """
+    processor_budget = _ProcessorBudget(num_processors)
+    timestamp = get_timestamp()
+    execute_run_kwargs = dict(execute_run_kwargs)
+    # so that the {timestamp} of a run's parameters is the one its run folder is named for
+    execute_run_kwargs["timestamp"] = timestamp
+    html_exporter = None
+    if execute_run_kwargs.pop("export_html_in_background", False):
+        html_exporter = execute_run_kwargs["html_exporter"] = BackgroundHtmlExporter()
+
+    report_rows_by_dataset = {}
+    threads = []
+    for curr_dataset_run in dataset_runs:
+        if curr_dataset_run.run_folder is None:
+            # every step must run in the same folder, so it can't be left to execute_run to name it
+            curr_dataset_run = curr_dataset_run._replace(run_folder=get_run_prefix(
+                curr_dataset_run.run_params[DATASET_NAME_KEY], curr_dataset_run.run_params[ALG_NAME_KEY], timestamp))
+        curr_report_rows = report_rows_by_dataset[curr_dataset_run.dataset_name] = []
+        threads.append(threading.Thread(target=_execute_dataset_steps, name=curr_dataset_run.dataset_name,
+                                        args=(curr_dataset_run, ordered_run_steps, parent_dir, processor_budget,
+                                              num_processors_by_step, num_processors_key, execute_run_kwargs,
+                                              curr_report_rows)))
+    for curr_thread in threads:
+        curr_thread.start()
+    for curr_thread in threads:
+        curr_thread.join()
+
+    result = [x for curr_dataset_run in dataset_runs for x in report_rows_by_dataset[curr_dataset_run.dataset_name]]
+    try:
+        if html_exporter is not None:
+            html_exporter.wait()
+    finally:
+        if report_fp is not None:
+            _write_report(report_fp, result)
+    return result
+
+
+def _execute_dataset_steps(dataset_run, ordered_run_steps, parent_dir, processor_budget, num_processors_by_step,
+                           num_processors_key, execute_run_kwargs, report_rows):
+    failed = False
+    for run_action in ordered_run_steps:
+        step_num_processors = min(num_processors_by_step.get(run_action, 1), processor_budget.num_processors)
+        if failed:
+            report_rows.append([dataset_run.dataset_name, str(run_action), STEP_NOT_RUN, step_num_processors, "", "",
+                                ""])
+            continue
+
+        step_params = dict(dataset_run.run_params)
+        step_params[num_processors_key] = step_num_processors
+        with processor_budget.reserve(step_num_processors):
+            start_datetime = datetime.datetime.now()
+            start_time = timeit.default_timer()
+            logging.info("Starting {0} {1} on {2} processors at {3}".format(
+                dataset_run.dataset_name, run_action, step_num_processors, start_datetime))
+            try:
+                step_results = execute_run(dataset_run.possible_actions_dict, step_params, [run_action], parent_dir,
+                                           run_folder=dataset_run.run_folder, **execute_run_kwargs)
+                status = STEP_EXECUTED if step_results[0][1] else STEP_SKIPPED
+                message = ""
+            except Exception:
+                status = STEP_FAILED
+                message = traceback.format_exc().strip().splitlines()[-1]
+                logging.error("{0} {1} failed:\n{2}".format(dataset_run.dataset_name, run_action,
+                                                            traceback.format_exc()))
+                failed = True
+            elapsed_seconds = timeit.default_timer() - start_time
+
+        report_rows.append([dataset_run.dataset_name, str(run_action), status, step_num_processors,
+                            start_datetime.isoformat(), "{0:.1f}".format(elapsed_seconds), message])
+
+
+def _write_report(report_fp, report_rows):
+    with open(report_fp, 'w') as file_handle:
+        writer = csv.writer(file_handle, delimiter="\t")
+        num_failed = sum(1 for x in report_rows if x[2] == STEP_FAILED)
+        writer.writerow(["# num_steps:{0},num_failed:{1}".format(len(report_rows), num_failed)])
+        writer.writerow(["dataset", "step", "status", "num_processors", "start_time", "elapsed_seconds", "message"])
+        writer.writerows(report_rows)
+
+
+class _ProcessorBudget:
+    # hands out processors to requests in the order they were made, but lets a later request that fits in the free
+    # processors "backfill" ahead of earlier ones that don't, so long as the processors held by backfilled requests
+    # always leave enough for the largest earlier request; that request then waits only for in-order ones to finish
+    def __init__(self, num_processors):
+        if num_processors < 1:
+            raise ValueError("num_processors must be at least 1 but is {0}".format(num_processors))
+        self.num_processors = num_processors
+        self._num_free = num_processors
+        self._num_backfilled = 0
+        self._waiting = collections.deque()  # each waiting request's ticket is a unique (size, token) tuple
+        self._condition = threading.Condition()
+
+    @contextlib.contextmanager
+    def reserve(self, num_processors):
+        is_backfilled = self.acquire(num_processors)
+        try:
+            yield
+        finally:
+            self.release(num_processors, is_backfilled)
+
+    def acquire(self, num_processors):
+        """Wait for and take num_processors; returns whether they were taken ahead of an earlier request."""
+        with self._condition:
+            ticket = (num_processors, object())
+            self._waiting.append(ticket)
+            is_backfilled = self._check_start(ticket)
+            while is_backfilled is None:
+                self._condition.wait()
+                is_backfilled = self._check_start(ticket)
+            self._waiting.remove(ticket)
+            self._num_free -= num_processors
+            if is_backfilled:
+                self._num_backfilled += num_processors
+            self._condition.notify_all()  # the next request in line may fit in what's left
+            return is_backfilled
+
+    def release(self, num_processors, is_backfilled=False):
+        with self._condition:
+            self._num_free += num_processors
+            if is_backfilled:
+                self._num_backfilled -= num_processors
+            self._condition.notify_all()
+
+    def _check_start(self, ticket):
+        # returns None if the request can't start yet, else whether it would start ahead of an earlier request
+        num_processors = ticket[0]
+        if self._num_free < num_processors:
+            return None
+        earlier_sizes = []
+        for curr_ticket in self._waiting:
+            if curr_ticket is ticket:
+                break
+            earlier_sizes.append(curr_ticket[0])
+        if len(earlier_sizes) == 0:
+            return False
+        if min(earlier_sizes) <= self._num_free:
+            return None  # an earlier request fits, so it goes first
+        if self._num_backfilled + num_processors > self.num_processors - max(earlier_sizes):
+            return None
+        return True
@@ -9,19 +9,12 @@ __maintainer__ = "Amanda Birmingham"
 __email__ = "abirmingham@ucsd.edu"
 __status__ = "prototype"
 
+_CANONICAL_DNA_COMPLEMENTS = str.maketrans("ACGTacgt", "TGCAtgca")
+
 
 def rev_comp_canonical_dna_seq(dna_seq):
-    complement_dict = {"A": "T",
-                       "C": "G",
-                       "G": "C",
-                       "T": "A",
-                       "a": "t",
-                       "c": "g",
-                       "g": "c",
-                       "t": "a"}
-    reversed_seq = dna_seq[::-1]
-    rev_complement_chars = [complement_dict[x] if x in complement_dict else x for x in reversed_seq]
-    return "".join(rev_complement_chars)
+    # characters other than canonical bases (e.g. N) are left as-is
+    return dna_seq[::-1].translate(_CANONICAL_DNA_COMPLEMENTS)
 
 
 def expand_possible_mismatches(perfect_seq, position_alphabet, include_perfect=False):
@@ -29,7 +22,7 @@ def expand_possible_mismatches(perfect_seq, position_alphabet, include_perfect=F
     if include_perfect:
         result.append(perfect_seq)
 
-    perfect_seq_chars = perfect_seq.split()
+    perfect_seq_chars = list(perfect_seq)
     for curr_position in range(0, len(perfect_seq_chars)):
         perfect_seq_char = perfect_seq_chars[curr_position]
         for possible_char in position_alphabet:
@@ -0,0 +1,124 @@
+"""This module opens plain or gzip/BGZF-compressed files for reading, decompressing in the background."""
+
+# standard libraries
+import gzip
+import io
+import queue
+import shutil
+import subprocess
+import threading
+
+__author__ = "Amanda Birmingham"
+__maintainer__ = "Amanda Birmingham"
+__email__ = "abirmingham@ucsd.edu"
+__status__ = "prototype"
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_DECOMPRESSION_CHUNK_SIZE = 1024 * 1024
+_MAX_QUEUED_CHUNKS = 16
+
+
+def is_gzipped(file_path):
+    # check the magic number rather than the extension; BGZF files are gzip files too, so they are caught here as well
+    with open(file_path, 'rb') as file_handle:
+        return file_handle.read(len(_GZIP_MAGIC)) == _GZIP_MAGIC
+
+
+def open_binary_input(file_path):
+    """Open the input file for binary reading; gzipped input is decompressed on another process or thread.
+
+    If pigz is available, decompression is done by a separate (multi-threaded) pigz process; otherwise, it is done by a
+    background thread (zlib releases the GIL while inflating, so this still overlaps with work on the main thread).
+    """
+    if not is_gzipped(file_path):
+        return open(file_path, 'rb')
+
+    pigz_path = shutil.which("pigz")
+    if pigz_path is not None:
+        raw_stream = _ProcessDecompressionStream([pigz_path, "-dc", file_path])
+    else:
+        raw_stream = _ThreadDecompressionStream(file_path)
+    return io.BufferedReader(raw_stream, buffer_size=_DECOMPRESSION_CHUNK_SIZE)
+
+
+def open_text_input(file_path):
+    if not is_gzipped(file_path):
+        return open(file_path, 'r')
+    return io.TextIOWrapper(open_binary_input(file_path))
+
+
+class _ProcessDecompressionStream(io.RawIOBase):
+    def __init__(self, decompress_cmd):
+        super().__init__()
+        self._cmd = decompress_cmd
+        self._process = subprocess.Popen(decompress_cmd, stdout=subprocess.PIPE, bufsize=_DECOMPRESSION_CHUNK_SIZE)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        num_bytes = self._process.stdout.readinto(buffer)
+        if num_bytes == 0 and self._process.wait() != 0:
+            raise IOError("'{0}' exited with return code {1}".format(" ".join(self._cmd), self._process.returncode))
+        return num_bytes
+
+    def close(self):
+        if not self.closed:
+            self._process.stdout.close()
+            if self._process.poll() is None:
+                self._process.terminate()
+            self._process.wait()
+        super().close()
+
+
+class _ThreadDecompressionStream(io.RawIOBase):
+    def __init__(self, file_path):
+        super().__init__()
+        self._file_path = file_path
+        self._chunks = queue.Queue(maxsize=_MAX_QUEUED_CHUNKS)
+        self._stop_event = threading.Event()
+        self._curr_chunk = memoryview(b"")
+        self._is_exhausted = False
+        self._thread = threading.Thread(target=self._decompress, daemon=True)
+        self._thread.start()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while len(self._curr_chunk) == 0 and not self._is_exhausted:
+            next_item = self._chunks.get()
+            if isinstance(next_item, Exception):
+                raise next_item
+            if len(next_item) == 0:
+                self._is_exhausted = True
+            else:
+                self._curr_chunk = memoryview(next_item)
+
+        num_bytes = min(len(buffer), len(self._curr_chunk))
+        buffer[:num_bytes] = self._curr_chunk[:num_bytes]
+        self._curr_chunk = self._curr_chunk[num_bytes:]
+        return num_bytes
+
+    def close(self):
+        if not self.closed:
+            self._stop_event.set()
+            # drain the queue so that a decompressor blocked on a full queue can notice the stop request
+            while self._thread.is_alive():
+                try:
+                    self._chunks.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            self._thread.join()
+        super().close()
+
+    def _decompress(self):
+        try:
+            with gzip.open(self._file_path, 'rb') as file_handle:
+                while not self._stop_event.is_set():
+                    chunk = file_handle.read(_DECOMPRESSION_CHUNK_SIZE)
+                    self._chunks.put(chunk)
+                    if not chunk:
+                        break
+        except Exception as e:
+            self._chunks.put(e)
@@ -0,0 +1,240 @@
+"""This module draws quick samples of forward/reverse fastq pairs and extrapolates whole-file rates from them."""
+
+# standard libraries
+import itertools
+import logging
+import math
+import os
+import random
+
+# ccbb libraries
+from ccbbucsd.utilities.basic_fastq import BlockFastqHandler, make_fastq_handler, paired_fastq_generator
+from ccbbucsd.utilities.compressed_input import is_gzipped
+
+__author__ = "Amanda Birmingham"
+__maintainer__ = "Amanda Birmingham"
+__email__ = "abirmingham@ucsd.edu"
+__status__ = "prototype"
+
+SAMPLE_FIRST = "first"
+SAMPLE_RESERVOIR = "reservoir"
+SAMPLE_STRIDE = "stride"
+
+_Z_95 = 1.959964  # two-sided 95% standard normal quantile
+_STRIDE_BLOCK_SIZE = 64 * 1024
+_STRIDE_SEARCH_WINDOW = 1024 * 1024
+
+
+class PairSampling:
+    """Settings for processing a sample of a fastq pair's records rather than all of them.
+
+    The sample is num_pairs pairs, either the first ones in the files (SAMPLE_FIRST), a uniform random sample
+    (SAMPLE_RESERVOIR; still reads all of both files, but only the sampled pairs are processed), or runs of
+    num_pairs_per_stride consecutive pairs read at evenly spaced byte offsets (SAMPLE_STRIDE; reads only the sampled
+    pairs, so takes about the same time on a file of any size).  Compressed files can't be entered part-way through,
+    so they are reservoir-sampled instead of stride-sampled.
+    """
+
+    def __init__(self, method, num_pairs, seed=None, num_pairs_per_stride=100):
+        if method not in [SAMPLE_FIRST, SAMPLE_RESERVOIR, SAMPLE_STRIDE]:
+            raise ValueError("Unrecognized sampling method '{0}'".format(method))
+        if num_pairs < 1:
+            raise ValueError("num_pairs must be at least 1 but is {0}".format(num_pairs))
+        self.method = method
+        self.num_pairs = num_pairs
+        self.seed = seed
+        self.num_pairs_per_stride = num_pairs_per_stride
+
+    def generate_pairs(self, fw_fastq_fp, rv_fastq_fp, get_full_record, sample_info):
+        """Yield the sampled pairs, in file order, as paired_fastq_generator would; updates sample_info.
+
+        Once the generator is exhausted, sample_info holds the method actually used and, where it can be known or
+        estimated, the total number of pairs in the files (est_total_pairs).
+        """
+        method = self.method
+        if method == SAMPLE_STRIDE and (is_gzipped(fw_fastq_fp) or is_gzipped(rv_fastq_fp)):
+            logging.warning("Can't stride-sample compressed input {0}; using reservoir sampling".format(fw_fastq_fp))
+            method = SAMPLE_RESERVOIR
+
+        sample_info["sample_method"] = method
+        if method == SAMPLE_FIRST:
+            pairs = self._generate_first_pairs(fw_fastq_fp, rv_fastq_fp, get_full_record, sample_info)
+        elif method == SAMPLE_RESERVOIR:
+            pairs = self._generate_reservoir_pairs(fw_fastq_fp, rv_fastq_fp, get_full_record, sample_info)
+        else:
+            pairs = self._generate_stride_pairs(fw_fastq_fp, rv_fastq_fp, get_full_record, sample_info)
+        yield from pairs
+
+    def _generate_first_pairs(self, fw_fastq_fp, rv_fastq_fp, get_full_record, sample_info):
+        fastq_handlers = [make_fastq_handler(fw_fastq_fp, True), make_fastq_handler(rv_fastq_fp, True)]
+        num_fw_bytes = 0
+        num_sampled = 0
+        for fw_record, rv_record in itertools.islice(paired_fastq_generator(*fastq_handlers, True), self.num_pairs):
+            num_fw_bytes += len(fw_record.to_string())
+            num_sampled += 1
+            yield _get_pair_output(fw_record, rv_record, get_full_record)
+
+        for curr_handler in fastq_handlers:
+            curr_handler.close()
+        if num_sampled < self.num_pairs:
+            sample_info["est_total_pairs"] = num_sampled  # read the whole file
+        elif not is_gzipped(fw_fastq_fp):
+            sample_info["est_total_pairs"] = _estimate_num_records(fw_fastq_fp, num_fw_bytes, num_sampled)
+
+    def _generate_reservoir_pairs(self, fw_fastq_fp, rv_fastq_fp, get_full_record, sample_info):
+        rng = random.Random(self.seed)
+        reservoir = []
+        num_seen = 0
+        paired_fastqs = paired_fastq_generator(make_fastq_handler(fw_fastq_fp, True),
+                                               make_fastq_handler(rv_fastq_fp, True), get_full_record)
+        for curr_pair in paired_fastqs:
+            if num_seen < self.num_pairs:
+                reservoir.append((num_seen, curr_pair))
+            else:
+                replace_index = rng.randint(0, num_seen)
+                if replace_index < self.num_pairs:
+                    reservoir[replace_index] = (num_seen, curr_pair)
+            num_seen += 1
+
+        sample_info["est_total_pairs"] = num_seen
+        reservoir.sort(key=lambda x: x[0])
+        for _, curr_pair in reservoir:
+            yield curr_pair
+
+    def _generate_stride_pairs(self, fw_fastq_fp, rv_fastq_fp, get_full_record, sample_info):
+        fw_size = os.path.getsize(fw_fastq_fp)
+        rv_size = os.path.getsize(rv_fastq_fp)
+        num_strides = int(math.ceil(self.num_pairs / self.num_pairs_per_stride))
+        num_fw_bytes = 0
+        num_sampled = 0
+        num_strides_skipped = 0
+        fw_prev_end = rv_prev_end = 0
+
+        for stride_index in range(0, num_strides):
+            fw_offset = stride_index * fw_size // num_strides
+            if fw_offset <= fw_prev_end:
+                # runs would overlap (or just meet), so carry straight on from the end of the last one
+                fw_start, rv_start = fw_prev_end, rv_prev_end
+            else:
+                fw_start, record_name = _find_record_start(fw_fastq_fp, fw_offset, _STRIDE_BLOCK_SIZE)
+                rv_start = None
+                if fw_start is not None:
+                    rv_start = _find_named_record_start(rv_fastq_fp, fw_start * rv_size // fw_size, record_name)
+                if rv_start is None:
+                    num_strides_skipped += 1
+                    continue
+            if fw_start >= fw_size:
+                break
+
+            num_stride_pairs = min(self.num_pairs_per_stride, self.num_pairs - num_sampled)
+            fastq_handlers = [BlockFastqHandler(fw_fastq_fp, block_size=_STRIDE_BLOCK_SIZE,
+                                                byte_range=(fw_start, fw_size)),
+                              BlockFastqHandler(rv_fastq_fp, block_size=_STRIDE_BLOCK_SIZE,
+                                                byte_range=(rv_start, rv_size))]
+            fw_prev_end, rv_prev_end = fw_start, rv_start
+            stride_pairs = itertools.islice(paired_fastq_generator(*fastq_handlers, True), num_stride_pairs)
+            for fw_record, rv_record in stride_pairs:
+                if _get_read_name(fw_record.name) != _get_read_name(rv_record.name):
+                    logging.warning("Stride sample of {0} lost pairing at byte {1}".format(fw_fastq_fp,
+                                                                                           fw_prev_end))
+                    break
+                fw_num_bytes = len(fw_record.to_string())
+                fw_prev_end += fw_num_bytes
+                rv_prev_end += len(rv_record.to_string())
+                num_fw_bytes += fw_num_bytes
+                num_sampled += 1
+                yield _get_pair_output(fw_record, rv_record, get_full_record)
+            for curr_handler in fastq_handlers:
+                curr_handler.close()
+
+        sample_info["num_strides_skipped"] = num_strides_skipped
+        if num_sampled > 0:
+            sample_info["est_total_pairs"] = _estimate_num_records(fw_fastq_fp, num_fw_bytes, num_sampled)
+
+
+def get_rate_estimate(num_successes, num_trials, z=_Z_95):
+    """Return the proportion num_successes / num_trials and its Wilson score confidence interval (95% by default)."""
+    if num_trials == 0:
+        return None, 0.0, 1.0
+
+    rate = num_successes / num_trials
+    z_squared = z * z
+    denominator = 1 + z_squared / num_trials
+    center = (rate + z_squared / (2 * num_trials)) / denominator
+    half_width = z * math.sqrt(rate * (1 - rate) / num_trials + z_squared / (4 * num_trials * num_trials)) / denominator
+    return rate, max(0.0, center - half_width), min(1.0, center + half_width)
+
+
+def get_sample_estimates(counts_by_type, numerator_keys, sample_info, denominator_key="num_pairs"):
+    """Return a dictionary of rate estimates, with 95% intervals, for each numerator count over the denominator count.
+
+    If sample_info holds an estimated total number of pairs, each count is also extrapolated to the whole file.
+    """
+    result = dict(sample_info)
+    num_trials = counts_by_type[denominator_key]
+    est_total_pairs = sample_info.get("est_total_pairs")
+    for curr_key in numerator_keys:
+        rate, lower, upper = get_rate_estimate(counts_by_type[curr_key], num_trials)
+        if rate is None:
+            continue
+        result[curr_key + "_rate"] = "{0:.4f} [{1:.4f}-{2:.4f}]".format(rate, lower, upper)
+        if est_total_pairs is not None:
+            result["est_" + curr_key] = "{0} [{1}-{2}]".format(*[int(round(x * est_total_pairs))
+                                                                 for x in [rate, lower, upper]])
+    return result
+
+
+def _get_pair_output(fw_record, rv_record, get_full_record):
+    if get_full_record:
+        return fw_record, rv_record
+    return fw_record.sequence.upper(), rv_record.sequence.upper()
+
+
+def _estimate_num_records(fastq_fp, num_sampled_bytes, num_sampled_records):
+    return int(round(os.path.getsize(fastq_fp) * num_sampled_records / num_sampled_bytes))
+
+
+def _get_read_name(name_line):
+    # mates share the name up to the first whitespace, apart from any old-style /1 or /2 suffix
+    result = name_line.split(None, 1)[0]
+    if len(result) > 2 and result[-2] == "/":
+        result = result[:-2]
+    return result
+
+
+def _find_record_start(fastq_fp, offset, window_size):
+    """Return the byte offset of, and name line of, the first whole record starting at or after offset, or Nones."""
+    for curr_start, curr_name in _generate_record_starts(fastq_fp, offset, window_size):
+        return curr_start, curr_name
+    return None, None
+
+
+def _find_named_record_start(fastq_fp, approx_offset, record_name):
+    # mates are usually near the same relative position in both files, so look close by before looking further
+    read_name = _get_read_name(record_name)
+    for curr_window_size in [_STRIDE_BLOCK_SIZE, _STRIDE_SEARCH_WINDOW]:
+        start_offset = max(0, approx_offset - curr_window_size // 2)
+        for curr_start, curr_name in _generate_record_starts(fastq_fp, start_offset, curr_window_size):
+            if _get_read_name(curr_name) == read_name:
+                return curr_start
+    return None
+
+
+def _generate_record_starts(fastq_fp, offset, window_size):
+    # a line is taken to start a record if it begins with "@", the line two after it begins with "+", and the lines
+    # between them are the same length; a quality line can begin with "@", but then the line two after it is a sequence
+    with open(fastq_fp, 'rb') as file_handle:
+        file_handle.seek(offset)
+        window = file_handle.read(window_size)
+
+    lines = window.split(b"\n")
+    line_offset = offset
+    if offset > 0:
+        line_offset += len(lines[0]) + 1  # first line is probably partial
+        lines = lines[1:]
+    for line_index in range(0, len(lines) - 4):  # the last line may be partial
+        curr_line = lines[line_index]
+        if curr_line.startswith(b"@") and lines[line_index + 2].startswith(b"+") and \
+                len(lines[line_index + 1].rstrip()) == len(lines[line_index + 3].rstrip()):
+            yield line_offset, curr_line.decode().rstrip()
+        line_offset += len(curr_line) + 1
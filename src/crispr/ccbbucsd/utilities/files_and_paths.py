@@ -1,6 +1,7 @@
 # standard libraries
 import fnmatch
 import glob
+import hashlib
 import os
 import re
 
@@ -9,6 +10,9 @@ __maintainer__ = "Amanda Birmingham"
 __email__ = "abirmingham@ucsd.edu"
 __status__ = "prototype"
 
+_COMPRESSION_EXTS = [".gz", ".bgz"]
+_HASH_BLOCK_SIZE = 1024 * 1024
+
 
 def transform_path(input_fp, output_dir, output_ext):
     _, input_base, _ = get_file_name_pieces(input_fp)
@@ -20,8 +24,12 @@ def get_file_name_pieces(file_path):
     """
     Split input file path into the path, the file name without extension, and the extension, and return as a tuple.
 
+    A compression extension such as .gz is treated as part of a compound extension, so that compressed and
+    uncompressed versions of the same file have the same file name.
+
     Example:
         Inputting "/Users/Me/python/src/my_file.py" returns ("/Users/Me/python/src", "my_file", ".py").
+        Inputting "/Users/Me/data/my_reads.fastq.gz" returns ("/Users/Me/data", "my_reads", ".fastq.gz").
 
     Args:
         file_path (str): A file name, either with or without a path. Examples: my_file.py, ./src/my_file.py,
@@ -34,6 +42,9 @@ def get_file_name_pieces(file_path):
     """
     file_dir, filename = os.path.split(file_path)
     file_base, file_ext = os.path.splitext(filename)
+    if file_ext in _COMPRESSION_EXTS:
+        file_base, inner_ext = os.path.splitext(file_base)
+        file_ext = inner_ext + file_ext
     return file_dir, file_base, file_ext
 
 
@@ -60,6 +71,15 @@ def make_file_path(file_dir, file_base, file_suffix):
     return os.path.join(file_dir, filename)
 
 
+def get_file_hash(file_path):
+    """Return the hex SHA-256 digest of the contents of the input file."""
+    hasher = hashlib.sha256()
+    with open(file_path, 'rb') as file_handle:
+        for block in iter(lambda: file_handle.read(_HASH_BLOCK_SIZE), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
 def build_multipart_fp(working_dir, name_pieces, delimiter="_"):
     filename = delimiter.join(name_pieces)
     output_fp = os.path.join(working_dir, filename)
@@ -152,6 +172,8 @@ def verify_or_make_dir(dir_path):
 
 
 def gunzip_wildpath(directory, name_match, keep_gzs=False, do_recursive=False):
+    # NB: FastqHandler and BlockFastqHandler now read gzipped fastqs directly (decompressing in the background), so
+    # this staging step is only needed for tools that can't read compressed input.
     # gunzip the gzipped files; do this from shell because doing through
     # python gzip module is slow
     matching_fps = get_filepaths_from_wildcard(directory, name_match, all_subdirs=do_recursive)
@@ -1,10 +1,17 @@
 # standard libraries
+import glob
+import hashlib
+import json
+import logging
 import os
 import re
+import tempfile
 
 # ccbb libraries
 from ccbbucsd.utilities.analysis_run_prefixes import get_timestamp, get_run_prefix
-from ccbbucsd.utilities.notebook_runner import execute_notebook, export_notebook_to_html
+from ccbbucsd.utilities.files_and_paths import get_file_hash
+from ccbbucsd.utilities.notebook_runner import BackgroundHtmlExporter, execute_notebook, export_notebook_to_html, \
+    shutdown_kernel, start_kernel
 
 __author__ = "Amanda Birmingham"
 __maintainer__ = "Amanda Birmingham"
@@ -16,28 +23,100 @@ DATASET_NAME_KEY = "g_dataset_name"
 ALG_NAME_KEY = "g_count_alg_name"
 
 
-def execute_run(possible_actions_dict, run_params, ordered_run_steps, parent_dir, run_folder=None):
-    timestamp = get_timestamp()
-    run_prefix = _generate_run_prefix(run_params, timestamp)
+def execute_run(possible_actions_dict, run_params, ordered_run_steps, parent_dir, run_folder=None, force_rerun=False,
+                reuse_kernel=False, export_html_in_background=False, html_exporter=None, timestamp=None):
+    """Execute the notebook for each step in ordered_run_steps, skipping steps whose results are already in the run.
+
+    Each entry of possible_actions_dict is a list of the notebook's directory, the notebook's file name and,
+    optionally, a list of the step's input file paths and a list of its output file paths; paths may be directories
+    or wildcards, and may use the same {run_dir}, {timestamp} and {run_prefix} placeholders as run_params.
+
+    A step is skipped if the run folder holds the results of an earlier execution with the same fingerprint--made from
+    the notebook's contents, the formatted parameters, and the contents of the step's input files--and all of the
+    step's declared outputs still exist.  Only a named run_folder can be returned to, so only runs given one are ever
+    skipped; they keep the timestamp of their first execution so their formatted parameters stay the same.  Setting
+    force_rerun executes every step regardless.
+
+    If reuse_kernel is set, all the steps run in one kernel, which is started once and has its namespace reset between
+    steps, rather than in a new kernel each.  If export_html_in_background is set, each executed notebook is exported
+    to html on another process while the next step runs; the run waits for the exports only at its end.  Instead, an
+    already-made notebook_runner.BackgroundHtmlExporter may be given as html_exporter (e.g., to share one among many
+    runs); exports are then submitted to it, and it is left to the caller to wait for them.
+
+    A new run is timestamped with the given timestamp (e.g., the one its caller named its run_folder for) if there is
+    one, or else with the current time; a returned-to run still keeps the timestamp of its first execution.
+
+    Returns a list of (step, whether it was executed) tuples.
+    """
+    timestamp = get_timestamp() if timestamp is None else timestamp
     if run_folder is None:
-        run_dir = _make_run_dir(parent_dir, run_prefix)
+        run_dir = _make_run_dir(parent_dir, _generate_run_prefix(run_params, timestamp))
     else:
         run_dir = os.path.join(parent_dir, run_folder)
     methods_dir = _create_run_and_methods_dirs(run_dir)
 
-    for run_action in ordered_run_steps:
-        step_details = possible_actions_dict[run_action]
-        run_and_output_notebook(step_details, run_params, timestamp, run_prefix, run_dir, methods_dir)
+    step_cache_fp = _get_step_cache_fp(methods_dir)
+    step_cache = _read_step_cache(step_cache_fp) if run_folder is not None else None
+    if step_cache is None:
+        step_cache = {"timestamp": timestamp, "steps": {}, "file_hashes": {}}
+    timestamp = step_cache["timestamp"]
+    run_prefix = _generate_run_prefix(run_params, timestamp)
 
+    kernel_manager = None
+    is_exporter_owned = html_exporter is None and export_html_in_background
+    if is_exporter_owned:
+        html_exporter = BackgroundHtmlExporter()
+    result = []
+    is_run_finished = False
+    try:
+        for run_action in ordered_run_steps:
+            step_details = possible_actions_dict[run_action]
+            formatted_params_dict = _format_parameters(run_dir, timestamp, run_prefix, run_params)
+            input_fps = _get_declared_fps(step_details, 2, run_dir, timestamp, run_prefix)
+            step_fingerprint = _get_step_fingerprint(os.path.join(step_details[0], step_details[1]),
+                                                     formatted_params_dict, input_fps, step_cache["file_hashes"])
+
+            step_key = str(run_action)
+            prev_step_fingerprint = step_cache["steps"].get(step_key)
+            if not force_rerun and step_fingerprint == prev_step_fingerprint and \
+                    _step_outputs_exist(step_details, timestamp, run_dir, run_prefix, methods_dir):
+                logging.info("Skipping {0}, which is unchanged since it was last executed".format(step_key))
+                result.append((run_action, False))
+                continue
+
+            if reuse_kernel and kernel_manager is None:
+                kernel_manager = start_kernel(step_details[0])
+            step_cache["steps"].pop(step_key, None)
+            _write_step_cache(step_cache_fp, step_cache)  # a failed execution mustn't leave the old fingerprint behind
+            run_and_output_notebook(step_details, run_params, timestamp, run_prefix, run_dir, methods_dir,
+                                    kernel_manager, html_exporter)
+            step_cache["steps"][step_key] = step_fingerprint
+            _write_step_cache(step_cache_fp, step_cache)
+            result.append((run_action, True))
+        is_run_finished = True
+    finally:
+        if kernel_manager is not None:
+            shutdown_kernel(kernel_manager)
+        if is_exporter_owned:
+            _wait_for_html_exports(html_exporter, is_run_finished)
+
+    _write_step_cache(step_cache_fp, step_cache)  # keeps any newly remembered input file hashes
+    return result
 
-def run_and_output_notebook(step_settings, params_dict, timestamp, run_prefix, run_dir, methods_dir):
+
+def run_and_output_notebook(step_settings, params_dict, timestamp, run_prefix, run_dir, methods_dir,
+                            kernel_manager=None, html_exporter=None):
     run_path = step_settings[0]
     base_notebook_filename = step_settings[1]
 
     formatted_params_dict = _format_parameters(run_dir, timestamp, run_prefix, params_dict)
     notebook_out_fp = _get_output_fp(base_notebook_filename, timestamp, methods_dir, ".ipynb")
-    execute_notebook(base_notebook_filename, notebook_out_fp, formatted_params_dict, run_path)
-    export_notebook_to_html(notebook_out_fp, methods_dir)
+    execute_notebook(base_notebook_filename, notebook_out_fp, formatted_params_dict, run_path,
+                     kernel_manager=kernel_manager)
+    if html_exporter is None:
+        export_notebook_to_html(notebook_out_fp, methods_dir)
+    else:
+        html_exporter.submit(notebook_out_fp, methods_dir)
 
 
 def _generate_run_prefix(run_params, timestamp):
@@ -89,3 +168,71 @@ def _format_parameters(output_dir, timestamp, run_prefix, params_dict):
     return result
 
 
+def _get_step_cache_fp(methods_dir):
+    return os.path.join(methods_dir, "step_cache.json")
+
+
+def _read_step_cache(step_cache_fp):
+    if not os.path.isfile(step_cache_fp):
+        return None
+    with open(step_cache_fp) as file_handle:
+        return json.load(file_handle)
+
+
+def _write_step_cache(step_cache_fp, step_cache):
+    # write to a temporary file and then rename it, so an interrupted write can't leave a corrupt cache
+    temp_handle, temp_fp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(step_cache_fp)))
+    with os.fdopen(temp_handle, 'w') as file_handle:
+        json.dump(step_cache, file_handle, indent=1, sort_keys=True)
+    os.replace(temp_fp, step_cache_fp)
+
+
+def _get_declared_fps(step_settings, settings_index, run_dir, timestamp, run_prefix):
+    # returns a list of the existing files matched by each declared path, or an empty list if none are declared
+    result = []
+    declared_paths = step_settings[settings_index] if len(step_settings) > settings_index else []
+    for curr_path in declared_paths:
+        formatted_path = curr_path.format(run_dir=run_dir, timestamp=timestamp, run_prefix=run_prefix)
+        if os.path.isdir(formatted_path):
+            curr_fps = [os.path.join(x[0], y) for x in os.walk(formatted_path) for y in x[2]]
+        else:
+            curr_fps = glob.glob(formatted_path)
+        result.append(sorted(curr_fps))
+    return result
+
+
+def _get_step_fingerprint(notebook_fp, formatted_params_dict, declared_input_fps, file_hashes):
+    hasher = hashlib.sha256()
+    hasher.update(get_file_hash(notebook_fp).encode())
+    hasher.update(json.dumps(formatted_params_dict, sort_keys=True, default=str).encode())
+    for curr_fps in declared_input_fps:
+        for curr_fp in curr_fps:
+            hasher.update(curr_fp.encode())
+            hasher.update(_get_remembered_file_hash(curr_fp, file_hashes).encode())
+    return hasher.hexdigest()
+
+
+def _get_remembered_file_hash(file_path, file_hashes):
+    # inputs such as fastqs can be very large, so each is only re-hashed if its size or modification time changes
+    file_path = os.path.abspath(file_path)
+    file_stat = os.stat(file_path)
+    prev_info = file_hashes.get(file_path)
+    if prev_info is None or prev_info[:2] != [file_stat.st_size, file_stat.st_mtime]:
+        prev_info = file_hashes[file_path] = [file_stat.st_size, file_stat.st_mtime, get_file_hash(file_path)]
+    return prev_info[2]
+
+
+def _wait_for_html_exports(html_exporter, raise_errors):
+    # once a step has failed, an export error is only logged, so it can't hide the step's own exception
+    try:
+        html_exporter.wait()
+    except Exception:
+        if raise_errors:
+            raise
+        logging.exception("Exporting an executed notebook to html failed")
+
+
+def _step_outputs_exist(step_settings, timestamp, run_dir, run_prefix, methods_dir):
+    notebook_out_fp = _get_output_fp(step_settings[1], timestamp, methods_dir, ".ipynb")
+    declared_output_fps = _get_declared_fps(step_settings, 3, run_dir, timestamp, run_prefix)
+    return os.path.isfile(notebook_out_fp) and all(len(x) > 0 for x in declared_output_fps)
@@ -1,7 +1,9 @@
 # standard libraries
+import multiprocessing
 import os
 
 # third-party libraries
+import jupyter_client
 import nbformat
 import nbparameterise
 from nbconvert import HTMLExporter
@@ -29,21 +31,45 @@ def set_parameters(nb, params_dict):
     return new_nb
 
 
+def start_kernel(run_path="", kernel_name='python3'):
+    """Start a kernel that execute_notebook can reuse for notebook after notebook; stop it with shutdown_kernel."""
+    kernel_manager = jupyter_client.KernelManager(kernel_name=kernel_name)
+    kernel_manager.start_kernel(cwd=os.path.abspath(run_path))
+    return kernel_manager
+
+
+def shutdown_kernel(kernel_manager):
+    kernel_manager.shutdown_kernel(now=True)
+
+
 # modified from https://nbconvert.readthedocs.io/en/latest/execute_api.html
-def execute_notebook(notebook_filename, notebook_filename_out, params_dict, run_path="", timeout=6000000):
+def execute_notebook(notebook_filename, notebook_filename_out, params_dict, run_path="", timeout=6000000,
+                     kernel_manager=None):
+    """Execute the notebook with the input parameters and write the executed notebook to notebook_filename_out.
+
+    By default, the notebook runs in a new kernel that is shut down afterwards.  If a kernel_manager from
+    start_kernel is given, the notebook instead runs in its (already warm) kernel, after the kernel's namespace is
+    cleared and its working directory set to run_path, and the kernel is left running.
+    """
     notebook_fp = os.path.join(run_path, notebook_filename)
     nb = read_in_notebook(notebook_fp)
     new_nb = set_parameters(nb, params_dict)
     ep = ExecutePreprocessor(timeout=timeout, kernel_name='python3')
+    preprocess_kwargs = {}
+    if kernel_manager is not None:
+        new_nb.cells.insert(0, nbformat.v4.new_code_cell(_get_kernel_reset_code(run_path)))
+        preprocess_kwargs["km"] = kernel_manager
 
     try:
-        ep.preprocess(new_nb, {'metadata': {'path': run_path}})
+        ep.preprocess(new_nb, {'metadata': {'path': run_path}}, **preprocess_kwargs)
     except:
         msg = 'Error executing the notebook "{0}".\n\n'.format(notebook_filename)
         msg = '{0}See notebook "{1}" for the traceback.'.format(msg, notebook_filename_out)
         print(msg)
         raise
     finally:
+        if kernel_manager is not None:
+            new_nb.cells.pop(0)  # the reset cell isn't part of the notebook's record
         with open(notebook_filename_out, mode='wt') as f:
             nbformat.write(new_nb, f)
 
@@ -56,3 +82,29 @@ def export_notebook_to_html(notebook_fp, output_dir):
     out_fp = make_file_path(output_dir, notebook_name, ".html")
     with open(out_fp, "w", encoding="utf8") as f:
         f.write(body)
+
+
+class BackgroundHtmlExporter:
+    """Exports executed notebooks to html on separate processes, so the next notebook can start executing meanwhile.
+
+    Call wait() once all notebooks are submitted; it returns when every export is done, raising the first error, if
+    any, that an export hit.
+    """
+
+    def __init__(self, num_processes=1):
+        self._pool = multiprocessing.Pool(processes=num_processes)
+        self._pending_exports = []
+
+    def submit(self, notebook_fp, output_dir):
+        self._pending_exports.append(self._pool.apply_async(export_notebook_to_html, (notebook_fp, output_dir)))
+
+    def wait(self):
+        self._pool.close()
+        self._pool.join()
+        for curr_export in self._pending_exports:
+            curr_export.get()  # re-raises any error from the export
+
+
+def _get_kernel_reset_code(run_path):
+    # %reset clears the previous notebook's variables; modules it imported stay loaded, which is much of the saving
+    return "%reset -f\n__import__('os').chdir({0!r})".format(os.path.abspath(run_path))
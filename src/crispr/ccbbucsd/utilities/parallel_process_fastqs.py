@@ -1,13 +1,18 @@
 # standard libraries
 import datetime
+import functools
 import logging
 import multiprocessing
+import os
 import timeit
 import traceback
 
 # ccbb libraries
+from ccbbucsd.utilities.basic_fastq import get_paired_shard_byte_ranges
 from ccbbucsd.utilities.bio_seq_utilities import pair_hiseq_read_files
 from ccbbucsd.utilities.files_and_paths import get_filepaths_from_wildcard
+from ccbbucsd.utilities.worker_telemetry import end_run_telemetry, get_worker_snapshot_fp, start_run_telemetry, \
+    start_worker_telemetry, stop_worker_telemetry
 
 __author__ = 'Amanda Birmingham'
 __maintainer__ = "Amanda Birmingham"
@@ -46,9 +51,28 @@ def time_function(process_name, func_name, pass_process_name_to_func, *func_args
 
 
 def parallel_process_paired_reads(fastq_dir, file_suffix, num_processes, func_for_one_pair, func_fixed_inputs_list,
-                                  pass_process_name_to_func=False):
+                                  pass_process_name_to_func=False, sampling=None, resume=False, telemetry_fp=None):
+    """Call func_for_one_pair, with the fixed inputs and then the pair's file paths, for each fastq pair in parallel.
+
+    If a fastq_sampling.PairSampling is given, it is passed to func_for_one_pair as its sampling keyword argument
+    (as accepted by, e.g., construct_counter.generate_construct_counts and count_filterer.filter_pair_by_len), so that
+    each pair is only sampled.  Likewise, if resume is True, it is passed as the resume keyword argument (as accepted
+    by construct_counter.generate_construct_counts), so that each pair's processing continues from its checkpoint.
+
+    If a telemetry_fp (e.g. from worker_telemetry.get_telemetry_fp, next to the counts) is given, each pair's worker
+    records its pairs processed, pairs/sec over time, bytes read, peak memory, CPU time and summary count ratios, and
+    a json report aggregating them is written there; while the run is going, worker_telemetry.read_run_telemetry
+    reads the progress so far from it.
+    """
     logging.info("Starting parallel processing at {0}".format(datetime.datetime.now()))
     start_time = timeit.default_timer()
+    func_keyword_inputs = {}
+    if sampling is not None:
+        func_keyword_inputs["sampling"] = sampling
+    if resume:
+        func_keyword_inputs["resume"] = resume
+    if len(func_keyword_inputs) > 0:
+        func_for_one_pair = functools.partial(func_for_one_pair, **func_keyword_inputs)
 
     results = []
     fastq_filepaths = get_filepaths_from_wildcard(fastq_dir, file_suffix)
@@ -58,6 +82,7 @@ def parallel_process_paired_reads(fastq_dir, file_suffix, num_processes, func_fo
         logging.info(failure_msgs)
     else:
         process_arguments = []
+        process_sizes = []
         sorted_bases = sorted(paired_fastqs_by_base.keys())
         for curr_base in sorted_bases:
             fp_list = paired_fastqs_by_base[curr_base]
@@ -65,14 +90,158 @@ def parallel_process_paired_reads(fastq_dir, file_suffix, num_processes, func_fo
             curr_args_list.extend(func_fixed_inputs_list)
             curr_args_list.extend(fp_list)
             process_arguments.append(tuple(curr_args_list))
-
-        with multiprocessing.Pool(processes=num_processes) as pool:
-            results = pool.starmap(time_function, process_arguments)
+            process_sizes.append(sum([os.path.getsize(x) for x in fp_list]))
+
+        if telemetry_fp is None:
+            with multiprocessing.Pool(processes=num_processes) as pool:
+                results = _starmap_largest_first(pool, time_function, process_arguments, process_sizes)
+        else:
+            start_epoch_seconds = start_run_telemetry(telemetry_fp, num_processes, len(process_arguments))
+            measured_arguments = [(telemetry_fp, x) + y for x, y in zip(process_sizes, process_arguments)]
+            with multiprocessing.Pool(processes=num_processes) as pool:
+                measured_results = _starmap_largest_first(pool, _time_and_measure_function, measured_arguments,
+                                                          process_sizes)
+            results = [x[0] for x in measured_results]
+            end_run_telemetry(telemetry_fp, [x[1] for x in measured_results], start_epoch_seconds, num_processes,
+                              len(process_arguments))
 
     logging.info(get_elapsed_time_to_now(start_time, "parallel processing"))
     return results
 
 
+def parallel_process_paired_read_shards(fastq_dir, file_suffix, num_processes, func_for_one_shard,
+                                        func_for_merging_shards, func_fixed_inputs_list,
+                                        pass_process_name_to_func=False, num_shards_per_pair=None, telemetry_fp=None):
+    """Process each forward/reverse fastq pair as several record-aligned shards, spread across all processes.
+
+    func_for_one_shard is called with the fixed inputs, the pair's file paths, and then the forward and reverse
+    (start, end) byte ranges of one shard (None meaning the whole file); shards of all pairs are scheduled
+    largest-first.  func_for_merging_shards is then called, once per pair, with the fixed inputs, the pair's file
+    paths, and a list of that pair's shard results in file order; its result is reported for the pair, just as the
+    result of func_for_one_pair is by parallel_process_paired_reads.
+
+    The filter and counting notebooks process their fastqs this way, with count_filterer.filter_shard_pair_by_len
+    and merge_filtered_shard_pairs and with construct_counter.generate_shard_construct_counts and
+    write_merged_shard_construct_counts respectively.
+
+    If a telemetry_fp is given, each shard's worker records its metrics as in parallel_process_paired_reads (so the
+    shard functions record their own shard's counts), and the report written there covers all pairs' shards.
+    """
+    logging.info("Starting parallel shard processing at {0}".format(datetime.datetime.now()))
+    start_time = timeit.default_timer()
+    num_shards_per_pair = num_processes if num_shards_per_pair is None else num_shards_per_pair
+
+    results = []
+    fastq_filepaths = get_filepaths_from_wildcard(fastq_dir, file_suffix)
+    paired_fastqs_by_base, failure_msgs = pair_hiseq_read_files(fastq_filepaths)
+
+    if failure_msgs is not None:
+        logging.info(failure_msgs)
+    else:
+        shard_arguments = []
+        shard_sizes = []
+        shard_bases = []
+        sorted_bases = sorted(paired_fastqs_by_base.keys())
+        for curr_base in sorted_bases:
+            fp_list = paired_fastqs_by_base[curr_base]
+            byte_ranges = get_paired_shard_byte_ranges(fp_list[0], fp_list[1], num_shards_per_pair)
+            for shard_index, (fw_byte_range, rv_byte_range) in enumerate(byte_ranges):
+                shard_name = "{0} shard {1}".format(curr_base, shard_index)
+                curr_args_list = [shard_name, func_for_one_shard, pass_process_name_to_func]
+                curr_args_list.extend(func_fixed_inputs_list)
+                curr_args_list.extend(fp_list)
+                curr_args_list.extend([fw_byte_range, rv_byte_range])
+                shard_arguments.append(tuple(curr_args_list))
+                shard_sizes.append(_get_shard_size(fp_list, [fw_byte_range, rv_byte_range]))
+                shard_bases.append(curr_base)
+
+        shards_metrics = None
+        if telemetry_fp is None:
+            with multiprocessing.Pool(processes=num_processes) as pool:
+                shard_results = _starmap_largest_first(pool, _time_shard_function, shard_arguments, shard_sizes)
+        else:
+            start_epoch_seconds = start_run_telemetry(telemetry_fp, num_processes, len(shard_arguments))
+            measured_arguments = [(telemetry_fp, x) + y for x, y in zip(shard_sizes, shard_arguments)]
+            with multiprocessing.Pool(processes=num_processes) as pool:
+                measured_results = _starmap_largest_first(pool, _time_and_measure_shard_function,
+                                                          measured_arguments, shard_sizes)
+            shard_results = [x[0] for x in measured_results]
+            shards_metrics = [x[1] for x in measured_results]
+
+        for curr_base in sorted_bases:
+            curr_shard_results = [shard_results[x] for x in range(0, len(shard_bases)) if shard_bases[x] == curr_base]
+            shard_failures = ["{0}: {1}".format(x[0], x[2]) for x in curr_shard_results if not x[1]]
+            if len(shard_failures) > 0:
+                results.append((curr_base, "\n".join(shard_failures)))
+            else:
+                merge_args = list(func_fixed_inputs_list)
+                merge_args.extend(paired_fastqs_by_base[curr_base])
+                merge_args.append([x[2] for x in curr_shard_results])
+                results.append(time_function(curr_base, func_for_merging_shards, pass_process_name_to_func,
+                                             *merge_args))
+
+        # the run's report is written once its pairs are merged, so its elapsed time includes the merging
+        if shards_metrics is not None:
+            end_run_telemetry(telemetry_fp, shards_metrics, start_epoch_seconds, num_processes, len(shard_arguments))
+
+    logging.info(get_elapsed_time_to_now(start_time, "parallel shard processing"))
+    return results
+
+
+def _get_shard_size(fp_list, byte_ranges):
+    result = 0
+    for curr_fp, curr_byte_range in zip(fp_list, byte_ranges):
+        result += os.path.getsize(curr_fp) if curr_byte_range is None else curr_byte_range[1] - curr_byte_range[0]
+    return result
+
+
+def _starmap_largest_first(pool, func, arguments_list, sizes):
+    # dispatch one task at a time, biggest first, so the largest inputs don't end up running alone at the end;
+    # results are returned in the same order as arguments_list
+    largest_first_indices = sorted(range(0, len(arguments_list)), key=lambda x: sizes[x], reverse=True)
+    largest_first_results = pool.starmap(func, [arguments_list[x] for x in largest_first_indices], chunksize=1)
+    results = [None] * len(arguments_list)
+    for curr_index, curr_result in zip(largest_first_indices, largest_first_results):
+        results[curr_index] = curr_result
+    return results
+
+
+def _mark_success(func_name, *func_args):
+    return True, func_name(*func_args)
+
+
+def _time_and_measure_function(telemetry_fp, input_bytes, process_name, func_name, pass_process_name_to_func,
+                               *func_args):
+    # returns time_function's result along with the worker's telemetry
+    if pass_process_name_to_func:
+        func_args = (process_name,) + func_args
+    start_worker_telemetry(process_name, input_bytes, get_worker_snapshot_fp(telemetry_fp, process_name))
+    _, func_result = time_function(process_name, _mark_success, False, func_name, *func_args)
+    # time_function returns a traceback string instead of the (True, result) tuple if func_name raised an error
+    if isinstance(func_result, tuple):
+        return (process_name, func_result[1]), stop_worker_telemetry()
+    return (process_name, func_result), stop_worker_telemetry(func_result.strip().splitlines()[-1])
+
+
+def _time_and_measure_shard_function(telemetry_fp, input_bytes, process_name, func_name, pass_process_name_to_func,
+                                     *func_args):
+    # returns _time_shard_function's result along with the worker's telemetry
+    start_worker_telemetry(process_name, input_bytes, get_worker_snapshot_fp(telemetry_fp, process_name))
+    shard_result = _time_shard_function(process_name, func_name, pass_process_name_to_func, *func_args)
+    failure_message = None if shard_result[1] else shard_result[2].strip().splitlines()[-1]
+    return shard_result, stop_worker_telemetry(failure_message)
+
+
+def _time_shard_function(process_name, func_name, pass_process_name_to_func, *func_args):
+    if pass_process_name_to_func:
+        func_args = (process_name,) + func_args
+    _, func_result = time_function(process_name, _mark_success, False, func_name, *func_args)
+    # time_function returns a traceback string instead of the (True, result) tuple if func_name raised an error
+    if isinstance(func_result, tuple):
+        return process_name, True, func_result[1]
+    return process_name, False, func_result
+
+
 def concatenate_parallel_results(results_tuples):
     results_lines = ["{0}: {1}\n".format(x[0], x[1] if x[1] is not None else "finished")
                      for x in results_tuples]
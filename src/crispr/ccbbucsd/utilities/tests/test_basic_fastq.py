@@ -0,0 +1,196 @@
+# standard libraries
+import gzip
+import os
+import tempfile
+import unittest
+
+# ccbb libraries
+from ccbbucsd.utilities.basic_fastq import BlockFastqHandler, FastqHandler, build_record_offset_index, \
+    get_paired_chunk_byte_ranges, get_paired_shard_byte_ranges, paired_fastq_batch_generator, paired_fastq_generator
+
+__author__ = "Amanda Birmingham"
+__maintainer__ = "Amanda Birmingham"
+__email__ = "abirmingham@ucsd.edu"
+__status__ = "development"
+
+
+class TestFunctions(unittest.TestCase):
+    fw_fastq_string = """@D00611:256:HKTHMBCXX:1:1101:2675:2244 1:N:0:TTAGGC
+ccggttcatgccgcccatgc
++
+IIIIGIIIIIIIIIIIIIGI
+@D00611:256:HKTHMBCXX:1:1101:2804:2247 1:N:0:TTAGGC
+CCACCATTGGTGTGCTGCA
++
+GGGGGGGGIGIIIGIIGII
+@D00611:256:HKTHMBCXX:1:1101:3177:2193 1:N:0:TTAGGC
+GGTCTGTTGCCTGGTCCATCGGTCTGTTGCCTGGTCCATC
++
+GGIIIIIIIIGIIIIGIIIIGGIIIIIIIIGIIIIGIIII
+"""
+
+    rv_fastq_string = """@D00611:256:HKTHMBCXX:1:1101:2675:2244 2:N:0:TTAGGC
+GGGCTCCGGAGGCCATGCC
++
+IIIGIIIIIGGGIIIGIII
+@D00611:256:HKTHMBCXX:1:1101:2804:2247 2:N:0:TTAGGC
+TAATGTTGCTCGAGTTGGA
++
+GGGGGGGGGGGIGGGIIGI
+@D00611:256:HKTHMBCXX:1:1101:3177:2193 2:N:0:TTAGGC
+CATGCTGGATAAGGCGGC
++
+IGIIIIIIGGGGIIGGGG"""  # note: no final newline
+
+    # region BlockFastqHandler tests
+    def test_BlockFastqHandler_get_next_batch_small_blocks(self):
+        handler = BlockFastqHandler(self.fw_fastq_string, True, block_size=7)
+        records = []
+        curr_batch = handler.get_next_batch()
+        while curr_batch:
+            records.extend(curr_batch)
+            curr_batch = handler.get_next_batch()
+
+        self.assertEqual(3, len(records))
+        self.assertEqual("@D00611:256:HKTHMBCXX:1:1101:2675:2244 1:N:0:TTAGGC", records[0].name)
+        self.assertEqual("ccggttcatgccgcccatgc", records[0].sequence)
+        self.assertEqual("IIIIGIIIIIIIIIIIIIGI", records[0].quality)
+        self.assertEqual("GGTCTGTTGCCTGGTCCATCGGTCTGTTGCCTGGTCCATC", records[2].sequence)
+        self.assertEqual(self.fw_fastq_string, "".join([x.to_string() for x in records]))
+        self.assertTrue(handler.is_done)
+
+    def test_BlockFastqHandler_get_next_batch_no_final_newline(self):
+        handler = BlockFastqHandler(self.rv_fastq_string, True)
+        # the final record can only be recognized as whole once the end of the input has been reached
+        sequences = handler.get_next_batch(get_full_record=False)
+        sequences.extend(handler.get_next_batch(get_full_record=False))
+        self.assertEqual(["GGGCTCCGGAGGCCATGCC", "TAATGTTGCTCGAGTTGGA", "CATGCTGGATAAGGCGGC"], sequences)
+        self.assertEqual([], handler.get_next_batch())
+        self.assertTrue(handler.is_done)
+
+    def test_BlockFastqHandler_get_next_batch_unfinished_record(self):
+        handler = BlockFastqHandler("@name\nACGT\n+\n", True)
+        self.assertEqual([], handler.get_next_batch())
+        self.assertFalse(handler.is_done)
+
+    # endregion
+
+    # region paired_fastq_batch_generator tests
+    def test_paired_fastq_batch_generator(self):
+        # different block sizes mean the two handlers return differently-sized batches
+        fw_handler = BlockFastqHandler(self.fw_fastq_string, True, block_size=100)
+        rv_handler = BlockFastqHandler(self.rv_fastq_string, True, block_size=1000)
+
+        fw_seqs = []
+        rv_seqs = []
+        for fw_batch, rv_batch in paired_fastq_batch_generator(fw_handler, rv_handler):
+            self.assertEqual(len(fw_batch), len(rv_batch))
+            fw_seqs.extend(fw_batch)
+            rv_seqs.extend(rv_batch)
+
+        self.assertEqual(["CCGGTTCATGCCGCCCATGC", "CCACCATTGGTGTGCTGCA", "GGTCTGTTGCCTGGTCCATCGGTCTGTTGCCTGGTCCATC"],
+                         fw_seqs)
+        self.assertEqual(["GGGCTCCGGAGGCCATGCC", "TAATGTTGCTCGAGTTGGA", "CATGCTGGATAAGGCGGC"], rv_seqs)
+
+    # endregion
+
+    # region paired_fastq_generator tests
+    def test_paired_fastq_generator_block_matches_line(self):
+        line_pairs = list(paired_fastq_generator(FastqHandler(self.fw_fastq_string, True),
+                                                 FastqHandler(self.rv_fastq_string + "\n", True)))
+        block_pairs = list(paired_fastq_generator(BlockFastqHandler(self.fw_fastq_string, True, block_size=50),
+                                                  BlockFastqHandler(self.rv_fastq_string, True, block_size=50)))
+        self.assertEqual(line_pairs, block_pairs)
+
+    # endregion
+
+    # region compressed input tests
+    def test_FastqHandlers_read_gzipped_input(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            fw_fp = os.path.join(temp_dir, "test_R1_001.fastq.gz")
+            rv_fp = os.path.join(temp_dir, "test_R2_001.fastq.gz")
+            with gzip.open(fw_fp, 'wt') as file_handle:
+                file_handle.write(self.fw_fastq_string)
+            with gzip.open(rv_fp, 'wt') as file_handle:
+                file_handle.write(self.rv_fastq_string + "\n")
+
+            line_pairs = list(paired_fastq_generator(FastqHandler(fw_fp), FastqHandler(rv_fp)))
+            block_pairs = list(paired_fastq_generator(BlockFastqHandler(fw_fp), BlockFastqHandler(rv_fp)))
+
+        expected_pairs = list(paired_fastq_generator(FastqHandler(self.fw_fastq_string, True),
+                                                     FastqHandler(self.rv_fastq_string + "\n", True)))
+        self.assertEqual(3, len(expected_pairs))
+        self.assertEqual(expected_pairs, line_pairs)
+        self.assertEqual(expected_pairs, block_pairs)
+
+    # endregion
+
+    # region shard tests
+    def _write_temp_fastq_pair(self, temp_dir):
+        fw_fp = os.path.join(temp_dir, "test_R1_001.fastq")
+        rv_fp = os.path.join(temp_dir, "test_R2_001.fastq")
+        with open(fw_fp, 'w') as file_handle:
+            file_handle.write(self.fw_fastq_string)
+        with open(rv_fp, 'w') as file_handle:
+            file_handle.write(self.rv_fastq_string)
+        return fw_fp, rv_fp
+
+    def test_build_record_offset_index(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            fw_fp, rv_fp = self._write_temp_fastq_pair(temp_dir)
+            fw_offsets, fw_num_records = build_record_offset_index(fw_fp, 1, block_size=30)
+            rv_offsets, rv_num_records = build_record_offset_index(rv_fp, 2)
+
+        self.assertEqual([0, 96, 190], fw_offsets)
+        self.assertEqual(3, fw_num_records)
+        self.assertEqual([0, 188], rv_offsets)
+        self.assertEqual(3, rv_num_records)  # final record has no final newline
+
+    def test_build_record_offset_index_from_start_offset(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            fw_fp, _ = self._write_temp_fastq_pair(temp_dir)
+            fw_offsets, fw_num_records = build_record_offset_index(fw_fp, 1, block_size=30, start_offset=96)
+
+        self.assertEqual([96, 190], fw_offsets)
+        self.assertEqual(2, fw_num_records)
+
+    def test_get_paired_shard_byte_ranges(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            fw_fp, rv_fp = self._write_temp_fastq_pair(temp_dir)
+            byte_ranges = get_paired_shard_byte_ranges(fw_fp, rv_fp, 2, num_records_per_entry=1)
+            self.assertEqual(2, len(byte_ranges))
+
+            shard_pairs = []
+            for fw_byte_range, rv_byte_range in byte_ranges:
+                shard_pairs.extend(paired_fastq_generator(BlockFastqHandler(fw_fp, byte_range=fw_byte_range),
+                                                          BlockFastqHandler(rv_fp, byte_range=rv_byte_range)))
+
+        expected_pairs = list(paired_fastq_generator(FastqHandler(self.fw_fastq_string, True),
+                                                     FastqHandler(self.rv_fastq_string + "\n", True)))
+        self.assertEqual(expected_pairs, shard_pairs)
+
+    def test_get_paired_shard_byte_ranges_single_shard(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            fw_fp, rv_fp = self._write_temp_fastq_pair(temp_dir)
+            self.assertEqual([(None, None)], get_paired_shard_byte_ranges(fw_fp, rv_fp, 1))
+
+    # endregion
+
+    # region get_paired_chunk_byte_ranges tests
+    def test_get_paired_chunk_byte_ranges(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            fw_fp, rv_fp = self._write_temp_fastq_pair(temp_dir)
+            byte_ranges = get_paired_chunk_byte_ranges(fw_fp, rv_fp, 2)
+            first_chunk_ends = (byte_ranges[0][0][1], byte_ranges[0][1][1])
+            resumed_byte_ranges = get_paired_chunk_byte_ranges(fw_fp, rv_fp, 2, first_chunk_ends)
+            chunk_pairs = []
+            for fw_byte_range, rv_byte_range in byte_ranges:
+                chunk_pairs.append(list(paired_fastq_generator(BlockFastqHandler(fw_fp, byte_range=fw_byte_range),
+                                                               BlockFastqHandler(rv_fp, byte_range=rv_byte_range))))
+
+        expected_pairs = list(paired_fastq_generator(FastqHandler(self.fw_fastq_string, True),
+                                                     FastqHandler(self.rv_fastq_string + "\n", True)))
+        self.assertEqual([expected_pairs[:2], expected_pairs[2:]], chunk_pairs)
+        self.assertEqual(byte_ranges[1:], resumed_byte_ranges)
+
+    # endregion
@@ -0,0 +1,170 @@
+# standard libraries
+import os
+import tempfile
+import threading
+import time
+import unittest
+import unittest.mock
+
+# ccbb libraries
+try:
+    from ccbbucsd.utilities import batch_pipeliner
+except ImportError:  # the notebook runner needs the jupyter libraries
+    batch_pipeliner = None
+
+__author__ = "Amanda Birmingham"
+__maintainer__ = "Amanda Birmingham"
+__email__ = "abirmingham@ucsd.edu"
+__status__ = "development"
+
+
+def _wait_until(condition_func, timeout_seconds=5):
+    end_time = time.time() + timeout_seconds
+    while not condition_func():
+        if time.time() > end_time:
+            raise AssertionError("timed out waiting")
+        time.sleep(0.001)
+
+
+@unittest.skipUnless(batch_pipeliner, "the jupyter libraries are not installed")
+class TestProcessorBudget(unittest.TestCase):
+    # region acquire/release tests
+    def test_light_request_backfills_behind_waiting_heavy_request(self):
+        budget = batch_pipeliner._ProcessorBudget(4)
+        self.assertFalse(budget.acquire(2))  # in order, leaving 2 free
+
+        started_sizes = []
+        threads = [threading.Thread(target=lambda x: started_sizes.append((x, budget.acquire(x))), args=(x,))
+                   for x in [3, 1, 1]]
+        threads[0].start()
+        _wait_until(lambda: len(budget._waiting) == 1)
+        # the 3 can't start, but a 1 fits in the free processors the 3 can't use yet
+        threads[1].start()
+        _wait_until(lambda: len(started_sizes) == 1)
+        self.assertEqual([(1, True)], started_sizes)
+
+        # a second 1 would hold a processor the 3 needs, so it must wait
+        threads[2].start()
+        _wait_until(lambda: len(budget._waiting) == 2)
+        time.sleep(0.05)
+        self.assertEqual(1, len(started_sizes))
+
+        budget.release(2)  # now the 3 starts, then the last 1 once there is room
+        _wait_until(lambda: len(started_sizes) == 2)
+        self.assertEqual((3, False), started_sizes[1])
+        budget.release(1, True)
+        for curr_thread in threads:
+            curr_thread.join()
+        self.assertEqual((1, False), started_sizes[2])
+
+    def test_too_few_processors(self):
+        with self.assertRaises(ValueError):
+            batch_pipeliner._ProcessorBudget(0)
+
+    # endregion
+
+
+@unittest.skipUnless(batch_pipeliner, "the jupyter libraries are not installed")
+class TestFunctions(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.lock = threading.Lock()
+        self.num_processors_in_use = 0
+        self.max_processors_in_use = 0
+        self.failing_steps = []
+        self.skipped_steps = []
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _execute_run(self, possible_actions_dict, run_params, ordered_run_steps, parent_dir, run_folder=None,
+                     **kwargs):
+        # stands in for notebook_pipeliner.execute_run, keeping track of how many processors are in use
+        num_processors = run_params["g_num_processors"]
+        with self.lock:
+            self.num_processors_in_use += num_processors
+            self.max_processors_in_use = max(self.max_processors_in_use, self.num_processors_in_use)
+        try:
+            time.sleep(0.01)
+            step_key = (run_params["dataset"], ordered_run_steps[0])
+            if step_key in self.failing_steps:
+                raise RuntimeError("{0} failed".format(step_key))
+            return [(ordered_run_steps[0], step_key not in self.skipped_steps)]
+        finally:
+            with self.lock:
+                self.num_processors_in_use -= num_processors
+
+    def _make_dataset_runs(self, dataset_names):
+        return [batch_pipeliner.DatasetRun(x, {}, {"dataset": x, batch_pipeliner.DATASET_NAME_KEY: x,
+                                                   batch_pipeliner.ALG_NAME_KEY: "alg"}, None)
+                for x in dataset_names]
+
+    def _execute_batch(self, dataset_names, report_fp=None, **kwargs):
+        with unittest.mock.patch.object(batch_pipeliner, "execute_run", side_effect=self._execute_run) as mock_run:
+            result = batch_pipeliner.execute_batch(self._make_dataset_runs(dataset_names), ["trim", "count", "plot"],
+                                                   self.temp_dir.name, 4, {"trim": 3, "count": 3},
+                                                   "g_num_processors", report_fp=report_fp, **kwargs)
+        return result, mock_run
+
+    # region read_dataset_manifest tests
+    def test_read_dataset_manifest(self):
+        manifest_fp = os.path.join(self.temp_dir.name, "manifest.txt")
+        with open(manifest_fp, 'w') as file_handle:
+            file_handle.write("dataset_name\tfastq_set_name\trun_folder\n# a comment\n\nd1\tset1\t\nd2 \tset2\trun2\n")
+        self.assertEqual([{"dataset_name": "d1", "fastq_set_name": "set1", "run_folder": None},
+                          {"dataset_name": "d2", "fastq_set_name": "set2", "run_folder": "run2"}],
+                         batch_pipeliner.read_dataset_manifest(manifest_fp))
+
+    # endregion
+
+    # region execute_batch tests
+    def test_execute_batch_stays_within_processor_budget(self):
+        result, mock_run = self._execute_batch(["d{0}".format(x) for x in range(0, 6)])
+        self.assertEqual(18, mock_run.call_count)
+        self.assertLessEqual(self.max_processors_in_use, 4)
+        self.assertGreater(self.max_processors_in_use, 1)
+        self.assertTrue(all(x[2] == batch_pipeliner.STEP_EXECUTED for x in result))
+
+    def test_execute_batch_failure_stops_only_its_dataset(self):
+        self.failing_steps = [("d1", "count")]
+        self.skipped_steps = [("d2", "trim")]
+        report_fp = os.path.join(self.temp_dir.name, "report.txt")
+        result, mock_run = self._execute_batch(["d1", "d2"], report_fp)
+        self.assertEqual(5, mock_run.call_count)
+        self.assertEqual([["d1", "trim", batch_pipeliner.STEP_EXECUTED, 3],
+                          ["d1", "count", batch_pipeliner.STEP_FAILED, 3],
+                          ["d1", "plot", batch_pipeliner.STEP_NOT_RUN, 1],
+                          ["d2", "trim", batch_pipeliner.STEP_SKIPPED, 3],
+                          ["d2", "count", batch_pipeliner.STEP_EXECUTED, 3],
+                          ["d2", "plot", batch_pipeliner.STEP_EXECUTED, 1]], [x[:4] for x in result])
+        self.assertEqual("RuntimeError: ('d1', 'count') failed", result[1][6])
+        self.assertEqual(["", "", ""], result[2][4:])
+        self.assertTrue(all(x[4] != "" and float(x[5]) >= 0 for x in result if x[2] != batch_pipeliner.STEP_NOT_RUN))
+
+        # every step of a dataset runs in the same (new) run folder
+        run_folders = {"d1": set(), "d2": set()}
+        for curr_call in mock_run.call_args_list:
+            run_folders[curr_call[0][1]["dataset"]].add(curr_call[1]["run_folder"])
+        self.assertTrue(all(len(x) == 1 and None not in x for x in run_folders.values()))
+        # ... and with the timestamp that folder is named for
+        timestamps = set(x[1]["timestamp"] for x in mock_run.call_args_list)
+        self.assertEqual(1, len(timestamps))
+        self.assertEqual({"d1": {"d1_alg_" + list(timestamps)[0]}, "d2": {"d2_alg_" + list(timestamps)[0]}},
+                         run_folders)
+
+        with open(report_fp) as file_handle:
+            report_lines = file_handle.read().splitlines()
+        self.assertEqual("# num_steps:6,num_failed:1", report_lines[0])
+        self.assertEqual("dataset\tstep\tstatus\tnum_processors\tstart_time\telapsed_seconds\tmessage", report_lines[1])
+        self.assertEqual(["d1", "plot", "not run", "1", "", "", ""], report_lines[4].split("\t"))
+
+    def test_execute_batch_shares_one_html_exporter(self):
+        with unittest.mock.patch.object(batch_pipeliner, "BackgroundHtmlExporter") as mock_exporter_class:
+            _, mock_run = self._execute_batch(["d1", "d2"], export_html_in_background=True)
+        mock_exporter_class.assert_called_once_with()
+        mock_exporter_class.return_value.wait.assert_called_once_with()
+        for curr_call in mock_run.call_args_list:
+            self.assertIs(mock_exporter_class.return_value, curr_call[1]["html_exporter"])
+            self.assertNotIn("export_html_in_background", curr_call[1])
+
+    # endregion
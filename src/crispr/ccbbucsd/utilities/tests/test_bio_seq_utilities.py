@@ -2,7 +2,7 @@
 import unittest
 
 # ccbb libraries
-from ccbbucsd.utilities.bio_seq_utilities import trim_seq
+from ccbbucsd.utilities.bio_seq_utilities import expand_possible_mismatches, trim_seq
 
 __author__ = "Amanda Birmingham"
 __maintainer__ = "Amanda Birmingham"
@@ -11,6 +11,16 @@ __status__ = "development"
 
 
 class TestFunctions(unittest.TestCase):
+    # region expand_possible_mismatches tests
+    def test_expand_possible_mismatches(self):
+        output = expand_possible_mismatches("AC", "ACG")
+        self.assertEqual(["CC", "GC", "AA", "AG"], output)
+
+        output_with_perfect = expand_possible_mismatches("AC", "ACG", include_perfect=True)
+        self.assertEqual(["AC", "CC", "GC", "AA", "AG"], output_with_perfect)
+
+    # endregion
+
     # region trim_seq tests
     def test_trim_seq_long(self):
         input_seq = "ACGT"
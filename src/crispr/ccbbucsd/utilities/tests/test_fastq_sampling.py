@@ -0,0 +1,151 @@
+# standard libraries
+import gzip
+import os
+import random
+import tempfile
+import unittest
+
+# ccbb libraries
+from ccbbucsd.utilities.fastq_sampling import SAMPLE_FIRST, SAMPLE_RESERVOIR, SAMPLE_STRIDE, PairSampling, \
+    get_rate_estimate, get_sample_estimates
+
+__author__ = "Amanda Birmingham"
+__maintainer__ = "Amanda Birmingham"
+__email__ = "abirmingham@ucsd.edu"
+__status__ = "development"
+
+
+class TestPairSampling(unittest.TestCase):
+    num_records = 2000
+
+    @staticmethod
+    def _make_fastq_string(read_num, num_records):
+        # sequence lengths vary, and some quality lines start with "@", so record starts must really be recognized
+        rng = random.Random(read_num)
+        record_strs = []
+        for record_index in range(0, num_records):
+            seq_len = rng.randint(15, 40)
+            seq = "".join(rng.choice("ACGT") for _ in range(0, seq_len))
+            quality = "@" + "I" * (seq_len - 1) if record_index % 3 == 0 else "G" * seq_len
+            record_strs.append("@read{0} {1}:N:0:ATCACG\n{2}\n+\n{3}\n".format(record_index, read_num, seq, quality))
+        return "".join(record_strs)
+
+    def _write_fastq_pair(self, temp_dir, num_records=None, use_gzip=False):
+        num_records = self.num_records if num_records is None else num_records
+        result = []
+        for read_num in [1, 2]:
+            fastq_fp = os.path.join(temp_dir, "test_R{0}_001.fastq".format(read_num))
+            fastq_str = self._make_fastq_string(read_num, num_records)
+            if use_gzip:
+                fastq_fp += ".gz"
+                with gzip.open(fastq_fp, 'wt') as file_handle:
+                    file_handle.write(fastq_str)
+            else:
+                with open(fastq_fp, 'w') as file_handle:
+                    file_handle.write(fastq_str)
+            result.append(fastq_fp)
+        return result
+
+    def _assert_pairs_in_sync(self, sampled_pairs):
+        for fw_record, rv_record in sampled_pairs:
+            self.assertEqual(fw_record.name.split()[0], rv_record.name.split()[0])
+
+    @staticmethod
+    def _get_record_nums(sampled_pairs):
+        return [int(x[0].name.split()[0][len("@read"):]) for x in sampled_pairs]
+
+    # region generate_pairs tests
+    def test_generate_pairs_first(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            fw_fp, rv_fp = self._write_fastq_pair(temp_dir)
+            sample_info = {}
+            sampled_pairs = list(PairSampling(SAMPLE_FIRST, 5).generate_pairs(fw_fp, rv_fp, True, sample_info))
+
+        self.assertEqual([0, 1, 2, 3, 4], self._get_record_nums(sampled_pairs))
+        self._assert_pairs_in_sync(sampled_pairs)
+        self.assertEqual(SAMPLE_FIRST, sample_info["sample_method"])
+        self.assertIn("est_total_pairs", sample_info)
+
+    def test_generate_pairs_reservoir(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            fw_fp, rv_fp = self._write_fastq_pair(temp_dir)
+            sample_info = {}
+            sampling = PairSampling(SAMPLE_RESERVOIR, 50, seed=3)
+            sampled_pairs = list(sampling.generate_pairs(fw_fp, rv_fp, True, sample_info))
+            repeat_pairs = list(sampling.generate_pairs(fw_fp, rv_fp, True, {}))
+
+        record_nums = self._get_record_nums(sampled_pairs)
+        self.assertEqual(50, len(set(record_nums)))
+        self.assertEqual(sorted(record_nums), record_nums)  # returned in file order
+        self.assertGreater(record_nums[-1], 1000)  # not just the start of the file
+        self.assertEqual(record_nums, self._get_record_nums(repeat_pairs))  # same seed, same sample
+        self._assert_pairs_in_sync(sampled_pairs)
+        self.assertEqual(self.num_records, sample_info["est_total_pairs"])
+
+    def test_generate_pairs_stride(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            fw_fp, rv_fp = self._write_fastq_pair(temp_dir)
+            sample_info = {}
+            sampled_pairs = list(PairSampling(SAMPLE_STRIDE, 100, num_pairs_per_stride=10).generate_pairs(
+                fw_fp, rv_fp, True, sample_info))
+
+        record_nums = self._get_record_nums(sampled_pairs)
+        self.assertEqual(100, len(set(record_nums)))
+        self.assertEqual(sorted(record_nums), record_nums)
+        self.assertGreater(record_nums[-1], 1700)  # strides spread across the whole file
+        self._assert_pairs_in_sync(sampled_pairs)
+        self.assertEqual(0, sample_info["num_strides_skipped"])
+        self.assertAlmostEqual(self.num_records, sample_info["est_total_pairs"], delta=self.num_records * 0.1)
+
+    def test_generate_pairs_stride_small_file_reads_each_pair_once(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            fw_fp, rv_fp = self._write_fastq_pair(temp_dir, num_records=30)
+            sampled_seqs = list(PairSampling(SAMPLE_STRIDE, 100, num_pairs_per_stride=10).generate_pairs(
+                fw_fp, rv_fp, False, {}))
+            all_seqs = list(PairSampling(SAMPLE_FIRST, 100).generate_pairs(fw_fp, rv_fp, False, {}))
+
+        self.assertEqual(30, len(all_seqs))
+        self.assertEqual(all_seqs, sampled_seqs)
+
+    def test_generate_pairs_stride_gzipped_uses_reservoir(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            fw_fp, rv_fp = self._write_fastq_pair(temp_dir, num_records=100, use_gzip=True)
+            sample_info = {}
+            sampled_pairs = list(PairSampling(SAMPLE_STRIDE, 10).generate_pairs(fw_fp, rv_fp, True, sample_info))
+
+        self.assertEqual(10, len(sampled_pairs))
+        self.assertEqual(SAMPLE_RESERVOIR, sample_info["sample_method"])
+        self.assertEqual(100, sample_info["est_total_pairs"])
+
+    def test_init_rejects_unknown_method(self):
+        with self.assertRaises(ValueError):
+            PairSampling("every_other", 10)
+
+    # endregion
+
+
+class TestFunctions(unittest.TestCase):
+    # region get_rate_estimate tests
+    def test_get_rate_estimate(self):
+        rate, lower, upper = get_rate_estimate(50, 100)
+        self.assertEqual(0.5, rate)
+        self.assertAlmostEqual(0.4038, lower, places=4)
+        self.assertAlmostEqual(0.5962, upper, places=4)
+
+    def test_get_rate_estimate_all_successes(self):
+        rate, lower, upper = get_rate_estimate(10, 10)
+        self.assertEqual(1.0, rate)
+        self.assertAlmostEqual(0.7225, lower, places=4)
+        self.assertAlmostEqual(1.0, upper)
+
+    # endregion
+
+    # region get_sample_estimates tests
+    def test_get_sample_estimates(self):
+        output = get_sample_estimates({"num_pairs": 100, "num_pairs_passing": 50}, ["num_pairs_passing"],
+                                      {"sample_method": SAMPLE_FIRST, "est_total_pairs": 1000})
+        self.assertEqual({"sample_method": SAMPLE_FIRST, "est_total_pairs": 1000,
+                          "num_pairs_passing_rate": "0.5000 [0.4038-0.5962]",
+                          "est_num_pairs_passing": "500 [404-596]"}, output)
+
+    # endregion
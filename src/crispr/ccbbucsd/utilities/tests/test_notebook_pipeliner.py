@@ -0,0 +1,152 @@
+# standard libraries
+import json
+import os
+import tempfile
+import unittest
+import unittest.mock
+
+# ccbb libraries
+try:
+    from ccbbucsd.utilities import notebook_pipeliner
+except ImportError:  # the notebook runner needs the jupyter libraries
+    notebook_pipeliner = None
+
+__author__ = "Amanda Birmingham"
+__maintainer__ = "Amanda Birmingham"
+__email__ = "abirmingham@ucsd.edu"
+__status__ = "development"
+
+
+@unittest.skipUnless(notebook_pipeliner, "the jupyter libraries are not installed")
+class TestFunctions(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.parent_dir = self.temp_dir.name
+        self.run_dir = os.path.join(self.parent_dir, "run1")
+        self.input_fp = os.path.join(self.parent_dir, "input.txt")
+        with open(self.input_fp, 'w') as file_handle:
+            file_handle.write("first input")
+        for curr_notebook in ["step1.ipynb", "step2.ipynb"]:
+            with open(os.path.join(self.parent_dir, curr_notebook), 'w') as file_handle:
+                file_handle.write(curr_notebook)
+
+        # step 2 reads step 1's output, so re-executing step 1 with a new input changes step 2's input
+        self.actions_dict = {
+            1: [self.parent_dir, "step1.ipynb", [self.input_fp], ["{run_dir}/step1_out.txt"]],
+            2: [self.parent_dir, "step2.ipynb", ["{run_dir}/step1_out.txt"], ["{run_dir}/step2_out.txt"]]}
+        self.run_params = {notebook_pipeliner.DATASET_NAME_KEY: "test", notebook_pipeliner.ALG_NAME_KEY: "alg",
+                           "g_output_dir": "{run_dir}"}
+        self.failing_notebook = None
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _execute_notebook(self, notebook_filename, notebook_filename_out, params_dict, run_path="",
+                          kernel_manager=None):
+        # stands in for executing a notebook: copies the step's input to its output
+        if notebook_filename == self.failing_notebook:
+            raise RuntimeError("{0} failed".format(notebook_filename))
+        with open(notebook_filename_out, 'w') as file_handle:
+            file_handle.write("{}")
+        step_name = os.path.splitext(notebook_filename)[0]
+        input_fp = self.input_fp if step_name == "step1" else os.path.join(params_dict["g_output_dir"],
+                                                                          "step1_out.txt")
+        with open(input_fp) as file_handle:
+            input_contents = file_handle.read()
+        with open(os.path.join(params_dict["g_output_dir"], step_name + "_out.txt"), 'w') as file_handle:
+            file_handle.write(step_name + " of " + input_contents)
+
+    def _execute_run(self, **kwargs):
+        with unittest.mock.patch.object(notebook_pipeliner, "execute_notebook",
+                                        side_effect=self._execute_notebook) as mock_execute, \
+                unittest.mock.patch.object(notebook_pipeliner, "export_notebook_to_html") as mock_export:
+            result = notebook_pipeliner.execute_run(self.actions_dict, self.run_params, [1, 2], self.parent_dir,
+                                                    run_folder="run1", **kwargs)
+        self.assertEqual(mock_execute.call_count, mock_export.call_count)
+        return result
+
+    def _read_step_cache(self):
+        with open(os.path.join(self.run_dir, "methods", "step_cache.json")) as file_handle:
+            return json.load(file_handle)
+
+    # region execute_run tests
+    def test_execute_run_skips_unchanged_steps(self):
+        self.assertEqual([(1, True), (2, True)], self._execute_run())
+        self.assertEqual([(1, False), (2, False)], self._execute_run())
+
+    def test_execute_run_reruns_changed_step_and_later_steps(self):
+        self._execute_run()
+        with open(self.input_fp, 'w') as file_handle:
+            file_handle.write("second input")
+        self.assertEqual([(1, True), (2, True)], self._execute_run())
+        with open(os.path.join(self.run_dir, "step2_out.txt")) as file_handle:
+            self.assertEqual("step2 of step1 of second input", file_handle.read())
+
+    def test_execute_run_force_rerun(self):
+        self._execute_run()
+        self.assertEqual([(1, True), (2, True)], self._execute_run(force_rerun=True))
+
+    def test_execute_run_reruns_step_missing_output(self):
+        self._execute_run()
+        os.remove(os.path.join(self.run_dir, "step2_out.txt"))
+        self.assertEqual([(1, False), (2, True)], self._execute_run())
+
+    def test_execute_run_given_timestamp(self):
+        self.run_params["g_output_dir"] = "{run_dir}/{timestamp}"
+        self.actions_dict = {
+            1: [self.parent_dir, "step1.ipynb", [self.input_fp], ["{run_dir}/{timestamp}/step1_out.txt"]],
+            2: [self.parent_dir, "step2.ipynb", ["{run_dir}/{timestamp}/step1_out.txt"],
+                ["{run_dir}/{timestamp}/step2_out.txt"]]}
+        os.makedirs(os.path.join(self.run_dir, "20260101000000"))
+        self._execute_run(timestamp="20260101000000")
+        self.assertEqual("20260101000000", self._read_step_cache()["timestamp"])
+        self.assertTrue(os.path.exists(os.path.join(self.run_dir, "20260101000000", "step2_out.txt")))
+
+        # a returned-to run keeps the timestamp it was first executed with
+        self.assertEqual([(1, False), (2, False)], self._execute_run(timestamp="20270101000000"))
+        self.assertEqual("20260101000000", self._read_step_cache()["timestamp"])
+
+    def test_execute_run_failed_step_leaves_no_fingerprint(self):
+        self._execute_run()
+        self.failing_notebook = "step2.ipynb"
+        with self.assertRaises(RuntimeError):
+            self._execute_run(force_rerun=True)
+        self.assertEqual(["1"], list(self._read_step_cache()["steps"]))
+
+        # step 2's inputs and outputs are unchanged, but its last execution failed
+        self.failing_notebook = None
+        self.assertEqual([(1, False), (2, True)], self._execute_run())
+
+    def test_execute_run_reused_kernel_shut_down_on_failure(self):
+        self.actions_dict[3] = [self.parent_dir, "step1.ipynb"]
+        self.failing_notebook = "step2.ipynb"
+        with unittest.mock.patch.object(notebook_pipeliner, "execute_notebook",
+                                        side_effect=self._execute_notebook) as mock_execute, \
+                unittest.mock.patch.object(notebook_pipeliner, "export_notebook_to_html"), \
+                unittest.mock.patch.object(notebook_pipeliner, "start_kernel") as mock_start, \
+                unittest.mock.patch.object(notebook_pipeliner, "shutdown_kernel") as mock_shutdown:
+            with self.assertRaises(RuntimeError):
+                notebook_pipeliner.execute_run(self.actions_dict, self.run_params, [1, 2, 3], self.parent_dir,
+                                               reuse_kernel=True)
+
+        mock_start.assert_called_once_with(self.parent_dir)
+        mock_shutdown.assert_called_once_with(mock_start.return_value)
+        self.assertEqual(2, mock_execute.call_count)  # step 3 never ran
+        self.assertTrue(all(x[1]["kernel_manager"] is mock_start.return_value for x in mock_execute.call_args_list))
+
+    def test_execute_run_export_error_does_not_hide_step_error(self):
+        self.failing_notebook = "step2.ipynb"
+        with unittest.mock.patch.object(notebook_pipeliner, "execute_notebook", side_effect=self._execute_notebook), \
+                unittest.mock.patch.object(notebook_pipeliner, "BackgroundHtmlExporter") as mock_exporter_class:
+            mock_exporter_class.return_value.wait.side_effect = ValueError("export failed")
+            with self.assertRaisesRegex(RuntimeError, "step2.ipynb failed"):
+                notebook_pipeliner.execute_run(self.actions_dict, self.run_params, [1, 2], self.parent_dir,
+                                               export_html_in_background=True)
+
+            # with no step failing, the export error is the run's error
+            self.failing_notebook = None
+            with self.assertRaisesRegex(ValueError, "export failed"):
+                notebook_pipeliner.execute_run(self.actions_dict, self.run_params, [1, 2], self.parent_dir,
+                                               export_html_in_background=True)
+
+    # endregion
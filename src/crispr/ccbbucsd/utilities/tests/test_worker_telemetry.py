@@ -0,0 +1,177 @@
+# standard libraries
+import os
+import tempfile
+import unittest
+
+# ccbb libraries
+from ccbbucsd.utilities.parallel_process_fastqs import parallel_process_paired_read_shards, parallel_process_paired_reads
+from ccbbucsd.utilities.worker_telemetry import STATUS_FAILED, STATUS_FINISHED, STATUS_RUNNING, WorkerTelemetry, \
+    end_run_telemetry, get_live_telemetry_dir, get_telemetry_fp, get_worker_snapshot_fp, read_run_telemetry, \
+    record_counts, record_progress, start_run_telemetry, start_worker_telemetry, stop_worker_telemetry, \
+    summarize_run_telemetry
+
+__author__ = "Amanda Birmingham"
+__maintainer__ = "Amanda Birmingham"
+__email__ = "abirmingham@ucsd.edu"
+__status__ = "development"
+
+
+def _count_lines(fw_fastq_fp, rv_fastq_fp):
+    with open(fw_fastq_fp) as file_handle:
+        num_pairs = sum(1 for _ in file_handle) // 4
+    record_progress(num_pairs)
+    record_counts({"num_pairs": num_pairs, "num_pairs_passing": num_pairs - 1})
+    if "bad" in fw_fastq_fp:
+        raise ValueError("bad input")
+    return "num_pairs:{0}".format(num_pairs)
+
+
+def _count_shard_lines(fw_fastq_fp, rv_fastq_fp, fw_byte_range, rv_byte_range):
+    with open(fw_fastq_fp, 'rb') as file_handle:
+        file_handle.seek(fw_byte_range[0])
+        num_pairs = file_handle.read(fw_byte_range[1] - fw_byte_range[0]).count(b"\n") // 4
+    record_counts({"num_pairs": num_pairs, "num_pairs_passing": num_pairs - 1})
+    if "bad" in fw_fastq_fp:
+        raise ValueError("bad input")
+    return num_pairs
+
+
+def _sum_shard_lines(fw_fastq_fp, rv_fastq_fp, shard_results):
+    return "num_pairs:{0}".format(sum(shard_results))
+
+
+class TestWorkerTelemetry(unittest.TestCase):
+    # region record_progress/record_counts/finish tests
+    def test_worker_telemetry(self):
+        telemetry = WorkerTelemetry("sample1", input_bytes=2000000)
+        telemetry.record_progress(100000)
+        telemetry.record_counts({"num_pairs": 150000, "num_constructs_recognized": 120000,
+                                 "num_pairs_unrecognized": 15000, "sample_method": "first", "hit_rate": 0.5})
+        output = telemetry.finish()
+
+        self.assertEqual(STATUS_FINISHED, output["status"])
+        self.assertEqual(150000, output["num_pairs"])
+        self.assertEqual([100000, 150000], [x["num_pairs"] for x in output["progress"]])
+        self.assertTrue(all(x["pairs_per_sec"] > 0 for x in output["progress"]))
+        self.assertEqual({"num_constructs_recognized": 0.8, "num_pairs_unrecognized": 0.1}, output["ratios"])
+        self.assertEqual(2000000, output["input_bytes"])
+        self.assertGreaterEqual(output["cpu_seconds"], 0)
+        self.assertGreater(output["peak_rss_mb"], 0)
+        self.assertGreater(output["pairs_per_sec"], 0)
+
+    def test_worker_telemetry_failed(self):
+        output = WorkerTelemetry("sample1").finish("ValueError: bad input")
+        self.assertEqual(STATUS_FAILED, output["status"])
+        self.assertEqual("ValueError: bad input", output["message"])
+        self.assertEqual({}, output["ratios"])
+
+    def test_worker_telemetry_snapshot(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            telemetry_fp = get_telemetry_fp(temp_dir, "run")
+            start_epoch_seconds = start_run_telemetry(telemetry_fp, 2, 3)
+            telemetry = WorkerTelemetry("sample 1", snapshot_fp=get_worker_snapshot_fp(telemetry_fp, "sample 1"))
+            telemetry.record_progress(100000)  # the first progress is always saved
+            live_output = read_run_telemetry(telemetry_fp)
+            output = end_run_telemetry(telemetry_fp, [telemetry.finish()], start_epoch_seconds, 2, 3)
+            final_output = read_run_telemetry(telemetry_fp)
+            self.assertEqual(["run_telemetry.json"], os.listdir(temp_dir))
+
+        self.assertEqual(os.path.join(temp_dir, "run_telemetry_live"), get_live_telemetry_dir(telemetry_fp))
+        self.assertEqual(STATUS_RUNNING, live_output["status"])
+        self.assertEqual(1, live_output["num_workers_by_status"][STATUS_RUNNING])
+        self.assertEqual(100000, live_output["num_pairs"])
+        self.assertEqual(STATUS_FINISHED, output["status"])
+        self.assertEqual(output, final_output)
+        self.assertEqual(3, output["num_inputs"])
+
+    # endregion
+
+
+class TestFunctions(unittest.TestCase):
+    # region start_worker_telemetry/stop_worker_telemetry tests
+    def test_start_and_stop_worker_telemetry(self):
+        record_progress(100000)  # no telemetry is being recorded, so does nothing
+        self.assertIsNone(stop_worker_telemetry())
+
+        start_worker_telemetry("sample1", 10)
+        record_progress(100000)
+        record_counts({"num_pairs": 123})
+        output = stop_worker_telemetry()
+        self.assertEqual(123, output["num_pairs"])
+        self.assertIsNone(stop_worker_telemetry())
+
+    # endregion
+
+    # region summarize_run_telemetry tests
+    def test_summarize_run_telemetry(self):
+        workers_metrics = []
+        for curr_name, curr_num_pairs, curr_failure in [("s2", 300, None), ("s1", 100, "ValueError: bad input")]:
+            curr_telemetry = WorkerTelemetry(curr_name, input_bytes=curr_num_pairs * 10)
+            curr_telemetry.record_counts({"num_pairs": curr_num_pairs, "num_pairs_passing": curr_num_pairs // 2})
+            workers_metrics.append(curr_telemetry.finish(curr_failure))
+        output = summarize_run_telemetry(workers_metrics, 0, 2.0, 2, 2)
+
+        self.assertEqual(["s1", "s2"], [x["process_name"] for x in output["workers"]])
+        self.assertEqual({STATUS_RUNNING: 0, STATUS_FINISHED: 1, STATUS_FAILED: 1}, output["num_workers_by_status"])
+        self.assertEqual(400, output["num_pairs"])
+        self.assertEqual(200.0, output["pairs_per_sec"])
+        self.assertEqual(4000, output["input_bytes"])
+        self.assertEqual({"num_pairs": 400, "num_pairs_passing": 200}, output["counts_by_type"])
+        self.assertEqual({"num_pairs_passing": 0.5}, output["ratios"])
+
+    # endregion
+
+    # region parallel_process_paired_reads tests
+    def test_parallel_process_paired_reads_telemetry(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for curr_base, curr_num_pairs in [("good_L001", 3), ("bad_L001", 2)]:
+                for curr_read_num in [1, 2]:
+                    with open(os.path.join(temp_dir, "{0}_R{1}_001.fastq".format(curr_base, curr_read_num)),
+                              'w') as file_handle:
+                        file_handle.write("@r\nACGT\n+\nGGGG\n" * curr_num_pairs)
+            telemetry_fp = get_telemetry_fp(temp_dir, "run")
+            results = parallel_process_paired_reads(temp_dir, "_001.fastq", 2, _count_lines, [],
+                                                    telemetry_fp=telemetry_fp)
+            output = read_run_telemetry(telemetry_fp)
+
+        self.assertEqual(("good_L001_001", "num_pairs:3"), results[1])
+        self.assertIn("ValueError: bad input", results[0][1])
+        self.assertEqual(STATUS_FAILED, output["status"])
+        self.assertEqual(["bad_L001_001", "good_L001_001"], [x["process_name"] for x in output["workers"]])
+        self.assertEqual("ValueError: bad input", output["workers"][0]["message"])
+        self.assertEqual(5, output["num_pairs"])
+        self.assertEqual(2 * 15 * 5, output["input_bytes"])
+        self.assertEqual({"num_pairs_passing": 3 / 5}, output["ratios"])
+
+    # endregion
+
+    # region parallel_process_paired_read_shards tests
+    def test_parallel_process_paired_read_shards_telemetry(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # shard boundaries fall on the record offset index's entries, every 65536 records
+            for curr_base, curr_num_pairs in [("good_L001", 65536 + 2), ("bad_L001", 2)]:
+                for curr_read_num in [1, 2]:
+                    with open(os.path.join(temp_dir, "{0}_R{1}_001.fastq".format(curr_base, curr_read_num)),
+                              'w') as file_handle:
+                        file_handle.write("@r\nACGT\n+\nGGGG\n" * curr_num_pairs)
+            telemetry_fp = get_telemetry_fp(temp_dir, "run")
+            results = parallel_process_paired_read_shards(temp_dir, "_001.fastq", 2, _count_shard_lines,
+                                                          _sum_shard_lines, [], telemetry_fp=telemetry_fp)
+            output = read_run_telemetry(telemetry_fp)
+            live_dir_exists = os.path.exists(get_live_telemetry_dir(telemetry_fp))
+
+        self.assertEqual(("good_L001_001", "num_pairs:65538"), results[1])
+        self.assertIn("ValueError: bad input", results[0][1])
+        self.assertEqual(STATUS_FAILED, output["status"])
+        self.assertFalse(live_dir_exists)
+        # one worker per shard, each recording its own shard's counts
+        self.assertEqual(["bad_L001_001 shard 0", "good_L001_001 shard 0", "good_L001_001 shard 1"],
+                         [x["process_name"] for x in output["workers"]])
+        self.assertEqual("ValueError: bad input", output["workers"][0]["message"])
+        self.assertEqual([2, 65536, 2], [x["num_pairs"] for x in output["workers"]])
+        self.assertEqual(3, output["num_inputs"])
+        self.assertEqual(65540, output["num_pairs"])
+        self.assertEqual(2 * 15 * 65540, output["input_bytes"])
+        self.assertEqual({"num_pairs_passing": 65537 / 65540}, output["ratios"])
+
+    # endregion
@@ -0,0 +1,280 @@
+"""This module records the throughput, match rates and resource use of each worker in a parallel fastq run."""
+
+# standard libraries
+import datetime
+import json
+import os
+import re
+import resource
+import shutil
+import sys
+import time
+import timeit
+
+# ccbb libraries
+from ccbbucsd.utilities.files_and_paths import build_multipart_fp
+
+__author__ = "Amanda Birmingham"
+__maintainer__ = "Amanda Birmingham"
+__email__ = "abirmingham@ucsd.edu"
+__status__ = "development"
+
+STATUS_RUNNING = "running"
+STATUS_FINISHED = "finished"
+STATUS_FAILED = "failed"
+
+_MIN_SECONDS_BETWEEN_SNAPSHOTS = 5
+_LIVE_DIR_SUFFIX = "_live"
+
+# the telemetry of the work running in this process, if any; pool workers run one task at a time, so one suffices
+_current_telemetry = None
+
+
+def get_telemetry_fp(output_dir, run_prefix):
+    return build_multipart_fp(output_dir, [run_prefix, "telemetry.json"])
+
+
+def get_live_telemetry_dir(telemetry_fp):
+    """Return the directory in which workers save snapshots of their metrics while a run's telemetry is pending."""
+    return os.path.splitext(telemetry_fp)[0] + _LIVE_DIR_SUFFIX
+
+
+class WorkerTelemetry:
+    """Accumulates the metrics of one worker's processing of one input.
+
+    Progress is recorded (with the pairs/sec since the previous record) whenever record_progress is called, and, if a
+    snapshot_fp is given, the metrics so far are saved there as json at most every _MIN_SECONDS_BETWEEN_SNAPSHOTS
+    seconds, so they can be viewed while the work is still going.
+    """
+
+    def __init__(self, process_name, input_bytes=None, snapshot_fp=None):
+        self.process_name = process_name
+        self.input_bytes = input_bytes
+        self.status = STATUS_RUNNING
+        self.message = None
+        self.num_pairs = 0
+        self.counts_by_type = {}
+        self.progress = []
+        self._snapshot_fp = snapshot_fp
+        self._start_epoch_seconds = time.time()
+        self._start_time = timeit.default_timer()
+        self._start_cpu_seconds = time.process_time()
+        self._start_bytes_read = _get_process_bytes_read()
+        self._last_snapshot_time = None
+
+    def record_progress(self, num_pairs):
+        elapsed_seconds = timeit.default_timer() - self._start_time
+        prev_elapsed_seconds, prev_num_pairs = (0, 0) if len(self.progress) == 0 else \
+            (self.progress[-1]["elapsed_seconds"], self.progress[-1]["num_pairs"])
+        interval_seconds = elapsed_seconds - prev_elapsed_seconds
+        self.num_pairs = num_pairs
+        self.progress.append({"elapsed_seconds": elapsed_seconds, "num_pairs": num_pairs,
+                              "pairs_per_sec": _get_rate(num_pairs - prev_num_pairs, interval_seconds)})
+
+        if self._snapshot_fp is not None and (self._last_snapshot_time is None or elapsed_seconds -
+                                              self._last_snapshot_time >= _MIN_SECONDS_BETWEEN_SNAPSHOTS):
+            self._last_snapshot_time = elapsed_seconds
+            self.save_snapshot()
+
+    def record_counts(self, counts_by_type):
+        """Record the summary counts (e.g. num_pairs, num_constructs_recognized) of the work, once they are known."""
+        self.counts_by_type.update(counts_by_type)
+        if isinstance(counts_by_type.get("num_pairs"), int):
+            self.num_pairs = counts_by_type["num_pairs"]
+
+    def finish(self, failure_message=None):
+        self.status = STATUS_FINISHED if failure_message is None else STATUS_FAILED
+        self.message = failure_message
+        if len(self.progress) == 0 or self.progress[-1]["num_pairs"] != self.num_pairs:
+            self.record_progress(self.num_pairs)
+        if self._snapshot_fp is not None:
+            self.save_snapshot()
+        return self.to_dict()
+
+    def save_snapshot(self):
+        _write_json_atomically(self._snapshot_fp, self.to_dict())
+
+    def to_dict(self):
+        elapsed_seconds = timeit.default_timer() - self._start_time
+        end_bytes_read = _get_process_bytes_read()
+        result = {"process_name": self.process_name, "status": self.status, "message": self.message,
+                  "start_epoch_seconds": self._start_epoch_seconds, "elapsed_seconds": elapsed_seconds,
+                  "cpu_seconds": time.process_time() - self._start_cpu_seconds,
+                  "peak_rss_mb": get_peak_rss_mb(), "input_bytes": self.input_bytes,
+                  "bytes_read": None if end_bytes_read is None or self._start_bytes_read is None else
+                  end_bytes_read - self._start_bytes_read,
+                  "num_pairs": self.num_pairs, "counts_by_type": self.counts_by_type, "progress": self.progress}
+        _add_rates_and_ratios(result, elapsed_seconds)
+        return result
+
+
+def start_worker_telemetry(process_name, input_bytes=None, snapshot_fp=None):
+    """Start recording the metrics of the work about to run in this process; see WorkerTelemetry."""
+    global _current_telemetry
+    _current_telemetry = WorkerTelemetry(process_name, input_bytes, snapshot_fp)
+    return _current_telemetry
+
+
+def stop_worker_telemetry(failure_message=None):
+    """Stop recording the metrics of the work run in this process and return them as a dictionary."""
+    global _current_telemetry
+    result = None if _current_telemetry is None else _current_telemetry.finish(failure_message)
+    _current_telemetry = None
+    return result
+
+
+def record_progress(num_pairs):
+    # called from the progress reports of long-running steps; does nothing when no telemetry is being recorded
+    if _current_telemetry is not None:
+        _current_telemetry.record_progress(num_pairs)
+
+
+def record_counts(counts_by_type):
+    if _current_telemetry is not None:
+        _current_telemetry.record_counts(counts_by_type)
+
+
+def get_peak_rss_mb():
+    """Return the peak resident memory, in MB, of this process so far (in a pool worker, including earlier tasks)."""
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS but in kilobytes on linux
+    return peak_rss / (1024 * 1024) if sys.platform == "darwin" else peak_rss / 1024
+
+
+def summarize_run_telemetry(workers_metrics, start_epoch_seconds, elapsed_seconds, num_processes=None,
+                            num_inputs=None, status=STATUS_FINISHED):
+    """Return a run report aggregating the metrics of all of a run's workers, which it also includes.
+
+    Throughputs are over the run's wall-clock time; ratios are of summed counts to summed pairs.
+    """
+    summed_counts = {}
+    for curr_metrics in workers_metrics:
+        for curr_key, curr_value in curr_metrics["counts_by_type"].items():
+            if _is_count(curr_value):
+                summed_counts[curr_key] = summed_counts.get(curr_key, 0) + curr_value
+
+    result = {"status": status, "start_time": datetime.datetime.fromtimestamp(start_epoch_seconds).isoformat(),
+              "start_epoch_seconds": start_epoch_seconds, "elapsed_seconds": elapsed_seconds,
+              "num_processes": num_processes, "num_inputs": num_inputs,
+              "num_workers_by_status": {x: sum(1 for y in workers_metrics if y["status"] == x)
+                                        for x in [STATUS_RUNNING, STATUS_FINISHED, STATUS_FAILED]},
+              "cpu_seconds": sum(x["cpu_seconds"] for x in workers_metrics),
+              "peak_rss_mb": max([x["peak_rss_mb"] for x in workers_metrics], default=None),
+              "input_bytes": _sum_known(x["input_bytes"] for x in workers_metrics),
+              "bytes_read": _sum_known(x["bytes_read"] for x in workers_metrics),
+              "num_pairs": sum(x["num_pairs"] for x in workers_metrics),
+              "counts_by_type": summed_counts,
+              "workers": sorted(workers_metrics, key=lambda x: x["process_name"])}
+    _add_rates_and_ratios(result, elapsed_seconds)
+    return result
+
+
+def write_run_telemetry(telemetry_fp, run_report):
+    _write_json_atomically(telemetry_fp, run_report)
+
+
+def start_run_telemetry(telemetry_fp, num_processes=None, num_inputs=None):
+    """Write a pending report to telemetry_fp and make the directory for workers' live snapshots; see end_run_telemetry.
+
+    Returns the run's start time, in seconds since the epoch.
+    """
+    start_epoch_seconds = time.time()
+    live_dir = get_live_telemetry_dir(telemetry_fp)
+    os.makedirs(live_dir, exist_ok=True)
+    write_run_telemetry(telemetry_fp, summarize_run_telemetry([], start_epoch_seconds, 0, num_processes, num_inputs,
+                                                              STATUS_RUNNING))
+    return start_epoch_seconds
+
+
+def end_run_telemetry(telemetry_fp, workers_metrics, start_epoch_seconds, num_processes=None, num_inputs=None):
+    """Write the final report of all workers' metrics to telemetry_fp, remove the live snapshots and return it."""
+    failed = any(x["status"] == STATUS_FAILED for x in workers_metrics)
+    result = summarize_run_telemetry(workers_metrics, start_epoch_seconds, time.time() - start_epoch_seconds,
+                                     num_processes, num_inputs, STATUS_FAILED if failed else STATUS_FINISHED)
+    write_run_telemetry(telemetry_fp, result)
+    shutil.rmtree(get_live_telemetry_dir(telemetry_fp), ignore_errors=True)
+    return result
+
+
+def get_worker_snapshot_fp(telemetry_fp, process_name):
+    safe_name = re.sub(r"[^\w.-]", "_", process_name)
+    return os.path.join(get_live_telemetry_dir(telemetry_fp), safe_name + ".json")
+
+
+def read_run_telemetry(telemetry_fp):
+    """Return the run report in telemetry_fp; if the run is still going, it is first updated from workers' snapshots."""
+    with open(telemetry_fp) as file_handle:
+        result = json.load(file_handle)
+    if result["status"] == STATUS_RUNNING:
+        live_dir = get_live_telemetry_dir(telemetry_fp)
+        workers_metrics = []
+        for curr_name in sorted(os.listdir(live_dir)) if os.path.isdir(live_dir) else []:
+            if curr_name.endswith(".json"):
+                with open(os.path.join(live_dir, curr_name)) as file_handle:
+                    workers_metrics.append(json.load(file_handle))
+        result = summarize_run_telemetry(workers_metrics, result["start_epoch_seconds"],
+                                         time.time() - result["start_epoch_seconds"], result["num_processes"],
+                                         result["num_inputs"], STATUS_RUNNING)
+    return result
+
+
+def format_run_telemetry(run_report):
+    lines = ["{0}: {1} pairs in {2:.0f}s ({3:.0f} pairs/sec); workers {4}".format(
+        run_report["status"], run_report["num_pairs"], run_report["elapsed_seconds"],
+        run_report["pairs_per_sec"] or 0, ", ".join("{0} {1}".format(y, x) for x, y in
+                                                   sorted(run_report["num_workers_by_status"].items())))]
+    for curr_metrics in run_report["workers"]:
+        ratio_pieces = ["{0}:{1:.4f}".format(x, y) for x, y in sorted(curr_metrics["ratios"].items())]
+        lines.append("  {0}: {1}, {2} pairs, {3:.0f} pairs/sec, {4:.0f} MB peak RSS {5}".format(
+            curr_metrics["process_name"], curr_metrics["status"], curr_metrics["num_pairs"],
+            curr_metrics["pairs_per_sec"] or 0, curr_metrics["peak_rss_mb"], ",".join(ratio_pieces)).rstrip())
+    return "\n".join(lines)
+
+
+def _add_rates_and_ratios(metrics, elapsed_seconds):
+    num_pairs = metrics["num_pairs"]
+    metrics["pairs_per_sec"] = _get_rate(num_pairs, elapsed_seconds)
+    num_bytes = metrics["bytes_read"] if metrics["bytes_read"] is not None else metrics["input_bytes"]
+    metrics["mb_per_sec"] = None if num_bytes is None else _get_rate(num_bytes / 1e6, elapsed_seconds)
+    # e.g. ratios["num_constructs_recognized"] is the match ratio and ratios["num_pairs_unrecognized"] the
+    # unrecognized ratio of a counting step
+    metrics["ratios"] = {x: y / num_pairs for x, y in metrics["counts_by_type"].items()
+                         if x != "num_pairs" and _is_count(y) and num_pairs > 0}
+
+
+def _get_rate(amount, seconds):
+    return amount / seconds if seconds > 0 else None
+
+
+def _is_count(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _sum_known(values):
+    values = [x for x in values if x is not None]
+    return sum(values) if len(values) > 0 else None
+
+
+def _get_process_bytes_read():
+    # linux counts all bytes this process has read (rchar); elsewhere only the input file sizes are reported
+    try:
+        with open("/proc/self/io") as file_handle:
+            for curr_line in file_handle:
+                if curr_line.startswith("rchar:"):
+                    return int(curr_line.split(":")[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _write_json_atomically(output_fp, output_obj):
+    # readers watching a live run must never see a half-written file
+    temp_fp = output_fp + ".tmp"
+    with open(temp_fp, 'w') as file_handle:
+        json.dump(output_obj, file_handle, indent=1, sort_keys=True)
+    os.replace(temp_fp, output_fp)
+
+
+if __name__ == '__main__':
+    # e.g. python -m ccbbucsd.utilities.worker_telemetry /data/interim/run/run_prefix_telemetry.json, during or after
+    print(format_run_telemetry(read_run_telemetry(sys.argv[1])))
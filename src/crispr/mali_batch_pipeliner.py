@@ -0,0 +1,114 @@
+# standard libraries
+import os
+import sys
+
+# ccbb libraries
+from ccbbucsd.utilities.analysis_run_prefixes import get_timestamp
+from ccbbucsd.utilities.batch_pipeliner import DatasetRun, execute_batch, read_dataset_manifest
+from ccbbucsd.utilities.notebook_pipeliner import DATASET_NAME_KEY, ALG_NAME_KEY
+
+# project-specific libraries
+from ccbbucsd.malicrispr.mali_pipeline_steps import PipelineSteps, get_pipeline_steps
+
+__author__ = 'Amanda Birmingham'
+__maintainer__ = "Amanda Birmingham"
+__email__ = "abirmingham@ucsd.edu"
+__status__ = "prototype"
+
+
+def main(manifest_fp):
+    # *********************************************************
+    # The manifest is a tab-delimited text file with a header line and one line per dataset, holding these columns:
+    # dataset_name: the human-readable name of the dataset, e.g. 20160627_HeLa_A549_CV4
+    # fastq_set_name: the name of the folder (within the raw data folder) holding the dataset's fastqs
+    # spacers_file_name, col_indices, min_trimmed_grna_len, max_trimmed_grna_len: the construct library settings,
+    #   as described in mali_pipeliner.py
+    # run_folder (optional): the name of an existing run's folder to re-run, skipping steps that haven't changed
+    dataset_settings_list = read_dataset_manifest(manifest_fp)
+
+    # *********************************************************
+    # you'll change these lines only when changing the scaffold sequence with which your library was constructed.
+    # Note that these should be the FULL scaffold sequence, even if the sequencing will not capture the whole 3'
+    # scaffold sequence; the cutadapt settings used will still identify a significantly truncated 3' match.
+    full_5p_r1 = "TATATATCTTGTGGAAAGGACGAAACACCG"
+    full_5p_r2 = "CCTTATTTTAACTTGCTATTTCTAGCTCTAAAAC"
+    full_3p_r1 = "GTTTCAGAGCTATGCTGGAAACTGCATAGCAAGTTGAAATAAGGCTAGTCCGTTATCAACTTGAAAAAGTGGCACCGAGTCGGTGCTTTTTTGTACTGAG"
+    full_3p_r2 = "CAAACAAGGCTTTTCTCCAAGGGATATTTATAGTCTCAAAACACACAATTACTTTACAGTTAGGGTGAGTTTCCTTTTGTGCTGTTTTTTAAAATA"
+
+    # *********************************************************
+    # you'll probably decide on these values before beginning screen analysis, set them once, and then leave them alone
+    # unless you change your analysis approach and/or hardware
+    len_of_seq_to_match = 19
+    num_allowed_mismatches = 1
+    num_processors = 7  # shared by all the datasets; assumes on an 8-vCPU instance
+    main_dir = "/home/ec2-user/jupyter-genomics"
+
+    # *********************************************************
+    # you'll probably never change these, assuming you use the suggested file structure
+    notebooks_dir = os.path.join(main_dir, "notebooks/crispr")
+    data_dir = "/data"
+    raw_dir = os.path.join(data_dir, "raw")
+    library_def_dir = os.path.join(main_dir, "library_definitions")
+    processed_dir = os.path.join(data_dir, "processed")
+
+    # *********************************************************
+    # DON'T change these unless you *really* know what you're doing
+    steps_to_run = [PipelineSteps.SCAFFOLD_TRIMMING,
+                    PipelineSteps.TRIMMED_READ_FILTERING,
+                    PipelineSteps.CONSTRUCT_COUNTING,
+                    PipelineSteps.COUNT_COMBINATION,
+                    PipelineSteps.COUNT_PLOTTING]
+    # the fastq-processing steps use as many processors as they are given, so each gets all but one of them, leaving
+    # one for another dataset's combination or plotting step to run alongside; those steps use only one
+    num_heavy_step_processors = max(1, num_processors - 1)
+    num_processors_by_step = {PipelineSteps.SCAFFOLD_TRIMMING: num_heavy_step_processors,
+                              PipelineSteps.TRIMMED_READ_FILTERING: num_heavy_step_processors,
+                              PipelineSteps.CONSTRUCT_COUNTING: num_heavy_step_processors}
+
+    # *********************************************************
+    # DON'T CHANGE ANYTHING BELOW THIS LINE UNLESS YOU ARE AMANDA BIRMINGHAM.  And even then think twice :)
+    dataset_runs = []
+    for dataset_settings in dataset_settings_list:
+        human_readable_name = dataset_settings["dataset_name"]
+        fastq_set_name = dataset_settings["fastq_set_name"]
+        interim_fastq_set_dir = os.path.join(data_dir, "interim", fastq_set_name)
+        constructs_fp = os.path.join(library_def_dir, dataset_settings["spacers_file_name"])
+        shared_params = {'g_code_location': os.path.join(main_dir, "src/crispr"),
+                         'g_timestamp': "{timestamp}",
+                         DATASET_NAME_KEY: human_readable_name,
+                         'g_fastqs_dir': os.path.join(raw_dir, fastq_set_name),
+                         'g_trimmed_fastqs_dir': interim_fastq_set_dir,
+                         'g_full_5p_r1': full_5p_r1,
+                         'g_full_5p_r2': full_5p_r2,
+                         'g_full_3p_r1': full_3p_r1,
+                         'g_full_3p_r2': full_3p_r2,
+                         'g_filtered_fastqs_dir': interim_fastq_set_dir,
+                         'g_min_trimmed_grna_len': int(dataset_settings["min_trimmed_grna_len"]),
+                         'g_max_trimmed_grna_len': int(dataset_settings["max_trimmed_grna_len"]),
+                         'g_len_of_seq_to_match': len_of_seq_to_match,
+                         ALG_NAME_KEY: "{0}mer_{1}mm_py".format(len_of_seq_to_match, num_allowed_mismatches),
+                         'g_num_allowed_mismatches': num_allowed_mismatches,
+                         'g_constructs_fp': constructs_fp,
+                         'g_col_indices_str': dataset_settings["col_indices"],
+                         'g_fastq_counts_dir': interim_fastq_set_dir,
+                         'g_fastq_counts_run_prefix': human_readable_name + "_{timestamp}",
+                         'g_collapsed_counts_dir': "{run_dir}",
+                         'g_collapsed_counts_run_prefix': "{run_prefix}",
+                         'g_combined_counts_dir': "{run_dir}",
+                         'g_combined_counts_run_prefix': "{run_prefix}",
+                         'g_plots_dir': "{run_dir}",
+                         'g_plots_run_prefix': "{run_prefix}"
+                         }
+
+        pipeline_steps = get_pipeline_steps(notebooks_dir, shared_params['g_fastqs_dir'], interim_fastq_set_dir,
+                                            constructs_fp, shared_params['g_fastq_counts_run_prefix'])
+        dataset_runs.append(DatasetRun(human_readable_name, pipeline_steps, shared_params,
+                                       dataset_settings.get("run_folder")))
+
+    report_fp = os.path.join(processed_dir, "batch_{0}_report.txt".format(get_timestamp()))
+    execute_batch(dataset_runs, steps_to_run, processed_dir, num_processors, num_processors_by_step,
+                  'g_num_processors', report_fp=report_fp, export_html_in_background=True)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1])
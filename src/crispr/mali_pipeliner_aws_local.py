@@ -1,24 +1,18 @@
 # standard libraries
-import enum
 import os
 
 # ccbb libraries
 from ccbbucsd.utilities.notebook_pipeliner import DATASET_NAME_KEY, ALG_NAME_KEY, execute_run
 
+# project-specific libraries
+from ccbbucsd.malicrispr.mali_pipeline_steps import PipelineSteps, get_pipeline_steps
+
 __author__ = 'Amanda Birmingham'
 __maintainer__ = "Amanda Birmingham"
 __email__ = "abirmingham@ucsd.edu"
 __status__ = "prototype"
 
 
-class PipelineSteps(enum.Enum):
-    SCAFFOLD_TRIMMING = 0
-    TRIMMED_READ_FILTERING = 1
-    CONSTRUCT_COUNTING = 2
-    COUNT_COMBINATION = 3
-    COUNT_PLOTTING = 4
-
-
 def main():
     # *********************************************************
     # you'll probably change these on every run, unless you're reprocessing an existing dataset for some reason
@@ -86,6 +80,9 @@ def main():
                     PipelineSteps.CONSTRUCT_COUNTING,
                     PipelineSteps.COUNT_COMBINATION,
                     PipelineSteps.COUNT_PLOTTING]
+    # name an existing run's folder (within processed_dir) to re-run it; steps whose notebooks, parameters and input
+    # files haven't changed since they last ran there are skipped
+    run_folder = None
 
     shared_params = {'g_code_location': os.path.join(main_dir, "src/crispr"),
                      'g_timestamp': "{timestamp}",
@@ -117,13 +114,11 @@ def main():
 
     # *********************************************************
     # DON'T CHANGE ANYTHING BELOW THIS LINE UNLESS YOU ARE AMANDA BIRMINGHAM.  And even then think twice :)
-    pipeline_steps = {PipelineSteps.SCAFFOLD_TRIMMING: [notebooks_dir, "Dual CRISPR 1-Construct Scaffold Trimming.ipynb"],
-                      PipelineSteps.TRIMMED_READ_FILTERING: [notebooks_dir, "Dual CRISPR 2-Constuct Filter.ipynb"],
-                      PipelineSteps.CONSTRUCT_COUNTING: [notebooks_dir, "Dual CRISPR 3-Construct Counting.ipynb"],
-                      PipelineSteps.COUNT_COMBINATION: [notebooks_dir, "Dual CRISPR 4-Count Combination.ipynb"],
-                      PipelineSteps.COUNT_PLOTTING: [notebooks_dir, "Dual CRISPR 5-Count Plots.ipynb"]}
+    pipeline_steps = get_pipeline_steps(notebooks_dir, shared_params['g_fastqs_dir'], interim_fastq_set_dir,
+                                        shared_params['g_constructs_fp'], shared_params['g_fastq_counts_run_prefix'])
 
-    execute_run(pipeline_steps, shared_params, steps_to_run, processed_dir)
+    execute_run(pipeline_steps, shared_params, steps_to_run, processed_dir, run_folder=run_folder, reuse_kernel=True,
+                export_html_in_background=True)
 
 
 if __name__ == '__main__':
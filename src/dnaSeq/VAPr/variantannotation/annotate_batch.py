@@ -32,10 +32,14 @@ class AnnotationMethods(object):
         :return: nothing, simply exports data to MongoDB
         """
 
+        # the csv file is read once, a chunk at a time, in step with the chunks of variant_list
+        annovar_chunks = csv_to_df.open_and_parse_chunk_dfs(file_name, chunksize, step)
         while step*chunksize < len(variant_list):
 
             chunk_ids = variant_list[chunksize*step:chunksize*(step+1)]
-            df = csv_to_df.parse_to_df(csv_to_df.open_and_parse_chunks(file_name, chunksize, step))
+            df = next(annovar_chunks, None)
+            if df is None:
+                df = csv_to_df.make_empty_df()
             from_annovar = get_list_from_annovar_csv(df, chunk_ids)
 
             open_file = myvariant_parsing_utils.VariantParsing()
@@ -2,6 +2,27 @@ import pandas
 import csv
 from itertools import islice
 
+# The ANNOVAR columns kept for annotation, and the type each is parsed to ('.' always becomes None/NaN)
+ANNOVAR_COLUMNS = ['Chr',
+                   'Start',
+                   'End',
+                   'Ref',
+                   'Alt',
+                   'Func.knownGene',
+                   'Gene.knownGene',
+                   'GeneDetail.knownGene',
+                   'ExonicFunc.knownGene',
+                   'tfbsConsSites',
+                   'cytoBand',
+                   'genomicSuperDups',
+                   '1000g2015aug_all',
+                   'ESP6500si_ALL',
+                   'cosmic70',
+                   'nci60',
+                   'Otherinfo']
+INT_COLUMNS = ['Start', 'End']
+FLOAT_COLUMNS = ['1000g2015aug_all', 'ESP6500si_ALL', 'nci60']
+
 
 def open_and_parse_chunks(file_name, chunksize, step):
     """
@@ -17,7 +38,7 @@ def open_and_parse_chunks(file_name, chunksize, step):
 
         reader = csv.reader(csvfile, delimiter=',')
         header = next(reader)
-        lines_of_interest = list(reader)[step*chunksize:(step+1)*chunksize]
+        lines_of_interest = islice(reader, step*chunksize, (step+1)*chunksize)
 
         for i in lines_of_interest:
             if len(i) == len(header):
@@ -48,6 +69,44 @@ def open_and_parse(file_name):
         listoflists.insert(0, header)
     return listoflists
 
+def open_and_parse_chunk_dfs(file_name, chunksize, step=0):
+    """
+    Read the csv file once, yielding a dataframe of the selected columns (as parse_to_df returns) for each chunk of
+    chunksize lines, starting with chunk number step. Unlike calling open_and_parse_chunks once per chunk, this does
+    not re-read the file for every chunk, and only the selected columns are parsed, straight into typed columns.
+
+    :param file_name: name of csv file
+    :param chunksize: size of chunk to be processed at a time
+    :param step: number of the first chunk to yield
+    :return: generator of pandas dataframes with selected columns, each indexed from 0
+    """
+    with open(file_name, 'rb') as csvfile:
+
+        reader = csv.reader(csvfile, delimiter=',')
+        header = next(reader)
+        column_indices = [header.index(x) for x in ANNOVAR_COLUMNS]
+        rows = islice(reader, step*chunksize, None)
+
+        while True:
+            columns = [[] for _ in ANNOVAR_COLUMNS]
+            for row in islice(rows, chunksize):
+                if len(row) != len(header):
+                    del row[4]
+                for column, index in zip(columns, column_indices):
+                    column.append(row[index])
+
+            if len(columns[0]) == 0:
+                break
+            yield _columns_to_df(columns)
+            if len(columns[0]) < chunksize:
+                break
+
+
+def make_empty_df():
+    """Same as open_and_parse_chunk_dfs's dataframes, for when the csv file has no lines left"""
+    return _columns_to_df([[] for _ in ANNOVAR_COLUMNS])
+
+
 def parse_to_df(listoflists):
     """
     :param listoflists: list of lists coming from previous step
@@ -57,25 +116,20 @@ def parse_to_df(listoflists):
     df = pandas.DataFrame(listoflists[1::], columns=listoflists[0])
     # Keep only required columns
 
-    df = df[['Chr',
-             'Start',
-             'End',
-             'Ref',
-             'Alt',
-             'Func.knownGene',
-             'Gene.knownGene',
-             'GeneDetail.knownGene',
-             'ExonicFunc.knownGene',
-             'tfbsConsSites',
-             'cytoBand',
-             'genomicSuperDups',
-             '1000g2015aug_all',
-             'ESP6500si_ALL',
-             'cosmic70',
-             'nci60',
-             'Otherinfo']]
+    df = df[ANNOVAR_COLUMNS]
 
     df = df.replace({'.': None})  # None values are easier to deal with
 
     return df
 
+
+def _columns_to_df(columns):
+    typed_columns = {}
+    for name, column in zip(ANNOVAR_COLUMNS, columns):
+        if name in INT_COLUMNS:
+            typed_columns[name] = pandas.Series([int(x) for x in column], dtype='int64')
+        elif name in FLOAT_COLUMNS:
+            typed_columns[name] = pandas.Series([None if x == '.' else float(x) for x in column], dtype='float64')
+        else:
+            typed_columns[name] = pandas.Series([None if x == '.' else x for x in column], dtype='object')
+    return pandas.DataFrame(typed_columns, columns=ANNOVAR_COLUMNS)
@@ -1,5 +1,6 @@
 import unittest
 import sys
+import pandas
 #quick and dirty way of importing functions
 from variantannotation import csv_to_df
 
@@ -34,6 +35,14 @@ class OpenParseTest(unittest.TestCase):
         list2 = csv_to_df.open_and_parse(self.data)
         self.assertEqual(len(list3[0:1000]), len(list2[0:1000]))
 
+    def test_parse_csv_chunk_dfs(self):
+        df_chunks = list(csv_to_df.open_and_parse_chunk_dfs(self.data, 1000))
+        df = csv_to_df.parse_to_df(csv_to_df.open_and_parse(self.data))
+        self.assertEqual(len(df), sum(len(x) for x in df_chunks))
+        self.assertEqual(list(df.columns), list(df_chunks[0].columns))
+        self.assertEqual(list(range(0, len(df_chunks[0]))), list(df_chunks[0].index))
+        self.assertEqual(list(pandas.to_numeric(df['Start'][1000:2000])), list(df_chunks[1]['Start']))
+
 
 """
     def test_csv_read_data_points(self):